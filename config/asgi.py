@@ -11,7 +11,7 @@ import os
 import sys
 from pathlib import Path
 
-from django.core.asgi import get_asgi_application
+from uptime_monitor.utils.asgi import get_asgi_application
 
 # This allows easy placement of apps within the interior
 # uptime_monitor directory.
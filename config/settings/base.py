@@ -294,7 +294,7 @@ CELERY_RESULT_BACKEND_ALWAYS_RETRY = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#result-backend-max-retries
 CELERY_RESULT_BACKEND_MAX_RETRIES = 10
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std:setting-accept_content
-CELERY_ACCEPT_CONTENT = ["json"]
+CELERY_ACCEPT_CONTENT = ["json", "msgpack"]
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std:setting-task_serializer
 CELERY_TASK_SERIALIZER = "json"
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std:setting-result_serializer
@@ -311,6 +311,19 @@ CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
 CELERY_TASK_SEND_SENT_EVENT = True
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-schedule
+CELERY_BEAT_SCHEDULE = {
+    "maintain-history-partitions": {
+        "task": "maintain_history_partitions",
+        "schedule": 60 * 60,
+    },
+    "archive-history": {
+        "task": "archive_history",
+        "schedule": 60 * 60,
+    },
+}
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-routes
+CELERY_TASK_ROUTES = ("uptime_monitor.core.sharding.route_check_task",)
 # django-allauth
 # ------------------------------------------------------------------------------
 ACCOUNT_ALLOW_REGISTRATION = env.bool("DJANGO_ACCOUNT_ALLOW_REGISTRATION", True)
@@ -356,3 +369,168 @@ SPECTACULAR_SETTINGS = {
     "VERSION": "1.0.0",
     "SERVE_PERMISSIONS": ["rest_framework.permissions.AllowAny"],
 }
+
+# Uptime monitor
+# ------------------------------------------------------------------------------
+# Maximum number of in-flight probes of a single check_sites batch.
+CHECK_ENGINE_CONCURRENCY = env.int("CHECK_ENGINE_CONCURRENCY", default=200)
+# Pool limits of the per-worker HTTP clients, see uptime_monitor.core.clients.
+HTTP_POOL_MAX_CONNECTIONS = env.int("HTTP_POOL_MAX_CONNECTIONS", default=200)
+HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS = env.int(
+    "HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS", default=100
+)
+HTTP_POOL_KEEPALIVE_EXPIRY = env.float("HTTP_POOL_KEEPALIVE_EXPIRY", default=60.0)
+# The response history consumer writes a batch every HISTORY_BATCH_SIZE results or
+# HISTORY_BATCH_INTERVAL seconds. The worker prefetch count must be at least the batch size.
+HISTORY_BATCH_SIZE = env.int("HISTORY_BATCH_SIZE", default=500)
+HISTORY_BATCH_INTERVAL = env.float("HISTORY_BATCH_INTERVAL", default=1.0)
+# Results whose write failed HISTORY_BATCH_MAX_ATTEMPTS times are sent to the response_history.dead queue.
+HISTORY_BATCH_MAX_ATTEMPTS = env.int("HISTORY_BATCH_MAX_ATTEMPTS", default=5)
+# "beat" creates one django_celery_beat PeriodicTask per ScheduleItem, "wheel" leaves
+# scheduling to the run_scheduler service, see uptime_monitor.core.scheduler.
+CHECK_SCHEDULER = env("CHECK_SCHEDULER", default="beat")
+# Maximum number of sites per check_sites task sent by the wheel scheduler.
+SCHEDULER_BATCH_SIZE = env.int("SCHEDULER_BATCH_SIZE", default=200)
+# Seconds between full reloads of the schedule items by the wheel scheduler.
+SCHEDULER_FULL_SYNC_INTERVAL = env.int("SCHEDULER_FULL_SYNC_INTERVAL", default=3600)
+# Maximum random delay in seconds added to every scheduled check, on top of its phase offset.
+SCHEDULER_JITTER = env.int("SCHEDULER_JITTER", default=0)
+# Seconds of dispatches per second summarized in the scheduler:dispatch_stats Redis key.
+SCHEDULER_STATS_WINDOW = env.int("SCHEDULER_STATS_WINDOW", default=60)
+# Checks read at most CHECK_MAX_BODY_BYTES of a response body while searching the
+# site registry text, and keep CHECK_RESPONSE_SNIPPET_LENGTH characters as response text.
+CHECK_MAX_BODY_BYTES = env.int("CHECK_MAX_BODY_BYTES", default=1024 * 1024)
+CHECK_RESPONSE_SNIPPET_LENGTH = env.int("CHECK_RESPONSE_SNIPPET_LENGTH", default=256)
+# Sites with at least ASSERTION_AHO_CORASICK_MIN_PATTERNS literal assertions match them with
+# an Aho-Corasick automaton. Compiled assertions are cached per worker, up to ASSERTION_CACHE_SIZE.
+ASSERTION_AHO_CORASICK_MIN_PATTERNS = env.int(
+    "ASSERTION_AHO_CORASICK_MIN_PATTERNS", default=4
+)
+ASSERTION_CACHE_SIZE = env.int("ASSERTION_CACHE_SIZE", default=10000)
+# REGEX assertions are at most ASSERTION_REGEX_MAX_LENGTH characters long and only search the first
+# ASSERTION_REGEX_MAX_CHARS characters of the body, which bounds their backtracking.
+ASSERTION_REGEX_MAX_LENGTH = env.int("ASSERTION_REGEX_MAX_LENGTH", default=256)
+ASSERTION_REGEX_MAX_CHARS = env.int("ASSERTION_REGEX_MAX_CHARS", default=64 * 1024)
+# Workers cache site registries for REGISTRY_CACHE_TTL seconds, up to REGISTRY_CACHE_MAX_SIZE,
+# and drop them when a change is published, see uptime_monitor.core.registry_cache.
+REGISTRY_CACHE_MAX_SIZE = env.int("REGISTRY_CACHE_MAX_SIZE", default=50000)
+REGISTRY_CACHE_TTL = env.float("REGISTRY_CACHE_TTL", default=300.0)
+REGISTRY_CACHE_RECONNECT_DELAY = env.float(
+    "REGISTRY_CACHE_RECONNECT_DELAY", default=5.0
+)
+# New connections of checks resolve hosts through a per-worker DNS cache, see
+# uptime_monitor.core.dns_cache. Answers are kept for their record TTL, clamped to
+# DNS_CACHE_MIN_TTL and DNS_CACHE_MAX_TTL, and failures for DNS_CACHE_NEGATIVE_TTL seconds.
+DNS_CACHE_ENABLED = env.bool("DNS_CACHE_ENABLED", default=True)
+DNS_CACHE_MAX_SIZE = env.int("DNS_CACHE_MAX_SIZE", default=10000)
+DNS_CACHE_MIN_TTL = env.float("DNS_CACHE_MIN_TTL", default=5.0)
+DNS_CACHE_MAX_TTL = env.float("DNS_CACHE_MAX_TTL", default=3600.0)
+DNS_CACHE_NEGATIVE_TTL = env.float("DNS_CACHE_NEGATIVE_TTL", default=30.0)
+# The response history is partitioned in spans of HISTORY_PARTITION_DAYS days (1 or 7), created
+# HISTORY_PARTITIONS_AHEAD_DAYS ahead. Users without a RetentionPolicy keep HISTORY_RETENTION_DAYS
+# days of history. Expired partitions are dropped, or detached if HISTORY_ARCHIVE_EXPIRED_PARTITIONS.
+HISTORY_PARTITION_DAYS = env.int("HISTORY_PARTITION_DAYS", default=1)
+HISTORY_PARTITIONS_AHEAD_DAYS = env.int("HISTORY_PARTITIONS_AHEAD_DAYS", default=7)
+HISTORY_RETENTION_DAYS = env.int("HISTORY_RETENTION_DAYS", default=90)
+HISTORY_ARCHIVE_EXPIRED_PARTITIONS = env.bool(
+    "HISTORY_ARCHIVE_EXPIRED_PARTITIONS", default=False
+)
+# Default and maximum page sizes of the response history API, see uptime_monitor.core.pagination.
+HISTORY_PAGE_SIZE = env.int("HISTORY_PAGE_SIZE", default=100)
+HISTORY_MAX_PAGE_SIZE = env.int("HISTORY_MAX_PAGE_SIZE", default=1000)
+# Minute and hour response rollups are kept ROLLUP_MINUTE_RETENTION_DAYS and
+# ROLLUP_HOUR_RETENTION_DAYS days, day rollups as long as their site, see uptime_monitor.core.rollups.
+ROLLUP_MINUTE_RETENTION_DAYS = env.int("ROLLUP_MINUTE_RETENTION_DAYS", default=7)
+ROLLUP_HOUR_RETENTION_DAYS = env.int("ROLLUP_HOUR_RETENTION_DAYS", default=90)
+# The stats API returns at most ROLLUP_MAX_BUCKETS buckets per request.
+ROLLUP_MAX_BUCKETS = env.int("ROLLUP_MAX_BUCKETS", default=1500)
+# Response bodies and header sets are stored once, compressed, see uptime_monitor.core.blobs.
+# HISTORY_BODY_POLICY is one of "non_pass", "always" or "never".
+HISTORY_BODY_POLICY = env("HISTORY_BODY_POLICY", default="non_pass")
+HISTORY_VOLATILE_HEADERS = env.list(
+    "HISTORY_VOLATILE_HEADERS",
+    default=[
+        "age",
+        "cf-ray",
+        "date",
+        "expires",
+        "nel",
+        "report-to",
+        "server-timing",
+        "set-cookie",
+        "x-request-id",
+    ],
+)
+HISTORY_BLOB_COMPRESSION_LEVEL = env.int("HISTORY_BLOB_COMPRESSION_LEVEL", default=6)
+HISTORY_BLOB_GC_BATCH_SIZE = env.int("HISTORY_BLOB_GC_BATCH_SIZE", default=10000)
+# Site registries recording changes only extend a run while the response time stays within
+# HISTORY_RUN_LATENCY_BAND times the run mean, or HISTORY_RUN_LATENCY_MIN_BAND seconds, and the
+# run is younger than HISTORY_RUN_MAX_SECONDS, see uptime_monitor.core.runs.
+HISTORY_RUN_LATENCY_BAND = env.float("HISTORY_RUN_LATENCY_BAND", default=0.5)
+HISTORY_RUN_LATENCY_MIN_BAND = env.float("HISTORY_RUN_LATENCY_MIN_BAND", default=0.1)
+HISTORY_RUN_MAX_SECONDS = env.int("HISTORY_RUN_MAX_SECONDS", default=3600)
+# Closed windows of the response history are archived to HISTORY_ARCHIVE_URI, a directory or an
+# S3 compatible URI, as "parquet" or "arrow" files, see uptime_monitor.core.archive. Empty disables it.
+HISTORY_ARCHIVE_URI = env("HISTORY_ARCHIVE_URI", default="")
+HISTORY_ARCHIVE_FORMAT = env("HISTORY_ARCHIVE_FORMAT", default="parquet")
+HISTORY_ARCHIVE_BATCH_SIZE = env.int("HISTORY_ARCHIVE_BATCH_SIZE", default=10000)
+# The history export streams HISTORY_EXPORT_CHUNK_SIZE rows at a time, see uptime_monitor.core.exports.
+HISTORY_EXPORT_CHUNK_SIZE = env.int("HISTORY_EXPORT_CHUNK_SIZE", default=2000)
+# The site ids of a user are cached in Redis for the status API for STATUS_USER_SITES_TTL
+# seconds, see uptime_monitor.core.current_status.
+STATUS_USER_SITES_TTL = env.int("STATUS_USER_SITES_TTL", default=300)
+# Websocket connections of an ASGI process share one Redis subscription, buffering at most
+# STATUS_EVENTS_QUEUE_SIZE status events per connection, see uptime_monitor.core.status_events.
+STATUS_EVENTS_QUEUE_SIZE = env.int("STATUS_EVENTS_QUEUE_SIZE", default=100)
+STATUS_EVENTS_RECONNECT_DELAY = env.float("STATUS_EVENTS_RECONNECT_DELAY", default=1.0)
+# With CHECK_SHARDING, check workers consume their own shard queue and sites are assigned to them
+# by consistent hashing of their "host" or "registry" id, see uptime_monitor.core.sharding.
+CHECK_SHARDING = env.bool("CHECK_SHARDING", default=False)
+CHECK_SHARD_KEY = env("CHECK_SHARD_KEY", default="host")
+CHECK_SHARD_VIRTUAL_NODES = env.int("CHECK_SHARD_VIRTUAL_NODES", default=128)
+CHECK_SHARD_HEARTBEAT_INTERVAL = env.float(
+    "CHECK_SHARD_HEARTBEAT_INTERVAL", default=5.0
+)
+CHECK_SHARD_TTL = env.float("CHECK_SHARD_TTL", default=20.0)
+CHECK_SHARD_REFRESH_INTERVAL = env.float("CHECK_SHARD_REFRESH_INTERVAL", default=5.0)
+# The check engine runs at most CHECK_HOST_CONCURRENCY probes per origin at once, starting at most
+# CHECK_HOST_RATE per second in bursts of CHECK_HOST_BURST (0 disables the rate limit). CHECK_HOST_LIMITS
+# overrides them by hosted_at group, e.g. {"cloudflare": {"concurrency": 16, "rate": 50, "burst": 50}}.
+# Probes waiting CHECK_HOST_DELAY_THRESHOLD seconds or more count as delayed, see uptime_monitor.core.politeness.
+CHECK_HOST_CONCURRENCY = env.int("CHECK_HOST_CONCURRENCY", default=4)
+CHECK_HOST_RATE = env.float("CHECK_HOST_RATE", default=5.0)
+CHECK_HOST_BURST = env.int("CHECK_HOST_BURST", default=5)
+CHECK_HOST_LIMITS = env.json("CHECK_HOST_LIMITS", default={})
+CHECK_HOST_DELAY_THRESHOLD = env.float("CHECK_HOST_DELAY_THRESHOLD", default=0.01)
+CHECK_HOST_LIMITERS_MAX_SIZE = env.int("CHECK_HOST_LIMITERS_MAX_SIZE", default=10000)
+# The wheel scheduler checks failing sites every recheck_interval of their schedule item for at most
+# SCHEDULER_RECHECK_CHECKS failures in a row, and doubles the interval of items with a max_interval
+# for every SCHEDULER_BACKOFF_AFTER seconds their site has been passing, see uptime_monitor.core.scheduler.
+SCHEDULER_RECHECK_CHECKS = env.int("SCHEDULER_RECHECK_CHECKS", default=5)
+SCHEDULER_BACKOFF_AFTER = env.int("SCHEDULER_BACKOFF_AFTER", default=3600)
+# Check results are sent to the response history consumer as msgpack envelopes, zlib compressed from
+# HISTORY_RESULT_COMPRESS_MIN_SIZE bytes, see uptime_monitor.core.envelopes. The headers of PASS checks
+# are only sent with HISTORY_KEEP_PASS_HEADERS.
+HISTORY_RESULT_ENVELOPE = env.bool("HISTORY_RESULT_ENVELOPE", default=True)
+HISTORY_RESULT_COMPRESS_MIN_SIZE = env.int(
+    "HISTORY_RESULT_COMPRESS_MIN_SIZE", default=512
+)
+HISTORY_RESULT_COMPRESSION_LEVEL = env.int(
+    "HISTORY_RESULT_COMPRESSION_LEVEL", default=1
+)
+HISTORY_KEEP_PASS_HEADERS = env.bool("HISTORY_KEEP_PASS_HEADERS", default=False)
+# Check results reach the response history writers through HISTORY_TRANSPORT, "celery" tasks on the
+# response_history queue, or a Redis "stream" written by the run_history_writer command in batches of
+# HISTORY_STREAM_BATCH_SIZE. Entries pending for HISTORY_STREAM_CLAIM_IDLE seconds are claimed again,
+# checked for every HISTORY_STREAM_CLAIM_INTERVAL seconds, see uptime_monitor.core.result_stream. Writers
+# log a warning while more than HISTORY_STREAM_BACKLOG_WARNING results wait in the stream, and move the
+# entries delivered more than HISTORY_STREAM_MAX_DELIVERIES times to a dead letter stream.
+HISTORY_TRANSPORT = env("HISTORY_TRANSPORT", default="celery")
+HISTORY_STREAM_BACKLOG_WARNING = env.int(
+    "HISTORY_STREAM_BACKLOG_WARNING", default=1000000
+)
+HISTORY_STREAM_BATCH_SIZE = env.int("HISTORY_STREAM_BATCH_SIZE", default=500)
+HISTORY_STREAM_BLOCK = env.float("HISTORY_STREAM_BLOCK", default=1.0)
+HISTORY_STREAM_CLAIM_IDLE = env.float("HISTORY_STREAM_CLAIM_IDLE", default=60.0)
+HISTORY_STREAM_CLAIM_INTERVAL = env.float("HISTORY_STREAM_CLAIM_INTERVAL", default=30.0)
+HISTORY_STREAM_MAX_DELIVERIES = env.int("HISTORY_STREAM_MAX_DELIVERIES", default=5)
@@ -14,17 +14,17 @@ SECRET_KEY = env(
 ALLOWED_HOSTS = ["localhost", "0.0.0.0", "127.0.0.1"]
 
 
-
 # AUTHENTICATION
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#authentication-backends
 
 # https://docs.djangoproject.com/en/dev/ref/settings/#admins
-ADMINS = [("""Demo user""", "demo"),
-          ]
+ADMINS = [
+    ("""Demo user""", "demo"),
+]
 
 AUTHENTICATION_BACKENDS += [
-    'uptime_monitor.auth.local.LocalAuth',
+    "uptime_monitor.auth.local.LocalAuth",
 ]
 
 # CACHES
@@ -7,8 +7,8 @@ from django.views import defaults as default_views
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework.authtoken.views import obtain_auth_token
 from uptime_monitor.core.urls import router
-urlpatterns = [
 
+urlpatterns = [
     path(
         "",
         SpectacularSwaggerView.as_view(url_name="api-schema"),
@@ -30,7 +30,6 @@ urlpatterns += [
     # DRF auth token
     path("auth-token/", obtain_auth_token),
     path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
-
 ]
 
 if settings.DEBUG:
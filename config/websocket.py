@@ -1,13 +1,243 @@
-async def websocket_application(scope, receive, send):
-    while True:
-        event = await receive()
+"""
+Websocket application pushing the status changes of sites to their users.
+
+Clients authenticate with their API token in the token query parameter, e.g.
+ws://localhost:8000/ws/?token=<key>, or with their session cookie from an origin
+in ALLOWED_HOSTS. Other connections are closed with code 4401.
+
+Clients send JSON messages:
+
+- {"action": "subscribe", "sites": [1, 2]} subscribes to sites of the user, or
+  to all of them, including the ones created later, without sites;
+- {"action": "unsubscribe", "sites": [1]} unsubscribes from sites, or from all
+  of them without sites.
+
+Both are answered with {"type": "subscribed", "sites": [...]}, sites being null
+when subscribed to all. Subscribing also sends the current status of the
+subscribed sites, then every status change is sent as a "status" event, see
+uptime_monitor.core.status_events. Events carry checked_at to order them. After
+a "resync" event, events may have been missed: clients subscribe again to get
+the current statuses. "ping" is answered with "pong!".
+"""
+import asyncio
+import json
+import logging
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, Optional, Set
+from urllib.parse import parse_qs, urlsplit
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.http.request import split_domain_port, validate_host
+from rest_framework.authtoken.models import Token
+
+from uptime_monitor.core.current_status import get_user_statuses
+from uptime_monitor.core.models import SiteRegistry
+from uptime_monitor.core.status_events import status_hub
+
+logger = logging.getLogger(__name__)
+
+# Close code of unauthenticated connections, like HTTP 401.
+UNAUTHORIZED = 4401
+
+
+def database(function):
+    """
+    Run the function in the thread of the Django ORM, closing stale connections around it.
+    """
+
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run)
+
+
+def allowed_origin(headers: Dict[bytes, bytes]) -> bool:
+    """
+    Returns whether the Origin header, if any, is in ALLOWED_HOSTS, against cross site hijacking.
+    """
+    origin = headers.get(b"origin")
+    if origin is None:
+        return True
+    domain, _ = split_domain_port(urlsplit(origin.decode("latin-1")).netloc)
+    return validate_host(domain, settings.ALLOWED_HOSTS)
+
+
+@database
+def authenticate(scope: Dict[str, Any]) -> Optional[int]:
+    """
+    Returns the id of the active user of the token or session of the connection.
+    """
+    query = parse_qs(scope.get("query_string", b"").decode())
+    if "token" in query:
+        token = (
+            Token.objects.select_related("user").filter(key=query["token"][0]).first()
+        )
+        if token is not None and token.user.is_active:
+            return token.user_id
+        return None
+
+    headers = dict(scope.get("headers", []))
+    cookies: SimpleCookie = SimpleCookie(headers.get(b"cookie", b"").decode("latin-1"))
+    session_cookie = cookies.get(settings.SESSION_COOKIE_NAME)
+    if session_cookie is None or not allowed_origin(headers):
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_cookie.value)
+    # get_user only reads the session of the request.
+    user = get_user(SimpleNamespace(session=session))  # type: ignore[arg-type]
+    return user.pk if user.is_authenticated else None
+
 
-        if event["type"] == "websocket.connect":
-            await send({"type": "websocket.accept"})
+@database
+def owned_sites(user_id: int, site_ids: Optional[Iterable[int]] = None) -> Set[int]:
+    """
+    Returns the ids of the sites of the user among site_ids, or all of them.
+    """
+    sites = SiteRegistry.objects.filter(user_id=user_id)
+    if site_ids is not None:
+        sites = sites.filter(id__in=site_ids)
+    return set(sites.values_list("id", flat=True))
 
-        if event["type"] == "websocket.disconnect":
-            break
 
-        if event["type"] == "websocket.receive":
-            if event["text"] == "ping":
-                await send({"type": "websocket.send", "text": "pong!"})
+def parse_sites(value: Any) -> Optional[Set[int]]:
+    """
+    Raises:
+        ValueError: If value is not null or a list of site ids.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(
+        isinstance(pk, int) and not isinstance(pk, bool) for pk in value
+    ):
+        raise ValueError("sites must be a list of site ids.")
+    return set(value)
+
+
+class StatusConnection:
+    """
+    The status subscriptions of a websocket connection.
+
+    Attributes:
+        user_id (int): The id of the authenticated user.
+        sites (Optional[Set[int]]): The subscribed site ids, None for all the sites of the user.
+    """
+
+    def __init__(self, user_id: int, send):
+        self.user_id = user_id
+        self.sites: Optional[Set[int]] = set()
+        self._send = send
+        self._send_lock = asyncio.Lock()
+        self._queue: Optional[asyncio.Queue] = None
+        self._forwarder: Optional[asyncio.Task] = None
+
+    async def send(self, data: Any) -> None:
+        text = data if isinstance(data, str) else json.dumps(data)
+        async with self._send_lock:
+            await self._send({"type": "websocket.send", "text": text})
+
+    def selected(self, site_id: int) -> bool:
+        return self.sites is None or site_id in self.sites
+
+    async def run(self, receive) -> None:
+        while True:
+            event = await receive()
+            if event["type"] == "websocket.disconnect":
+                return
+            if event["type"] == "websocket.receive":
+                await self.handle(event.get("text"))
+
+    async def handle(self, text: Optional[str]) -> None:
+        if text == "ping":
+            await self.send("pong!")
+            return
+        try:
+            message = json.loads(text or "")
+            action = message["action"]
+            sites = parse_sites(message.get("sites"))
+        except (TypeError, KeyError, ValueError) as error:
+            await self.send({"type": "error", "message": f"Invalid message: {error}"})
+            return
+        if action == "subscribe":
+            await self.subscribe(sites)
+        elif action == "unsubscribe":
+            await self.unsubscribe(sites)
+        else:
+            await self.send({"type": "error", "message": f"Unknown action: {action}"})
+
+    async def subscribe(self, sites: Optional[Set[int]]) -> None:
+        if sites is None:
+            self.sites = None
+        elif self.sites is not None:
+            self.sites |= await owned_sites(self.user_id, sites)
+        if self._queue is None:
+            self._queue = queue = await status_hub.subscribe(self.user_id)
+            self._forwarder = asyncio.create_task(self.forward(queue))
+        await self.send_subscribed()
+        await self.send_statuses()
+
+    async def unsubscribe(self, sites: Optional[Set[int]]) -> None:
+        if sites is None:
+            self.sites = set()
+        elif self.sites is None:
+            self.sites = await owned_sites(self.user_id) - sites
+        else:
+            self.sites -= sites
+        await self.send_subscribed()
+
+    async def send_subscribed(self) -> None:
+        sites = None if self.sites is None else sorted(self.sites)
+        await self.send({"type": "subscribed", "sites": sites})
+
+    async def send_statuses(self) -> None:
+        """
+        Send the current status of the subscribed sites.
+        """
+        try:
+            statuses = await database(get_user_statuses)(self.user_id)
+        except redis.RedisError:
+            logger.warning("Failed to read the site statuses of user %s", self.user_id)
+            return
+        for status in statuses:
+            if status["status"] is not None and self.selected(status["site"]):
+                await self.send({"type": "status", **status})
+
+    async def forward(self, queue: asyncio.Queue) -> None:
+        """
+        Send the events of the status hub for the subscribed sites.
+        """
+        while True:
+            event = await queue.get()
+            if event["type"] != "status" or self.selected(event["site"]):
+                await self.send(event)
+
+    async def close(self) -> None:
+        if self._forwarder is not None:
+            self._forwarder.cancel()
+        if self._queue is not None:
+            await status_hub.unsubscribe(self.user_id, self._queue)
+
+
+async def websocket_application(scope, receive, send):
+    event = await receive()
+    if event["type"] != "websocket.connect":
+        return
+    user_id = await authenticate(scope)
+    if user_id is None:
+        await send({"type": "websocket.close", "code": UNAUTHORIZED})
+        return
+    await send({"type": "websocket.accept"})
+
+    connection = StatusConnection(user_id, send)
+    try:
+        await connection.run(receive)
+    finally:
+        await connection.close()
@@ -1,7 +1,21 @@
 from django.contrib import admin
 
-from .models import ScheduleItem, SiteRegistry, SiteResponseHistory
+from .models import (
+    ContentAssertion,
+    ContentBlob,
+    HistoryArchive,
+    RetentionPolicy,
+    ScheduleItem,
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseRollup,
+)
 
 admin.site.register(SiteRegistry)
 admin.site.register(SiteResponseHistory)
 admin.site.register(ScheduleItem)
+admin.site.register(ContentAssertion)
+admin.site.register(RetentionPolicy)
+admin.site.register(SiteResponseRollup)
+admin.site.register(ContentBlob)
+admin.site.register(HistoryArchive)
@@ -2,10 +2,18 @@ from django.apps import AppConfig
 
 
 class CoreConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'uptime_monitor.core'
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "uptime_monitor.core"
 
     def ready(self) -> None:
-        from uptime_monitor.core.producer import check_site
-        from uptime_monitor.core.consumer import save_response_history
-        from uptime_monitor.core import signals
\ No newline at end of file
+        # Imported for their tasks and signal handlers.
+        from uptime_monitor.core import sharding, signals  # noqa: F401
+        from uptime_monitor.core.archive import archive_history  # noqa: F401
+        from uptime_monitor.core.consumer import (  # noqa: F401
+            save_response_history,
+            save_response_history_batch,
+        )
+        from uptime_monitor.core.partitions import (  # noqa: F401
+            maintain_history_partitions,
+        )
+        from uptime_monitor.core.producer import check_site, check_sites  # noqa: F401
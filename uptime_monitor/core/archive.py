@@ -0,0 +1,277 @@
+"""
+Columnar archive of the response history.
+
+Closed windows of the response history, one partition span of
+HISTORY_PARTITION_DAYS days each, are streamed from a server side cursor into
+one file per window under HISTORY_ARCHIVE_URI, in HISTORY_ARCHIVE_FORMAT:
+
+- "parquet": zstd compressed Parquet, the smallest;
+- "arrow": uncompressed Arrow IPC, which readers memory map without copying.
+
+HISTORY_ARCHIVE_URI is a local directory or an S3 compatible URI, e.g.
+s3://bucket/history?endpoint_override=minio:9000. Files are laid out as
+created_date=2023-06-15/history-20230615.parquet. A window is closed once
+HISTORY_RUN_MAX_SECONDS have passed since its end, as runs can't be extended
+after that. Windows are archived in order and recorded in HistoryArchive, and
+once archiving is enabled, partitions are only dropped after they are archived.
+
+Archived rows keep the digests of their bodies and headers, not the contents.
+Offline jobs read the archive with archive_dataset or read_archives instead of
+querying Postgres, e.g.:
+
+    table = read_archives(since, until, columns=["check_registry_id", "response_time"])
+    table.group_by("check_registry_id").aggregate([("response_time", "mean")])
+"""
+import datetime
+import logging
+import posixpath
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from pyarrow import fs
+
+from config.celery_app import app
+from uptime_monitor.core.models import (
+    ArchiveFormat,
+    HistoryArchive,
+    SiteResponseHistory,
+)
+from uptime_monitor.core.partitions import align
+from uptime_monitor.core.timings import PHASES
+
+logger = logging.getLogger(__name__)
+
+FIELDS = [
+    "id",
+    "check_registry_id",
+    "created_at",
+    "response_code",
+    "response_text",
+    "response_time",
+    "response_body_id",
+    "response_headers_id",
+    "run_count",
+    "last_seen_at",
+    "response_time_min",
+    "response_time_max",
+]
+TIMESTAMP = pa.timestamp("us", tz="UTC")
+SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("check_registry_id", pa.int64()),
+        ("created_at", TIMESTAMP),
+        ("response_code", pa.string()),
+        ("response_text", pa.string()),
+        ("response_time", pa.float64()),
+        ("response_body", pa.string()),
+        ("response_headers", pa.string()),
+        ("run_count", pa.int32()),
+        ("last_seen_at", TIMESTAMP),
+        ("response_time_min", pa.float64()),
+        ("response_time_max", pa.float64()),
+    ]
+    + [(f"timing_{phase}", pa.float64()) for phase in PHASES]
+)
+EXTENSIONS = {ArchiveFormat.PARQUET: "parquet", ArchiveFormat.ARROW: "arrow"}
+
+
+def filesystem() -> Tuple[fs.FileSystem, str]:
+    """
+    Returns the filesystem of HISTORY_ARCHIVE_URI and the base path of the archive in it.
+    """
+    return fs.FileSystem.from_uri(settings.HISTORY_ARCHIVE_URI)
+
+
+def to_record_batch(rows: Sequence[Tuple[Any, ...]]) -> pa.RecordBatch:
+    """
+    Returns the history rows, values of FIELDS and timings, as a record batch of SCHEMA.
+    """
+    columns: Dict[str, List[Any]] = defaultdict(list)
+    for *values, timings in rows:
+        for name, value in zip(SCHEMA.names, values):
+            columns[name].append(value)
+        for phase in PHASES:
+            columns[f"timing_{phase}"].append((timings or {}).get(phase))
+    return pa.RecordBatch.from_pydict(
+        {name: columns[name] for name in SCHEMA.names}, schema=SCHEMA
+    )
+
+
+def open_writer(format: str, sink: pa.NativeFile):
+    if format == ArchiveFormat.ARROW:
+        return pa.ipc.new_file(sink, SCHEMA)
+    return pq.ParquetWriter(sink, SCHEMA, compression="zstd")
+
+
+def archive_window(start: datetime.datetime, end: datetime.datetime) -> HistoryArchive:
+    """
+    Stream the history created in [start, end) into a file of the archive.
+        Rows are read with a server side cursor and written HISTORY_ARCHIVE_BATCH_SIZE
+        rows at a time, so memory doesn't grow with the size of the window. The cursor is
+        read in a transaction, like the exports: outside of one, Django declares it WITH HOLD
+        and Postgres materializes the whole window before the first fetch.
+    """
+    filesystem_, base = filesystem()
+    format = settings.HISTORY_ARCHIVE_FORMAT
+    directory = posixpath.join(base, f"created_date={start:%Y-%m-%d}")
+    path = posixpath.join(directory, f"history-{start:%Y%m%d}.{EXTENSIONS[format]}")
+    filesystem_.create_dir(directory, recursive=True)
+
+    batch_size = settings.HISTORY_ARCHIVE_BATCH_SIZE
+    rows = (
+        SiteResponseHistory.objects.filter(created_at__gte=start, created_at__lt=end)
+        .order_by("created_at", "id")
+        .values_list(*FIELDS, "timings")
+    )
+    row_count = 0
+    with transaction.atomic(), filesystem_.open_output_stream(
+        path
+    ) as sink, open_writer(format, sink) as writer:
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                writer.write_batch(to_record_batch(batch))
+                row_count += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(to_record_batch(batch))
+            row_count += len(batch)
+
+    archive = HistoryArchive.objects.create(
+        start=start, end=end, path=path, format=format, row_count=row_count
+    )
+    logger.info("Archived %d response histories to %s", row_count, path)
+    return archive
+
+
+def archive_closed_windows(now: datetime.datetime = None) -> List[HistoryArchive]:
+    """
+    Archive the closed windows following the last archived one, or the oldest history.
+
+    returns:
+        The new archives.
+    """
+    if not settings.HISTORY_ARCHIVE_URI:
+        return []
+    now = now or timezone.now()
+    span = datetime.timedelta(days=settings.HISTORY_PARTITION_DAYS)
+    start = HistoryArchive.objects.aggregate(end=Max("end"))["end"]
+    if start is None:
+        oldest = SiteResponseHistory.objects.aggregate(oldest=Min("created_at"))
+        if oldest["oldest"] is None:
+            return []
+        start = align(oldest["oldest"], settings.HISTORY_PARTITION_DAYS)
+    closed = now - datetime.timedelta(seconds=settings.HISTORY_RUN_MAX_SECONDS)
+    archives = []
+    while start + span <= closed:
+        archives.append(archive_window(start, start + span))
+        start += span
+    return archives
+
+
+def select_archives(
+    since: Optional[datetime.datetime], until: Optional[datetime.datetime]
+) -> List[HistoryArchive]:
+    archives = HistoryArchive.objects.order_by("start")
+    if since is not None:
+        archives = archives.filter(end__gt=since)
+    if until is not None:
+        archives = archives.filter(start__lt=until)
+    return list(archives)
+
+
+def archive_dataset(
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+) -> ds.Dataset:
+    """
+    Returns a dataset of the archived windows overlapping [since, until), to scan lazily.
+        Rows outside the range are not filtered out.
+    """
+    filesystem_, _ = filesystem()
+    paths: Dict[str, List[str]] = defaultdict(list)
+    for archive in select_archives(since, until):
+        paths[archive.format].append(archive.path)
+    return ds.dataset(
+        [
+            ds.dataset(
+                format_paths,
+                schema=SCHEMA,
+                format="ipc" if format == ArchiveFormat.ARROW else "parquet",
+                filesystem=filesystem_,
+            )
+            for format, format_paths in paths.items()
+        ]
+        or [ds.dataset([], schema=SCHEMA)],
+        schema=SCHEMA,
+    )
+
+
+def read_archive(
+    archive: HistoryArchive, columns: Optional[List[str]] = None
+) -> pa.Table:
+    """
+    Read an archived window. Local files are memory mapped, which is zero copy for Arrow files.
+    """
+    filesystem_, _ = filesystem()
+    local = isinstance(filesystem_, fs.LocalFileSystem)
+    if archive.format == ArchiveFormat.ARROW:
+        if local:
+            source = pa.memory_map(archive.path)
+        else:
+            source = filesystem_.open_input_file(archive.path)
+        table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+    return pq.read_table(
+        archive.path,
+        columns=columns,
+        memory_map=local,
+        filesystem=None if local else filesystem_,
+    )
+
+
+def read_archives(
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    columns: Optional[List[str]] = None,
+) -> pa.Table:
+    """
+    Returns the archived history created in [since, until).
+    """
+    read_columns = None if columns is None else sorted({*columns, "created_at"})
+    tables = [read_archive(a, read_columns) for a in select_archives(since, until)]
+    if not tables:
+        return SCHEMA.empty_table().select(columns or SCHEMA.names)
+    table = pa.concat_tables(tables)
+    mask = None
+    if since is not None:
+        mask = pc.greater_equal(table["created_at"], pa.scalar(since, TIMESTAMP))
+    if until is not None:
+        before = pc.less(table["created_at"], pa.scalar(until, TIMESTAMP))
+        mask = before if mask is None else pc.and_(mask, before)
+    if mask is not None:
+        table = table.filter(mask)
+    return table.select(columns or SCHEMA.names)
+
+
+@app.task(
+    name="archive_history",
+    ignore_result=True,
+    soft_time_limit=50 * 60,
+    time_limit=60 * 60,
+)
+def archive_history() -> None:
+    """
+    Archive the closed windows of the response history.
+    """
+    archive_closed_windows()
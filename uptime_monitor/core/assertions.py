@@ -0,0 +1,369 @@
+"""
+Compiled content assertions of site registries.
+
+Assertions are compiled once per distinct configuration and cached in the
+worker. Literal patterns are matched while the body streams in, with one
+Aho-Corasick automaton per case mode when a site has many of them, so the
+cost stays linear in the body size. Regexes and JSON paths need the body and
+run once it is read, up to the byte cap of the check.
+
+Regexes run with the backtracking re module, so check_regex rejects the patterns
+prone to catastrophic backtracking, nested unbounded quantifiers like (a+)+ and
+backreferences, and patterns longer than ASSERTION_REGEX_MAX_LENGTH. Regexes
+only scan the first ASSERTION_REGEX_MAX_CHARS characters of the body, which
+bounds the time of the patterns that pass anyway.
+"""
+import functools
+import json
+import re
+import sre_parse
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from uptime_monitor.core.models import AssertionKind, SiteRegistry
+
+# (kind, value, expected, case_sensitive) of a ContentAssertion.
+AssertionSpec = Tuple[str, str, Optional[str], bool]
+
+JSON_PATH_TOKEN = re.compile(r'\.([A-Za-z_][\w-]*)|\[(\d+)\]|\["([^"]+)"\]')
+MISSING = object()
+
+REPEATS = {
+    sre_parse.MAX_REPEAT,
+    sre_parse.MIN_REPEAT,
+    getattr(sre_parse, "POSSESSIVE_REPEAT", sre_parse.MAX_REPEAT),
+}
+
+
+def parse_json_path(path: str) -> List[Any]:
+    """
+    Parse a JSON path like $.data.items[0]["name"] into its keys and indexes.
+
+    Raises:
+        ValueError: If the path is not valid.
+    """
+    if not path.startswith("$"):
+        raise ValueError(f"JSON path must start with $: {path}")
+    keys: List[Any] = []
+    position = 1
+    while position < len(path):
+        match = JSON_PATH_TOKEN.match(path, position)
+        if not match:
+            raise ValueError(f"Invalid JSON path at {position}: {path}")
+        name, index, quoted = match.groups()
+        keys.append(int(index) if index is not None else name or quoted)
+        position = match.end()
+    return keys
+
+
+def check_regex_items(items: Iterable[Any], repeated: bool) -> None:
+    for op, av in items:
+        if op in REPEATS:
+            _, high, repeated_items = av
+            unbounded = high == sre_parse.MAXREPEAT
+            if repeated and unbounded:
+                raise ValueError("Nested unbounded quantifiers are not allowed")
+            check_regex_items(repeated_items, repeated or unbounded)
+        elif op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            raise ValueError("Backreferences are not allowed")
+        elif op == sre_parse.SUBPATTERN:
+            check_regex_items(av[-1], repeated)
+        elif op == sre_parse.BRANCH:
+            for branch in av[1]:
+                check_regex_items(branch, repeated)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            check_regex_items(av[1], repeated)
+        elif op == getattr(sre_parse, "ATOMIC_GROUP", None):
+            check_regex_items(av, repeated)
+
+
+def check_regex(pattern: str, flags: int = 0) -> re.Pattern:
+    """
+    Compile a REGEX assertion, rejecting the patterns prone to catastrophic backtracking.
+
+    Raises:
+        ValueError: If the pattern is invalid, too long, has nested unbounded quantifiers
+            or backreferences.
+    """
+    if len(pattern) > settings.ASSERTION_REGEX_MAX_LENGTH:
+        raise ValueError(
+            f"Regular expression longer than {settings.ASSERTION_REGEX_MAX_LENGTH} characters"
+        )
+    try:
+        check_regex_items(sre_parse.parse(pattern, flags).data, repeated=False)
+        return re.compile(pattern, flags)
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression: {e}") from e
+
+
+def resolve_json_path(document: Any, keys: List[Any]) -> Any:
+    for key in keys:
+        try:
+            document = document[key]
+        except (KeyError, IndexError, TypeError):
+            return MISSING
+    return document
+
+
+def parse_expected(expected: Optional[str]) -> Any:
+    """
+    Returns the expected value of a JSON path, as JSON if it parses and as a string otherwise.
+    """
+    if expected is None:
+        return None
+    try:
+        return json.loads(expected)
+    except ValueError:
+        return expected
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton matching many literal patterns in one pass.
+    """
+
+    def __init__(self, patterns: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(index)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def start(self) -> "AhoCorasickCursor":
+        return AhoCorasickCursor(self)
+
+
+class AhoCorasickCursor:
+    """
+    Matching state of one body, kept across chunks.
+    """
+
+    def __init__(self, automaton: AhoCorasick):
+        self.automaton = automaton
+        self.state = 0
+
+    def feed(self, text: str) -> Set[int]:
+        goto, fail, output = (
+            self.automaton.goto,
+            self.automaton.fail,
+            self.automaton.output,
+        )
+        state = self.state
+        matched: Set[int] = set()
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                matched.update(output[state])
+        self.state = state
+        return matched
+
+
+class SubstringMatcher:
+    """
+    Matches a few literal patterns with str.find, for sites below the Aho-Corasick threshold.
+    """
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = patterns
+        self.overlap = max((len(p) for p in patterns), default=1) - 1
+
+    def start(self) -> "SubstringCursor":
+        return SubstringCursor(self)
+
+
+class SubstringCursor:
+    """
+    Matching state of one body, keeping the end of the previous chunks.
+    """
+
+    def __init__(self, matcher: SubstringMatcher):
+        self.matcher = matcher
+        self.tail = ""
+
+    def feed(self, text: str) -> Set[int]:
+        window = self.tail + text
+        matched = {i for i, p in enumerate(self.matcher.patterns) if p in window}
+        start = max(0, len(window) - self.matcher.overlap)
+        self.tail = window[start:]
+        return matched
+
+
+def literal_matcher(patterns: List[str]):
+    if len(patterns) >= settings.ASSERTION_AHO_CORASICK_MIN_PATTERNS:
+        return AhoCorasick(patterns)
+    return SubstringMatcher(patterns)
+
+
+class CompiledAssertions:
+    """
+    The content assertions of a site registry, ready to run against bodies.
+
+    Attributes:
+        labels (List[str]): Description of every literal assertion, by literal index.
+        required (Set[int]): Indexes of the literals the body must contain.
+        forbidden (Set[int]): Indexes of the literals the body must not contain.
+        regexes (List[Tuple[str, re.Pattern]]): Regexes the body must match.
+        rejected (List[str]): Regexes check_regex rejects, saved before it did, which always fail.
+        json_paths (List[Tuple[str, List[Any], Any]]): JSON paths and their expected values.
+    """
+
+    def __init__(self, specs: Iterable[AssertionSpec]):
+        self.labels: List[str] = []
+        self.required: Set[int] = set()
+        self.forbidden: Set[int] = set()
+        self.regexes: List[Tuple[str, re.Pattern]] = []
+        self.rejected: List[str] = []
+        self.json_paths: List[Tuple[str, List[Any], Any]] = []
+        literals: Dict[bool, List[Tuple[int, str]]] = {False: [], True: []}
+
+        for kind, value, expected, case_sensitive in specs:
+            label = f"{kind} {value}"
+            if kind in (AssertionKind.CONTAINS, AssertionKind.NOT_CONTAINS):
+                index = len(self.labels)
+                self.labels.append(label)
+                pattern = value if case_sensitive else value.lower()
+                literals[case_sensitive].append((index, pattern))
+                if kind == AssertionKind.CONTAINS:
+                    self.required.add(index)
+                else:
+                    self.forbidden.add(index)
+            elif kind == AssertionKind.REGEX:
+                flags = 0 if case_sensitive else re.IGNORECASE
+                try:
+                    self.regexes.append((label, check_regex(value, flags)))
+                except ValueError as e:
+                    self.rejected.append(f"{label} ({e})")
+            elif kind == AssertionKind.JSON_PATH:
+                label = f"{label} == {expected}"
+                self.json_paths.append(
+                    (label, parse_json_path(value), parse_expected(expected))
+                )
+
+        self.matchers = [
+            (
+                case_sensitive,
+                [i for i, _ in group],
+                literal_matcher([p for _, p in group]),
+            )
+            for case_sensitive, group in literals.items()
+            if group
+        ]
+
+    @property
+    def needs_body(self) -> bool:
+        return bool(self.regexes or self.json_paths)
+
+    def start(self) -> "AssertionRun":
+        return AssertionRun(self)
+
+
+class AssertionRun:
+    """
+    Evaluation of the compiled assertions against one streamed body.
+    """
+
+    def __init__(self, compiled: CompiledAssertions):
+        self.compiled = compiled
+        self.cursors = [
+            (case_sensitive, indexes, matcher.start())
+            for case_sensitive, indexes, matcher in compiled.matchers
+        ]
+        self.matched: Set[int] = set()
+        self.body: List[str] = []
+
+    def feed(self, text: str) -> None:
+        lowered = None
+        for case_sensitive, indexes, cursor in self.cursors:
+            if not case_sensitive:
+                lowered = lowered if lowered is not None else text.lower()
+            for i in cursor.feed(text if case_sensitive else lowered):
+                self.matched.add(indexes[i])
+        if self.compiled.needs_body:
+            self.body.append(text)
+
+    @property
+    def decided(self) -> bool:
+        """
+        Whether reading more of the body can not change the outcome.
+        """
+        if self.matched & self.compiled.forbidden:
+            return True
+        if self.compiled.forbidden or self.compiled.needs_body:
+            return False
+        return self.compiled.required <= self.matched
+
+    def failures(self) -> List[str]:
+        """
+        Returns the labels of the failed assertions.
+        """
+        compiled = self.compiled
+        failed = [compiled.labels[i] for i in sorted(compiled.required - self.matched)]
+        failed += [
+            compiled.labels[i] for i in sorted(compiled.forbidden & self.matched)
+        ]
+        failed += compiled.rejected
+        if not compiled.needs_body:
+            return failed
+        body = "".join(self.body)
+        end = settings.ASSERTION_REGEX_MAX_CHARS
+        failed += [
+            label for label, regex in compiled.regexes if not regex.search(body, 0, end)
+        ]
+        if compiled.json_paths:
+            try:
+                document = json.loads(body)
+            except ValueError:
+                document = MISSING
+            for label, keys, expected in compiled.json_paths:
+                if document is MISSING or resolve_json_path(document, keys) != expected:
+                    failed.append(label)
+        return failed
+
+
+@functools.lru_cache(maxsize=settings.ASSERTION_CACHE_SIZE)
+def compile_assertions(specs: Tuple[AssertionSpec, ...]) -> CompiledAssertions:
+    return CompiledAssertions(specs)
+
+
+def get_assertions(check_registry: SiteRegistry) -> CompiledAssertions:
+    """
+    Returns the compiled assertions of the site registry, from the worker cache.
+        The legacy SiteRegistry.text is a case-insensitive CONTAINS assertion.
+        Prefetch the assertions relation to avoid a query per registry.
+    """
+    specs: List[AssertionSpec] = []
+    if check_registry.text:
+        specs.append((AssertionKind.CONTAINS, check_registry.text, None, False))
+    for assertion in check_registry.assertions.all():
+        specs.append(
+            (
+                assertion.kind,
+                assertion.value,
+                assertion.expected,
+                assertion.case_sensitive,
+            )
+        )
+    return compile_assertions(tuple(specs))
@@ -0,0 +1,164 @@
+"""
+Content addressed storage of response bodies and headers.
+
+Bodies and header sets are stored once in ContentBlob, zlib compressed and keyed
+by the SHA-256 of their content, and history rows only keep the digest. Header
+sets are made canonical first: sorted, without the headers in
+HISTORY_VOLATILE_HEADERS that change on every response, so the header sets of a
+site dedupe to a handful of blobs.
+
+Bodies are kept according to HISTORY_BODY_POLICY:
+
+- "non_pass" keeps the body snippet of FAIL and MISMATCH checks only;
+- "always" keeps it for every check that got a response;
+- "never" keeps no bodies.
+
+Blobs are never updated, and deleted by delete_orphan_blobs once no history row
+references them. Writers hold a shared advisory lock while they reference blobs
+and delete_orphan_blobs an exclusive one, so a blob can't be deleted between the
+check that it exists and the insert of the row referencing it.
+"""
+import hashlib
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple, Union, cast
+
+from django.conf import settings
+from django.db import connection, models, transaction
+
+from uptime_monitor.core.models import (
+    ContentBlob,
+    SiteResponseHistory,
+    SiteResponseStatus,
+)
+
+BODY_POLICIES = {
+    "always": (
+        SiteResponseStatus.PASS,
+        SiteResponseStatus.FAIL,
+        SiteResponseStatus.MISMATCH,
+    ),
+    "non_pass": (SiteResponseStatus.FAIL, SiteResponseStatus.MISMATCH),
+    "never": (),
+}
+# pg_advisory_xact_lock key guarding the deletion of blobs, "blob" in ASCII.
+BLOB_LOCK_KEY = 0x626C6F62
+
+Headers = Union[str, Iterable[Tuple[str, str]]]
+
+
+def keep_body(response_code: str) -> bool:
+    """
+    Returns whether the body of a check with response_code is kept by HISTORY_BODY_POLICY.
+    """
+    return response_code in BODY_POLICIES[settings.HISTORY_BODY_POLICY]
+
+
+def encode_headers(headers: Optional[Headers]) -> Optional[str]:
+    """
+    Returns the canonical text of a header set, one "name: value" line per header.
+
+    Args:
+        headers (Optional[Headers]): The (name, value) pairs of the headers. Texts, sent by
+            older workers, are returned as they are.
+    """
+    if headers is None or isinstance(headers, str):
+        return headers
+    volatile = {name.lower() for name in settings.HISTORY_VOLATILE_HEADERS}
+    lines = sorted(
+        f"{name.lower()}: {value}"
+        for name, value in headers
+        if name.lower() not in volatile
+    )
+    return "\n".join(lines)
+
+
+def content_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def store_contents(contents: Iterable[str]) -> Dict[str, str]:
+    """
+    Store the contents missing from the blob store. Must run in a transaction.
+        Only the contents without a blob yet are compressed and inserted.
+
+    returns:
+        The digest of every content, by content.
+    """
+    encoded = {content: content.encode() for content in set(contents)}
+    digests = {content: content_digest(data) for content, data in encoded.items()}
+    if not digests:
+        return digests
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock_shared(%s)", [BLOB_LOCK_KEY])
+    existing = set(
+        ContentBlob.objects.filter(digest__in=digests.values()).values_list(
+            "digest", flat=True
+        )
+    )
+    ContentBlob.objects.bulk_create(
+        [
+            ContentBlob(
+                digest=digests[content],
+                size=len(data),
+                data=zlib.compress(data, settings.HISTORY_BLOB_COMPRESSION_LEVEL),
+            )
+            for content, data in encoded.items()
+            if digests[content] not in existing
+        ],
+        ignore_conflicts=True,
+    )
+    return digests
+
+
+def read_contents(digests: Iterable[Optional[str]]) -> Dict[str, str]:
+    """
+    returns:
+        The content of every stored blob of digests, by digest.
+    """
+    blobs = ContentBlob.objects.filter(digest__in=[d for d in digests if d])
+    return {
+        digest: zlib.decompress(data).decode()
+        for digest, data in blobs.values_list("digest", "data")
+    }
+
+
+def delete_orphan_blobs() -> int:
+    """
+    Delete the blobs no history row references, HISTORY_BLOB_GC_BATCH_SIZE blobs per transaction.
+
+    returns:
+        The number of deleted blobs.
+    """
+    blob_table = ContentBlob._meta.db_table
+    history_table = SiteResponseHistory._meta.db_table
+    references: List[str] = [
+        cast(models.ForeignKey, SiteResponseHistory._meta.get_field(name)).column
+        for name in ("response_body", "response_headers")
+    ]
+    unreferenced = " AND ".join(
+        f"NOT EXISTS (SELECT 1 FROM {history_table} h WHERE h.{column} = b.digest)"
+        for column in references
+    )
+    deleted = 0
+    last_digest = ""
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [BLOB_LOCK_KEY])
+            cursor.execute(
+                f"""
+                WITH page AS (
+                    SELECT digest FROM {blob_table}
+                    WHERE digest > %s ORDER BY digest LIMIT %s
+                ), deleted AS (
+                    DELETE FROM {blob_table} b USING page
+                    WHERE b.digest = page.digest AND {unreferenced}
+                    RETURNING 1
+                )
+                SELECT (SELECT max(digest) FROM page), (SELECT count(*) FROM deleted)
+                """,
+                [last_digest, settings.HISTORY_BLOB_GC_BATCH_SIZE],
+            )
+            last_digest, count = cursor.fetchone()
+        deleted += count
+        if last_digest is None:
+            return deleted
@@ -0,0 +1,108 @@
+"""
+Per-worker registry of pooled HTTP clients.
+
+Every worker process keeps one httpx.Client and one httpx.AsyncClient whose
+connection pools keep connections alive per origin, so warm probes skip the
+TCP/TLS handshake and DNS. The async client is bound to the process' event
+loop, which is kept here as well. Their transports resolve hosts through the
+backends of core/network.py so DNS lookups are timed as their own phase.
+
+Pools are never shared across fork: a prefork child discards the state it
+inherited without closing it, because closing would shut the parent's sockets.
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import httpx
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+
+from uptime_monitor.core.network import make_async_transport, make_transport
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_limits() -> httpx.Limits:
+    """
+    Returns the pool limits shared by all pooled clients.
+    """
+    return httpx.Limits(
+        max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_client() -> httpx.Client:
+    """
+    Returns the pooled sync client of this process, created on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.Client(transport=make_transport(limits=get_limits()))
+    return _client
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the event loop of this process, created on first use.
+        The loop outlives single batches so the pooled async client can be reused.
+    """
+    global _event_loop
+    if _event_loop is None or _event_loop.is_closed():
+        _event_loop = asyncio.new_event_loop()
+    return _event_loop
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Returns the pooled async client of this process, created on first use.
+        Must only be used on the loop returned by get_event_loop.
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            transport=make_async_transport(limits=get_limits())
+        )
+    return _async_client
+
+
+def discard() -> None:
+    """
+    Forget the inherited clients and loop without closing them.
+    """
+    global _client, _async_client, _event_loop
+    _client = None
+    _async_client = None
+    _event_loop = None
+
+
+def reset() -> None:
+    """
+    Close the clients and the loop of this process.
+    """
+    global _client, _async_client, _event_loop
+    if _client is not None:
+        _client.close()
+    if _event_loop is not None and not _event_loop.is_closed():
+        if _async_client is not None:
+            _event_loop.run_until_complete(_async_client.aclose())
+        _event_loop.close()
+    discard()
+
+
+os.register_at_fork(after_in_child=discard)
+
+
+@worker_process_shutdown.connect
+def close_pooled_clients(**kwargs) -> None:
+    try:
+        reset()
+    except Exception:
+        logger.exception("Failed to close pooled HTTP clients")
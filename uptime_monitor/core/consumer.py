@@ -1,29 +1,331 @@
-from typing import Dict
+import datetime
+import logging
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+from celery_batches import Batches, SimpleRequest
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
 from config.celery_app import app
+from uptime_monitor.core.blobs import encode_headers, keep_body, store_contents
+from uptime_monitor.core.current_status import update_statuses
+from uptime_monitor.core.envelopes import encode_result, load_result
+from uptime_monitor.core.models import (
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseStatus,
+)
+from uptime_monitor.core.result_stream import add_results
+from uptime_monitor.core.rollups import RESPONDED, update_rollups
+from uptime_monitor.core.runs import collapse_runs, save_runs
+from uptime_monitor.core.status_events import publish_status_changes
 
-from uptime_monitor.core.serializers import SiteResponseHistorySerializer
-from django.db import transaction
+logger = logging.getLogger(__name__)
 
-import logging
+RESPONSE_TEXT_MAX_LENGTH = SiteResponseHistory._meta.get_field(
+    "response_text"
+).max_length
+DEAD_LETTER_QUEUE = "response_history.dead"
+
+
+def build_response_history(
+    data: Union[bytes, Dict[str, Any]]
+) -> Tuple[SiteResponseHistory, Dict[str, str]]:
+    """Build an unsaved SiteResponseHistory from a check result.
+        The body snippet of checks that got a response is kept as a blob by HISTORY_BODY_POLICY,
+        the error message of the others as response text. created_at is the checked_at of the
+        result, in seconds since the epoch, or now for results sent without it.
+    Args:
+        data (Union[bytes, Dict[str, Any]]): The check result, as sent by the producer,
+            or its envelope, see core/envelopes.py.
+    Raises:
+        ValueError: If the envelope is invalid or the response code is not a SiteResponseStatus.
+    Returns:
+        The history and the contents of its blob fields, by field name.
+    """
+    data = load_result(data)
+    response_code = data["response_code"]
+    if response_code not in SiteResponseStatus.values:
+        raise ValueError(f"Unknown response code: {response_code}")
+    contents = {}
+    response_text = data.get("response_text")
+    if response_code in RESPONDED:
+        if response_text and keep_body(response_code):
+            contents["response_body"] = response_text
+        response_text = None
+    elif response_text:
+        response_text = response_text[:RESPONSE_TEXT_MAX_LENGTH]
+    response_headers = encode_headers(data.get("response_headers"))
+    if response_headers is not None:
+        contents["response_headers"] = response_headers
+    history = SiteResponseHistory(
+        check_registry_id=int(data["check_registry"]),
+        response_code=response_code,
+        response_text=response_text,
+        response_time=float(data["response_time"]),
+        timings=data.get("timings"),
+        created_at=timezone.now(),
+    )
+    if data.get("checked_at") is not None:
+        history.created_at = datetime.datetime.fromtimestamp(
+            float(data["checked_at"]), tz=datetime.timezone.utc
+        )
+    return history, contents
 
-from uptime_monitor.core.models import SiteRegistry
 
+@transaction.atomic
+def write_response_history(
+    items: List[Union[bytes, Dict[str, Any]]]
+) -> List[SiteResponseHistory]:
+    """Save a batch of check results to the database.
+        Stores the new bodies and headers in the blob store, inserts all rows with one
+        bulk_create, moves last_checked_at of their SiteRegistry objects forward with one UPDATE
+        and folds them into their rollups and the current status of their sites. Checks
+        of registries recording changes only extend their open run instead when they can,
+        see core/runs.py. Results of deleted registries and invalid results are dropped.
+        The SiteRegistry rows are locked in id order first, which serializes the writers
+        of a registry, the current statuses included. Status changes are published once
+        the transaction commits, see core/status_events.py.
+    Args:
+        items (List[Union[bytes, Dict[str, Any]]]): The check results to save, or their
+            envelopes.
+    Returns:
+        The inserted SiteResponseHistory objects.
+    """
+    built = []
+    for data in items:
+        try:
+            built.append(build_response_history(data))
+        except (KeyError, TypeError, ValueError):
+            logger.exception("Dropping invalid response history: %s", data)
+
+    registries = {
+        pk: (user_id, changes_only)
+        for pk, user_id, changes_only in SiteRegistry.objects.select_for_update()
+        .filter(id__in={history.check_registry_id for history, _ in built})
+        .order_by("id")
+        .values_list("id", "user_id", "record_changes_only")
+    }
+    registry_ids = set(registries)
+    built = [
+        (h, contents) for h, contents in built if h.check_registry_id in registry_ids
+    ]
+    if not built:
+        return []
+    digests = store_contents(
+        content for _, contents in built for content in contents.values()
+    )
+    histories = []
+    for history, contents in built:
+        for field, content in contents.items():
+            setattr(history, f"{field}_id", digests[content])
+        histories.append(history)
+    # Results can arrive out of order, when they are requeued or recovered from the stream.
+    histories.sort(key=lambda history: history.created_at)
+    inserted, extended = collapse_runs(
+        histories, {pk for pk, (_, changes_only) in registries.items() if changes_only}
+    )
+    SiteResponseHistory.objects.bulk_create(inserted)
+    save_runs(extended)
+    update_rollups(histories)
+
+    last_checked_at: Dict[int, datetime.datetime] = {}
+    for history in histories:
+        last_checked_at[history.check_registry_id] = max(
+            history.created_at,
+            last_checked_at.get(history.check_registry_id, history.created_at),
+        )
+    whens = [When(id=pk, then=Value(ts)) for pk, ts in last_checked_at.items()]
+    SiteRegistry.objects.filter(id__in=last_checked_at).update(
+        last_checked_at=Greatest(
+            "last_checked_at", Case(*whens, output_field=DateTimeField())
+        )
+    )
+    changed = update_statuses(histories)
+    users = {pk: user_id for pk, (user_id, _) in registries.items()}
+    transaction.on_commit(lambda: publish_status_changes(changed, users))
+    logger.debug(
+        "Saved %d response histories, %d in runs",
+        len(histories),
+        len(histories) - len(inserted),
+    )
+    return inserted
+
+
+def message_options(data: Union[bytes, Dict[str, Any]]) -> Dict[str, str]:
+    """Returns the task message options of a check result or its envelope.
+    Envelopes are sent in msgpack task messages, which carry them as they are, with a
+    short kwargsrepr header instead of the repr of their bytes.
+    """
+    if isinstance(data, bytes):
+        return {
+            "serializer": "msgpack",
+            "kwargsrepr": f"{{'data': <{len(data)} bytes>}}",
+        }
+    return {}
+
+
+def send_response_history(
+    data: Union[bytes, Dict[str, Any]], attempt: int = 0, **options
+) -> None:
+    """Send a check result, or its envelope, to the save_response_history_batch task.
+    Args:
+        data (Union[bytes, Dict[str, Any]]): The check result or its envelope.
+        attempt (int): The number of failed writes of the result, sent along when it's retried.
+    """
+    kwargs = {"data": data, "attempt": attempt} if attempt else {"data": data}
+    save_response_history_batch.apply_async(
+        kwargs=kwargs,
+        queue=options.pop("queue", "response_history"),
+        ignore_result=True,
+        **message_options(data),
+        **options,
+    )
+
+
+def strip_result(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the check result without the fields the consumer doesn't keep.
+    Bodies HISTORY_BODY_POLICY doesn't keep are dropped, and so are the headers of PASS
+    checks unless HISTORY_KEEP_PASS_HEADERS.
+    """
+    response_code = data.get("response_code")
+    if response_code in RESPONDED and not keep_body(response_code):
+        data = {**data, "response_text": None}
+    if (
+        response_code == SiteResponseStatus.PASS
+        and not settings.HISTORY_KEEP_PASS_HEADERS
+    ):
+        data = {**data, "response_headers": None}
+    return data
+
+
+def compact_result(data: Dict[str, Any]) -> Union[bytes, Dict[str, Any]]:
+    """Returns what is sent to the save_response_history_batch task of a check result:
+        stripped by strip_result, and packed in a compact envelope with HISTORY_RESULT_ENVELOPE,
+        see core/envelopes.py.
+    Args:
+        data (Dict[str, Any]): The check result to save.
+    """
+    data = strip_result(data)
+    return encode_result(data) if settings.HISTORY_RESULT_ENVELOPE else data
+
+
+def publish_response_histories(items: Iterable[Dict[str, Any]]) -> None:
+    """Send check results to the consumer, by HISTORY_TRANSPORT: to the
+        save_response_history_batch task on response_history queue, compacted by compact_result,
+        or as envelopes to the result stream in one round trip, see core/result_stream.py.
+    Args:
+        items (Iterable[Dict[str, Any]]): The check results to save.
+    """
+    if settings.HISTORY_TRANSPORT == "stream":
+        add_results(encode_result(strip_result(data)) for data in items)
+        return
+    for data in items:
+        send_response_history(compact_result(data))
+
+
+def publish_response_history(data: Dict[str, Any]) -> None:
+    """Send a check result to the consumer, see publish_response_histories.
+    Args:
+        data (Dict[str, Any]): The check result to save.
+    """
+    publish_response_histories([data])
 
-logger = logging.getLogger(__name__)
 
 @app.task(name="save_response_history", ignore_result=True)
-def save_response_history(data: Dict[str,str]) -> None:
-    """ Save the response history to the database.
+def save_response_history(data: Dict[str, str]) -> None:
+    """Save the response history to the database.
         Updates the last_checked_at field of the SiteRegistry object.
     Args:
-        data (Dict[str,str]): The data to save. Must be a valid SiteResponseHistorySerializer.
+        data (Dict[str,str]): The check result to save.
     """
-    serializer = SiteResponseHistorySerializer(data=data)
-    serializer.is_valid(raise_exception=True)
-    with transaction.atomic():
-        instance = serializer.save()
-        SiteRegistry.objects.filter(id=serializer.validated_data["check_registry"].id).update(
-           last_checked_at = instance.created_at
-        )
+    write_response_history([data])
     logger.debug("Saved response history: %s", data)
-    
\ No newline at end of file
+
+
+def requeue_response_histories(requests: List[SimpleRequest]) -> None:
+    """Publish the results of the requests again after a connection error, with their number
+    of failed writes, or to the DEAD_LETTER_QUEUE once they failed HISTORY_BATCH_MAX_ATTEMPTS.
+    """
+    dead = 0
+    for request in requests:
+        attempt = request.kwargs.get("attempt", 0) + 1
+        if attempt < settings.HISTORY_BATCH_MAX_ATTEMPTS:
+            send_response_history(
+                request.kwargs["data"],
+                attempt,
+                countdown=settings.HISTORY_BATCH_INTERVAL,
+            )
+        else:
+            send_response_history(
+                request.kwargs["data"], attempt, queue=DEAD_LETTER_QUEUE
+            )
+            dead += 1
+    if dead:
+        logger.error(
+            "Sent %d response histories to %s after %d failed writes",
+            dead,
+            DEAD_LETTER_QUEUE,
+            settings.HISTORY_BATCH_MAX_ATTEMPTS,
+        )
+
+
+def write_response_history_requests(requests: List[SimpleRequest]) -> None:
+    """Save the results of the requests, bisecting the batch when the write fails on an error
+    a retry wouldn't fix, so that only the results still failing alone are dead lettered.
+    """
+    try:
+        write_response_history([request.kwargs["data"] for request in requests])
+    except (OperationalError, InterfaceError):
+        logger.exception(
+            "Failed to save %d response histories, requeueing", len(requests)
+        )
+        requeue_response_histories(requests)
+    except Exception:
+        if len(requests) == 1:
+            logger.exception(
+                "Failed to save a response history, sending it to %s", DEAD_LETTER_QUEUE
+            )
+            request = requests[0]
+            send_response_history(
+                request.kwargs["data"],
+                request.kwargs.get("attempt", 0) + 1,
+                queue=DEAD_LETTER_QUEUE,
+            )
+            return
+        logger.warning(
+            "Failed to save %d response histories, bisecting",
+            len(requests),
+            exc_info=True,
+        )
+        middle = len(requests) // 2
+        write_response_history_requests(requests[:middle])
+        write_response_history_requests(requests[middle:])
+
+
+@app.task(
+    name="save_response_history_batch",
+    base=Batches,
+    flush_every=settings.HISTORY_BATCH_SIZE,
+    flush_interval=settings.HISTORY_BATCH_INTERVAL,
+    acks_late=True,
+    ignore_result=True,
+)
+def save_response_history_batch(requests: List[SimpleRequest]) -> None:
+    """Save the buffered response histories to the database.
+        The worker buffers up to HISTORY_BATCH_SIZE messages or HISTORY_BATCH_INTERVAL seconds.
+        Messages are acknowledged only after this returns, so results buffered by a crashed
+        worker are redelivered. If the write fails on a connection error, the results are
+        published again before the acknowledgement, which makes delivery at-least-once, with the
+        number of failed writes. On any other error, which a retry wouldn't fix, the batch is
+        bisected until the failing results are found. Those, and the results that failed
+        HISTORY_BATCH_MAX_ATTEMPTS writes, are sent to the DEAD_LETTER_QUEUE, which no worker
+        consumes, for inspection.
+    Args:
+        requests (List[SimpleRequest]): The buffered task requests, each with a data kwarg,
+            a check result or its envelope.
+    """
+    write_response_history_requests(requests)
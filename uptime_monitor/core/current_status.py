@@ -0,0 +1,184 @@
+"""
+Current status of every site, kept in Redis.
+
+The consumer folds every check it saves into the current status of its site, a
+JSON record under site:status:<id> with the last status, response time and
+check time, the number of consecutive non PASS checks and when the status last
+changed. Records are read with MGET, one per check batch, and written back with
+MSET while the consumer holds the locks of the site registries, so writers of a
+site don't interleave. Checks made before the one of the current status, delivered
+late, don't change it.
+
+The ids of the sites of every user are cached in the Redis set
+user:sites:<user id>, loaded from Postgres on a miss and dropped by the signal
+handlers in core/signals.py when a site is created or deleted, so the status API
+serves all the sites of a user from Redis. The sets expire after
+STATUS_USER_SITES_TTL seconds, which bounds staleness when an invalidation is lost.
+
+Sites that start failing are also added to the Redis set scheduler:failing, so
+that the wheel scheduler rechecks them sooner, see core/scheduler.py. The set is
+kept whatever CHECK_SCHEDULER the consumer runs with, it's only read by the
+wheel scheduler.
+"""
+import datetime
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+import redis
+from django.conf import settings
+
+from uptime_monitor.core.models import (
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseStatus,
+)
+from uptime_monitor.utils.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+FAILING_SITES_KEY = "scheduler:failing"
+
+EMPTY_STATUS: Dict[str, Any] = {
+    "status": None,
+    "response_time": None,
+    "checked_at": None,
+    "consecutive_failures": 0,
+    "changed_at": None,
+}
+
+
+def status_key(check_registry_id: int) -> str:
+    return f"site:status:{check_registry_id}"
+
+
+def user_sites_key(user_id: int) -> str:
+    return f"user:sites:{user_id}"
+
+
+def next_status(
+    current: Optional[Dict[str, Any]], history: SiteResponseHistory
+) -> Dict[str, Any]:
+    """
+    Returns the current status of the site of history after it.
+    """
+    current = current or EMPTY_STATUS
+    checked_at = history.created_at.isoformat()
+    failed = history.response_code != SiteResponseStatus.PASS
+    changed = current["status"] != history.response_code
+    return {
+        "site": history.check_registry_id,
+        "status": history.response_code,
+        "response_time": history.response_time,
+        "checked_at": checked_at,
+        "consecutive_failures": current["consecutive_failures"] + 1 if failed else 0,
+        "changed_at": checked_at if changed else current["changed_at"],
+    }
+
+
+def update_statuses(histories: List[SiteResponseHistory]) -> List[Dict[str, Any]]:
+    """
+    Fold the checks into the current status of their sites, with one MGET and one MSET.
+        The site registries must be locked. Redis errors are logged, not raised.
+
+    Args:
+        histories (List[SiteResponseHistory]): The saved checks, by the time they were made.
+    returns:
+        The new statuses that changed the status of their site.
+    """
+    if not histories:
+        return []
+    check_registry_ids = list(dict.fromkeys(h.check_registry_id for h in histories))
+    keys = [status_key(pk) for pk in check_registry_ids]
+    try:
+        connection = get_redis_connection()
+        statuses = {
+            pk: json.loads(value) if value else None
+            for pk, value in zip(check_registry_ids, connection.mget(keys))
+        }
+        changed = {}
+        for history in histories:
+            current = statuses[history.check_registry_id]
+            if (
+                current
+                and datetime.datetime.fromisoformat(current["checked_at"])
+                > history.created_at
+            ):
+                continue
+            status = next_status(current, history)
+            statuses[history.check_registry_id] = status
+            if status["changed_at"] == status["checked_at"]:
+                changed[history.check_registry_id] = status
+        failing = [
+            pk
+            for pk, status in changed.items()
+            if status["status"] != SiteResponseStatus.PASS
+        ]
+        with connection.pipeline() as pipeline:
+            pipeline.mset(
+                {status_key(pk): json.dumps(status) for pk, status in statuses.items()}
+            )
+            if failing:
+                pipeline.sadd(FAILING_SITES_KEY, *failing)
+            pipeline.execute()
+    except redis.RedisError:
+        logger.exception("Failed to update the status of sites %s", check_registry_ids)
+        return []
+    return list(changed.values())
+
+
+def get_statuses(check_registry_ids: List[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+    """
+    Returns the current status of the sites by id, None for the sites without checks yet.
+
+    Raises:
+        redis.RedisError: If Redis is unavailable.
+    """
+    if not check_registry_ids:
+        return {}
+    values = get_redis_connection().mget([status_key(pk) for pk in check_registry_ids])
+    return {
+        pk: json.loads(value) if value else None
+        for pk, value in zip(check_registry_ids, values)
+    }
+
+
+def get_user_statuses(user_id: int) -> List[Dict[str, Any]]:
+    """
+    Returns the current status of every site of the user, by site id.
+        Sites without checks yet get an empty status.
+
+    Raises:
+        redis.RedisError: If Redis is unavailable.
+    """
+    connection = get_redis_connection()
+    key = user_sites_key(user_id)
+    check_registry_ids = sorted(int(pk) for pk in connection.smembers(key))
+    if not check_registry_ids:
+        check_registry_ids = sorted(
+            SiteRegistry.objects.filter(user_id=user_id).values_list("id", flat=True)
+        )
+        if check_registry_ids:
+            with connection.pipeline() as pipeline:
+                pipeline.sadd(key, *check_registry_ids)
+                pipeline.expire(key, settings.STATUS_USER_SITES_TTL)
+                pipeline.execute()
+    statuses = get_statuses(check_registry_ids)
+    return [statuses[pk] or {"site": pk, **EMPTY_STATUS} for pk in check_registry_ids]
+
+
+def forget_user_sites(user_id: int) -> None:
+    """
+    Drop the cached site ids of the user.
+    """
+    try:
+        get_redis_connection().delete(user_sites_key(user_id))
+    except redis.RedisError:
+        logger.exception("Failed to drop the cached sites of user %s", user_id)
+
+
+def delete_status(check_registry_id: int) -> None:
+    try:
+        get_redis_connection().delete(status_key(check_registry_id))
+    except redis.RedisError:
+        logger.exception("Failed to delete the status of site %s", check_registry_id)
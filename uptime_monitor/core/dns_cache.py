@@ -0,0 +1,321 @@
+"""
+Per-process DNS cache of the check engine.
+
+Many site registries share their hosts, see SiteRegistry.hosted_at, so new
+connections look their host up here instead of asking the local resolver every
+time. Hosts are resolved with dnspython, which exposes the record TTLs the
+system resolver hides:
+
+- positive answers are kept for the TTL of their A/AAAA records, clamped to
+  DNS_CACHE_MIN_TTL and DNS_CACHE_MAX_TTL;
+- names without addresses are kept as failures for DNS_CACHE_NEGATIVE_TTL;
+- concurrent lookups of the same host wait for the one in flight;
+- hosts unknown to DNS, such as /etc/hosts names, fall back to getaddrinfo and
+  are kept for DNS_CACHE_MIN_TTL.
+
+Resolver timeouts and server failures are raised without being cached. Checks
+of site registries with bypass_dns_cache always query DNS, so DNS itself is
+monitored, and refresh the cache with the answer.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+import httpcore
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+RECORD_TYPES = ("A", "AAAA")
+
+bypass_dns_cache: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "bypass_dns_cache", default=False
+)
+
+
+@dataclass
+class DNSEntry:
+    """
+    A cached lookup.
+
+    Attributes:
+        addresses (List[str]): The IP addresses of the host, IPv4 first.
+        expires_at (float): The clock time the entry expires at.
+        error (str): Why the host has no addresses, for negative entries.
+    """
+
+    addresses: List[str] = field(default_factory=list)
+    expires_at: float = 0.0
+    error: Optional[str] = None
+
+    def get_addresses(self) -> List[str]:
+        """
+        Raises:
+            httpcore.ConnectError: If the entry is negative.
+        """
+        if self.error:
+            raise httpcore.ConnectError(self.error)
+        return self.addresses
+
+
+class DNSCache:
+    """
+    TTL and LRU cache of host addresses, with deduplicated in-flight lookups.
+
+    Attributes:
+        max_size (int): Maximum number of cached hosts.
+        min_ttl (float): Minimum seconds a positive answer is kept.
+        max_ttl (float): Maximum seconds a positive answer is kept.
+        negative_ttl (float): Seconds a host without addresses is kept.
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        min_ttl: Optional[float] = None,
+        max_ttl: Optional[float] = None,
+        negative_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size or settings.DNS_CACHE_MAX_SIZE
+        self.min_ttl = settings.DNS_CACHE_MIN_TTL if min_ttl is None else min_ttl
+        self.max_ttl = settings.DNS_CACHE_MAX_TTL if max_ttl is None else max_ttl
+        self.negative_ttl = (
+            settings.DNS_CACHE_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+        )
+        self.clock = clock
+        self._resolver: Optional[dns.resolver.Resolver] = None
+        self._async_resolver: Optional[dns.asyncresolver.Resolver] = None
+        self.after_fork()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_resolver(self) -> dns.resolver.Resolver:
+        if self._resolver is None:
+            self._resolver = dns.resolver.Resolver()
+        return self._resolver
+
+    def get_async_resolver(self) -> dns.asyncresolver.Resolver:
+        if self._async_resolver is None:
+            self._async_resolver = dns.asyncresolver.Resolver()
+        return self._async_resolver
+
+    def lookup(self, host: str) -> Optional[DNSEntry]:
+        """
+        Returns the cached entry of the host, if it has not expired.
+        """
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is None or entry.expires_at <= self.clock():
+                return None
+            self._entries.move_to_end(host)
+            return entry
+
+    def store(self, host: str, entry: DNSEntry) -> None:
+        with self._lock:
+            self._entries[host] = entry
+            self._entries.move_to_end(host)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def build_entry(self, host: str, answers: List[dns.resolver.Answer]) -> DNSEntry:
+        """
+        Returns the entry of the A and AAAA answers of the host.
+        """
+        addresses: List[str] = []
+        ttls: List[int] = []
+        for answer in answers:
+            if answer.rrset:
+                addresses.extend(record.address for record in answer.rrset)
+                ttls.append(answer.rrset.ttl)
+        now = self.clock()
+        if not addresses:
+            return DNSEntry(
+                expires_at=now + self.negative_ttl, error=f"No addresses for {host}"
+            )
+        ttl = min(max(min(ttls), self.min_ttl), self.max_ttl)
+        return DNSEntry(addresses=addresses, expires_at=now + ttl)
+
+    def build_system_entry(self, host: str, addrinfo: Optional[list]) -> DNSEntry:
+        """
+        Returns the entry of a getaddrinfo result, which has no TTL.
+        """
+        addresses: List[str] = []
+        for _, _, _, _, sockaddr in sorted(
+            addrinfo or [], key=lambda info: info[0] != socket.AF_INET
+        ):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        if not addresses:
+            return DNSEntry(
+                expires_at=self.clock() + self.negative_ttl,
+                error=f"Failed to resolve {host}",
+            )
+        return DNSEntry(addresses=addresses, expires_at=self.clock() + self.min_ttl)
+
+    def query(self, host: str, timeout: Optional[float] = None) -> DNSEntry:
+        """
+        Look the host up, ignoring the cache.
+
+        Raises:
+            httpcore.ConnectTimeout: If the resolver did not answer in time.
+            httpcore.ConnectError: If the resolver failed.
+        """
+        try:
+            resolver = self.get_resolver()
+            answers = [
+                resolver.resolve(
+                    host, rdtype, lifetime=timeout, raise_on_no_answer=False
+                )
+                for rdtype in RECORD_TYPES
+            ]
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoResolverConfiguration):
+            try:
+                addrinfo = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+            except OSError:
+                addrinfo = None
+            return self.build_system_entry(host, addrinfo)
+        except dns.exception.Timeout as e:
+            raise httpcore.ConnectTimeout(f"Timed out resolving {host}") from e
+        except dns.exception.DNSException as e:
+            raise httpcore.ConnectError(f"Failed to resolve {host}: {e}") from e
+        return self.build_entry(host, answers)
+
+    async def aquery(self, host: str, timeout: Optional[float] = None) -> DNSEntry:
+        """
+        Look the host up on the running event loop, ignoring the cache, see query.
+        """
+        try:
+            resolver = self.get_async_resolver()
+            answers = await asyncio.gather(
+                *(
+                    resolver.resolve(
+                        host, rdtype, lifetime=timeout, raise_on_no_answer=False
+                    )
+                    for rdtype in RECORD_TYPES
+                )
+            )
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoResolverConfiguration):
+            try:
+                addrinfo = await asyncio.get_running_loop().getaddrinfo(
+                    host, None, type=socket.SOCK_STREAM
+                )
+            except OSError:
+                addrinfo = None
+            return self.build_system_entry(host, addrinfo)
+        except dns.exception.Timeout as e:
+            raise httpcore.ConnectTimeout(f"Timed out resolving {host}") from e
+        except dns.exception.DNSException as e:
+            raise httpcore.ConnectError(f"Failed to resolve {host}: {e}") from e
+        return self.build_entry(host, answers)
+
+    def resolve(
+        self, host: str, timeout: Optional[float] = None, bypass: bool = False
+    ) -> List[str]:
+        """
+        Returns the addresses of the host, from the cache if possible.
+            Threads looking up the same host wait for the first one.
+
+        Args:
+            host: The host name.
+            timeout: Seconds to wait for the resolver.
+            bypass: Query DNS even if the host is cached.
+
+        Raises:
+            httpcore.ConnectError: If the host has no addresses.
+        """
+        host = host.lower()
+        if bypass:
+            entry = self.query(host, timeout)
+            self.store(host, entry)
+            return entry.get_addresses()
+
+        cached = self.lookup(host)
+        if cached:
+            return cached.get_addresses()
+        with self._lock:
+            pending = self._pending.get(host)
+            if pending is None:
+                self._pending[host] = threading.Event()
+        if pending is not None:
+            pending.wait(timeout)
+            cached = self.lookup(host)
+            if cached:
+                return cached.get_addresses()
+            return self.resolve(host, timeout, bypass=True)
+        try:
+            entry = self.query(host, timeout)
+            self.store(host, entry)
+        finally:
+            with self._lock:
+                self._pending.pop(host).set()
+        return entry.get_addresses()
+
+    async def aresolve(
+        self, host: str, timeout: Optional[float] = None, bypass: bool = False
+    ) -> List[str]:
+        """
+        Returns the addresses of the host on the running event loop, see resolve.
+            Tasks looking up the same host await the first lookup.
+        """
+        host = host.lower()
+        if bypass:
+            entry = await self.aquery(host, timeout)
+            self.store(host, entry)
+            return entry.get_addresses()
+
+        cached = self.lookup(host)
+        if cached:
+            return cached.get_addresses()
+        pending = self._pending_async.get(host)
+        if pending is not None:
+            entry = await asyncio.shield(pending)
+            return entry.get_addresses()
+
+        pending = asyncio.get_running_loop().create_future()
+        self._pending_async[host] = pending
+        try:
+            entry = await self.aquery(host, timeout)
+            self.store(host, entry)
+            pending.set_result(entry)
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                e = httpcore.ConnectError(f"Lookup of {host} was cancelled")
+            pending.set_exception(e)
+            # Mark the exception as retrieved when nothing else awaits it.
+            pending.exception()
+            raise
+        finally:
+            del self._pending_async[host]
+        return entry.get_addresses()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def after_fork(self) -> None:
+        """
+        Drop the state inherited from the parent process.
+        """
+        self._entries: "OrderedDict[str, DNSEntry]" = OrderedDict()
+        self._pending: Dict[str, threading.Event] = {}
+        self._pending_async: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._resolver = None
+        self._async_resolver = None
+
+
+dns_cache = DNSCache()
+
+os.register_at_fork(after_in_child=dns_cache.after_fork)
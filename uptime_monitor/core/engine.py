@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from django.conf import settings
+
+from uptime_monitor.core import clients, network
+from uptime_monitor.core.dns_cache import bypass_dns_cache
+from uptime_monitor.core.evaluation import evaluate_stream
+from uptime_monitor.core.models import ConnectionMode, SiteRegistry, SiteResponseStatus
+from uptime_monitor.core.politeness import HostLimiters, host_limiters
+from uptime_monitor.core.registry_cache import registry_cache
+from uptime_monitor.core.timings import PhaseTimings, current_timings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CheckResult:
+    """
+    Outcome of a single probe, shaped like the response_history payload.
+
+    Attributes:
+        check_registry_id (int): The id of the checked site registry.
+        response_code (str): The SiteResponseStatus of the check.
+        response_text (str): A snippet of the response body or the error message.
+        response_time (float): Seconds spent on the request itself.
+        response_headers (List[Tuple[str, str]]): The (name, value) pairs of the response headers, if any.
+        timings (Dict[str, float]): Seconds per phase of the request, see core/timings.py.
+        checked_at (float): When the request was sent, in seconds since the epoch.
+    """
+
+    check_registry_id: int
+    response_code: str
+    response_text: Optional[str]
+    response_time: float
+    response_headers: Optional[List[Tuple[str, str]]] = None
+    timings: Optional[Dict[str, Optional[float]]] = None
+    checked_at: Optional[float] = None
+
+    def as_history_data(self) -> Dict[str, Any]:
+        """
+        Returns the result as the data accepted by the response history consumer.
+        """
+        return {
+            "check_registry": self.check_registry_id,
+            "response_code": self.response_code,
+            "response_text": self.response_text,
+            "response_time": self.response_time,
+            "response_headers": self.response_headers,
+            "timings": self.timings,
+            "checked_at": self.checked_at,
+        }
+
+
+async def send(
+    client: httpx.AsyncClient, check_registry: SiteRegistry, timings: PhaseTimings
+) -> Tuple[SiteResponseStatus, str, List[Tuple[str, str]]]:
+    """
+    Stream the request of the site registry and evaluate the response.
+        The body is only read until the outcome is known, see evaluate_stream.
+        The phases of the request are traced into timings.
+
+    returns:
+        A tuple of (SiteResponseStatus, response text snippet, response header pairs).
+    """
+    async with client.stream(
+        check_registry.http_method,
+        check_registry.url,
+        timeout=check_registry.timeout,
+        extensions={"trace": timings.atrace},
+    ) as resp:
+        status_code, response_text = await evaluate_stream(resp, check_registry)
+        return status_code, response_text, resp.headers.multi_items()
+
+
+async def probe(
+    client: httpx.AsyncClient,
+    check_registry: SiteRegistry,
+    semaphore: asyncio.Semaphore,
+    limiters: HostLimiters,
+) -> CheckResult:
+    """
+    Send the request for one site registry and evaluate the response.
+        The response time only covers the request, not the time spent waiting on the host
+        limiter, the semaphore or building the client, and is broken down into phases by PhaseTimings.
+        The host slot is taken first, so probes held back by their host don't hold the semaphore.
+        Cold registries get a new client so the request always pays for connection setup.
+        Any other error of the request or of the evaluation is logged and reported as an ERROR
+        of this site, so it doesn't fail the other probes of the batch.
+
+    Args:
+        client: The shared async client used by warm registries.
+        check_registry: The check registry to check.
+        semaphore: Bounds the number of in-flight probes.
+        limiters: Bound the in-flight probes and the rate of every host, see core/politeness.py.
+
+    returns:
+        The CheckResult of the probe.
+    """
+    async with limiters.slot(check_registry), semaphore:
+        logger.info("Sending request for %s", check_registry.url)
+        response_headers = None
+        cold_client = None
+        if check_registry.connection_mode == ConnectionMode.COLD:
+            cold_client = httpx.AsyncClient(transport=network.make_async_transport())
+        timings = PhaseTimings()
+        token = current_timings.set(timings)
+        bypass_token = bypass_dns_cache.set(check_registry.bypass_dns_cache)
+        checked_at = time.time()
+        try:
+            outcome = await send(cold_client or client, check_registry, timings)
+        except httpx.TimeoutException as e:
+            logger.exception("%s timeout.", check_registry.url)
+            status_code, response_text = SiteResponseStatus.TIMEOUT, str(e)
+        except httpx.HTTPError as e:
+            logger.exception("Error checking %s", check_registry.url)
+            status_code, response_text = SiteResponseStatus.ERROR, str(e)
+        except Exception as e:
+            logger.exception("Unexpected error checking %s", check_registry.url)
+            status_code, response_text = SiteResponseStatus.ERROR, repr(e)
+        else:
+            status_code, response_text, response_headers = outcome
+        finally:
+            response_time = timings.finish()
+            current_timings.reset(token)
+            bypass_dns_cache.reset(bypass_token)
+            if cold_client is not None:
+                await cold_client.aclose()
+
+    return CheckResult(
+        check_registry_id=check_registry.id,
+        response_code=status_code,
+        response_text=response_text,
+        response_time=response_time,
+        response_headers=response_headers,
+        timings=timings.as_dict(),
+        checked_at=checked_at,
+    )
+
+
+async def run_checks(
+    check_registries: Iterable[SiteRegistry],
+    concurrency: int,
+    client: Optional[httpx.AsyncClient] = None,
+    limiters: Optional[HostLimiters] = None,
+) -> List[CheckResult]:
+    """
+    Probe all site registries concurrently.
+
+    Args:
+        check_registries: The check registries to check.
+        concurrency: Maximum number of in-flight probes.
+        client: An optional client to use, defaults to the pooled client of this worker.
+        limiters: Optional host limiters to use, defaults to the ones of this worker.
+
+    returns:
+        The CheckResults, in the order of check_registries. Probes that raised anyway,
+        outside of the request, are ERRORs.
+    """
+    check_registries = list(check_registries)
+    semaphore = asyncio.Semaphore(concurrency)
+    client = client or clients.get_async_client()
+    if limiters is None:
+        limiters = host_limiters
+    outcomes = await asyncio.gather(
+        *(
+            probe(client, registry, semaphore, limiters)
+            for registry in check_registries
+        ),
+        return_exceptions=True,
+    )
+    results = []
+    for registry, outcome in zip(check_registries, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error("Failed to probe %s", registry.url, exc_info=outcome)
+            outcome = CheckResult(
+                check_registry_id=registry.id,
+                response_code=SiteResponseStatus.ERROR,
+                response_text=repr(outcome),
+                response_time=0.0,
+                checked_at=time.time(),
+            )
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        results.append(outcome)
+    return results
+
+
+def run_batch(
+    check_registry_ids: List[int], concurrency: Optional[int] = None
+) -> List[CheckResult]:
+    """
+    Get the site registries from the worker cache and run their checks on the event loop of this worker.
+
+    Args:
+        check_registry_ids: The ids of the check registries to check.
+        concurrency: Maximum number of in-flight probes, defaults to settings.CHECK_ENGINE_CONCURRENCY.
+
+    returns:
+        The CheckResults of the registries that still exist.
+    """
+    concurrency = concurrency or settings.CHECK_ENGINE_CONCURRENCY
+    found = registry_cache.get_many(check_registry_ids)
+    check_registries = [found[pk] for pk in check_registry_ids if pk in found]
+    if not check_registries:
+        return []
+    loop = clients.get_event_loop()
+    results = loop.run_until_complete(run_checks(check_registries, concurrency))
+    host_limiters.publish_stats()
+    return results
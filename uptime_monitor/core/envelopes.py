@@ -0,0 +1,97 @@
+"""
+Compact envelopes of the check results sent to the response history consumer.
+
+With HISTORY_RESULT_ENVELOPE set, producers send every check result to the
+response_history queue as a binary envelope instead of a JSON dict, and the task
+message is serialized with msgpack, which carries the envelope as is:
+
+- the fields of the result are packed with msgpack as an array, in the order of
+  RESULT_FIELDS, so field names aren't repeated in every message;
+- payloads of HISTORY_RESULT_COMPRESS_MIN_SIZE bytes or more are zlib compressed,
+  when that makes them smaller.
+
+The first byte of an envelope tells whether the rest is compressed, the first
+item of the array is the version of the layout. The consumer accepts both
+envelopes and dicts, so workers can be upgraded one at a time. Version 2 added
+checked_at, consumers decode both versions and must be upgraded first.
+
+The headers of PASS checks are dropped before sending unless
+HISTORY_KEEP_PASS_HEADERS, like their bodies by HISTORY_BODY_POLICY, see
+core/consumer.py. The benchmark_result_envelope command measures the broker bytes
+per check of both encodings.
+"""
+import zlib
+from typing import Any, Dict, Union
+
+import msgpack
+from django.conf import settings
+
+ENVELOPE_VERSION = 2
+RAW = b"\x00"
+ZLIB = b"\x01"
+
+RESULT_FIELDS = (
+    "check_registry",
+    "response_code",
+    "response_text",
+    "response_time",
+    "response_headers",
+    "timings",
+    "checked_at",
+)
+# The fields of every version of the layout.
+VERSION_FIELDS = {1: RESULT_FIELDS[:-1], ENVELOPE_VERSION: RESULT_FIELDS}
+
+
+def encode_result(data: Dict[str, Any]) -> bytes:
+    """
+    Returns the envelope of a check result.
+
+    Args:
+        data (Dict[str, Any]): The check result, as accepted by the response history consumer.
+    """
+    payload = msgpack.packb(
+        [ENVELOPE_VERSION, *(data.get(field) for field in RESULT_FIELDS)],
+        use_bin_type=True,
+    )
+    if len(payload) >= settings.HISTORY_RESULT_COMPRESS_MIN_SIZE:
+        compressed = zlib.compress(payload, settings.HISTORY_RESULT_COMPRESSION_LEVEL)
+        if len(compressed) < len(payload):
+            return ZLIB + compressed
+    return RAW + payload
+
+
+def decode_result(envelope: bytes) -> Dict[str, Any]:
+    """
+    Returns the check result of an envelope, with every field of RESULT_FIELDS.
+
+    Raises:
+        ValueError: If the envelope is corrupt or of an unknown version.
+    """
+    flag, payload = envelope[:1], envelope[1:]
+    try:
+        if flag == ZLIB:
+            payload = zlib.decompress(payload)
+        elif flag != RAW:
+            raise ValueError(f"Unknown envelope flag: {flag!r}")
+        version, *values = msgpack.unpackb(payload, raw=False)
+    except (zlib.error, ValueError, TypeError) as error:
+        raise ValueError(f"Invalid result envelope: {error}") from error
+    fields = VERSION_FIELDS.get(version)
+    if fields is None or len(values) != len(fields):
+        raise ValueError(f"Unknown result envelope version: {version}")
+    result = dict.fromkeys(RESULT_FIELDS)
+    result.update(zip(fields, values))
+    return result
+
+
+def load_result(data: Union[bytes, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Returns the check result of an envelope, or the dict sent without one.
+
+    Raises:
+        ValueError: If the envelope is invalid.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return decode_result(bytes(data))
+    return data
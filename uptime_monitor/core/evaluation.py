@@ -0,0 +1,133 @@
+import codecs
+import logging
+from typing import Optional, Tuple
+
+import httpx
+from django.conf import settings
+
+from uptime_monitor.core.assertions import get_assertions
+from uptime_monitor.core.models import SiteRegistry, SiteResponseStatus
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingEvaluator:
+    """
+    Evaluate a response from its body chunks without buffering the body.
+        The content assertions of the check registry, including its text, are matched
+        across chunk boundaries while the body streams in, see core/assertions.py. Only the
+        first snippet_length characters of the body are kept for the response text.
+
+    Attributes:
+        check_registry (SiteRegistry): The check registry to check.
+        max_bytes (int): Maximum number of body bytes to read.
+        snippet_length (int): Number of characters kept for the response text.
+        bytes_read (int): Number of body bytes read so far.
+        assertions (AssertionRun): The content assertions of the check registry.
+    """
+
+    def __init__(
+        self,
+        check_registry: SiteRegistry,
+        encoding: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        snippet_length: Optional[int] = None,
+    ):
+        self.check_registry = check_registry
+        self.max_bytes = max_bytes or settings.CHECK_MAX_BODY_BYTES
+        self.snippet_length = snippet_length or settings.CHECK_RESPONSE_SNIPPET_LENGTH
+        self.assertions = get_assertions(check_registry).start()
+        self.bytes_read = 0
+        self.snippet = ""
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding or "utf-8")(
+                errors="replace"
+            )
+        except LookupError:
+            self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    @property
+    def done(self) -> bool:
+        """
+        Whether reading more of the body can not change the outcome.
+        """
+        if self.bytes_read >= self.max_bytes:
+            return True
+        return self.assertions.decided and len(self.snippet) >= self.snippet_length
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        Process the next chunk of the body.
+
+        returns:
+            Whether the evaluator is done.
+        """
+        chunk = chunk[: self.max_bytes - self.bytes_read]
+        self.bytes_read += len(chunk)
+        self._feed_text(self._decoder.decode(chunk))
+        return self.done
+
+    def _feed_text(self, text: str) -> None:
+        if len(self.snippet) < self.snippet_length:
+            self.snippet += text[: self.snippet_length - len(self.snippet)]
+        self.assertions.feed(text)
+
+    def result(self, status_code: int) -> Tuple[SiteResponseStatus, str]:
+        """
+        Returns the SiteResponseStatus of the response, with the snippet as response text.
+            Failed content assertions are a MISMATCH, texts not found within max_bytes included.
+        """
+        self._feed_text(self._decoder.decode(b"", final=True))
+        failures = self.assertions.failures()
+        if failures:
+            logger.error(
+                "Site %s: Assertions failed in the first %d bytes: %s",
+                self.check_registry.url,
+                self.bytes_read,
+                "; ".join(failures),
+            )
+            return SiteResponseStatus.MISMATCH, self.snippet
+        elif self.check_registry.status_code != status_code:
+            logger.error(
+                "Site %s: Expected status code: %s, got %s ",
+                self.check_registry.url,
+                self.check_registry.status_code,
+                status_code,
+            )
+            return SiteResponseStatus.FAIL, self.snippet
+        return SiteResponseStatus.PASS, self.snippet
+
+
+async def evaluate_stream(
+    response: httpx.Response, check_registry: SiteRegistry
+) -> Tuple[SiteResponseStatus, str]:
+    """
+    Evaluate a streamed response, reading its body only as far as needed.
+
+    Args:
+        response: The streamed response, it is closed when the evaluation stops early.
+        check_registry: The check registry to check.
+
+    returns:
+        A tuple of (SiteResponseStatus, response text snippet).
+    """
+    evaluator = StreamingEvaluator(check_registry, response.encoding)
+    if not evaluator.done:
+        async for chunk in response.aiter_bytes():
+            if evaluator.feed(chunk):
+                break
+    return evaluator.result(response.status_code)
+
+
+def evaluate_stream_sync(
+    response: httpx.Response, check_registry: SiteRegistry
+) -> Tuple[SiteResponseStatus, str]:
+    """
+    Evaluate a streamed response of a sync client, see evaluate_stream.
+    """
+    evaluator = StreamingEvaluator(check_registry, response.encoding)
+    if not evaluator.done:
+        for chunk in response.iter_bytes():
+            if evaluator.feed(chunk):
+                break
+    return evaluator.result(response.status_code)
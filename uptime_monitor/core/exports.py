@@ -0,0 +1,92 @@
+"""
+Streaming exports of the response history as NDJSON or CSV.
+
+Rows are read oldest first through a server side cursor, HISTORY_EXPORT_CHUNK_SIZE
+at a time, inside a transaction of their own opened when the response starts
+streaming. Postgres doesn't have to materialize the result like it does for the
+WITH HOLD cursors used outside of transactions, and the export sees one
+snapshot. Lines are sent in chunks of the same number of rows, so memory stays
+constant whatever the range. Runs are one line each, with their run_count and
+last_seen_at, like in the history API.
+
+The generator reads the database, so under ASGI it has to be iterated in the
+thread of the request, as StreamingASGIHandler in uptime_monitor/utils/asgi.py
+does, not in the event loop.
+"""
+import csv
+import io
+import json
+from typing import Any, Dict, Iterator
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import QuerySet
+
+COLUMNS = [
+    "id",
+    "site",
+    "created_at",
+    "response_code",
+    "response_text",
+    "response_time",
+    "timings",
+    "run_count",
+    "last_seen_at",
+    "response_time_min",
+    "response_time_max",
+]
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def export_entry(row: Dict[str, Any]) -> Dict[str, Any]:
+    entry = {column: row.get(column) for column in COLUMNS}
+    entry["site"] = row["check_registry__url"]
+    entry["created_at"] = row["created_at"].isoformat()
+    if entry["last_seen_at"] is not None:
+        entry["last_seen_at"] = entry["last_seen_at"].isoformat()
+    return entry
+
+
+def ndjson_lines(entries: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    for entry in entries:
+        yield json.dumps(entry, cls=DjangoJSONEncoder) + "\n"
+
+
+def csv_lines(entries: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for entry in entries:
+        if entry["timings"] is not None:
+            entry["timings"] = json.dumps(entry["timings"])
+        writer.writerow([entry[column] for column in COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_history(queryset: QuerySet, file_format: str) -> Iterator[str]:
+    """
+    Yield the history rows of a values queryset as chunks of NDJSON or CSV lines.
+
+    Args:
+        queryset (QuerySet): The history rows, as values with check_registry__url.
+        file_format (str): "ndjson" or "csv".
+    """
+    chunk_size = settings.HISTORY_EXPORT_CHUNK_SIZE
+    lines = ndjson_lines if file_format == "ndjson" else csv_lines
+    with transaction.atomic():
+        rows = queryset.order_by("created_at", "id").iterator(chunk_size=chunk_size)
+        entries = (export_entry(row) for row in rows)
+        chunk = []
+        for line in lines(entries):
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield "".join(chunk)
+                chunk = []
+        if chunk:
+            yield "".join(chunk)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from uptime_monitor.core.archive import archive_closed_windows
+
+
+class Command(BaseCommand):
+    help = "Archive the closed windows of the response history to HISTORY_ARCHIVE_URI."
+
+    def handle(self, *args, **options):
+        for archive in archive_closed_windows():
+            self.stdout.write(f"{archive.path}: {archive.row_count} rows")
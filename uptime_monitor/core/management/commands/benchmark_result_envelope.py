@@ -0,0 +1,112 @@
+import base64
+import json
+import random
+import uuid
+from typing import Any, Dict, Union
+
+from django.core.management.base import BaseCommand
+from kombu.serialization import dumps
+
+from config.celery_app import app
+from uptime_monitor.core.consumer import compact_result, message_options
+from uptime_monitor.core.models import SiteResponseStatus
+
+SAMPLE_HEADERS = [
+    ("Content-Type", "text/html; charset=utf-8"),
+    ("Content-Encoding", "gzip"),
+    ("Cache-Control", "max-age=0, private, must-revalidate"),
+    ("Date", "Thu, 15 Jun 2023 12:00:00 GMT"),
+    ("Server", "nginx"),
+    ("Strict-Transport-Security", "max-age=31536000; includeSubDomains"),
+    ("Vary", "Accept-Encoding"),
+    ("X-Content-Type-Options", "nosniff"),
+    ("X-Frame-Options", "SAMEORIGIN"),
+    ("X-Request-Id", "4bf92f3577b34da6a3ce929d0e0e4736"),
+    ("Set-Cookie", "session=0123456789abcdef; Path=/; Secure; HttpOnly"),
+]
+
+
+def sample_result(check_registry_id: int, response_code: str, body_size: int):
+    words = ("<div>", "uptime", "monitor", "status", "</div>", "\n")
+    body = " ".join(random.choice(words) for _ in range(body_size // 5))[:body_size]
+    return {
+        "check_registry": check_registry_id,
+        "response_code": response_code,
+        "response_text": body,
+        "response_time": random.uniform(0.05, 2.0),
+        "response_headers": SAMPLE_HEADERS,
+        "timings": {
+            phase: random.uniform(0.001, 0.5)
+            for phase in ("dns", "connect", "tls", "ttfb", "transfer")
+        },
+    }
+
+
+def broker_bytes(data: Union[bytes, Dict[str, Any]]) -> int:
+    """
+    Returns the size of the save_response_history_batch message of data, as the Redis transport
+    stores it: the serialized body, base64 encoded, in a JSON envelope with the task headers.
+    """
+    options = message_options(data)
+    message = app.amqp.as_task_v2(
+        str(uuid.uuid4()),
+        "save_response_history_batch",
+        kwargs={"data": data},
+        kwargsrepr=options.get("kwargsrepr"),
+    )
+    content_type, content_encoding, body = dumps(
+        message.body, serializer=options.get("serializer", "json")
+    )
+    if isinstance(body, str):
+        body = body.encode(content_encoding)
+    stored = {
+        "body": base64.b64encode(body).decode(),
+        "content-encoding": content_encoding,
+        "content-type": content_type,
+        "headers": message.headers,
+        "properties": {
+            **message.properties,
+            "body_encoding": "base64",
+            "delivery_info": {"exchange": "", "routing_key": "response_history"},
+            "delivery_mode": 2,
+            "delivery_tag": str(uuid.uuid4()),
+            "priority": 0,
+        },
+    }
+    return len(json.dumps(stored, default=str))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the broker bytes per check of full JSON check results and of the results "
+        "compacted by HISTORY_BODY_POLICY, HISTORY_KEEP_PASS_HEADERS and HISTORY_RESULT_ENVELOPE, "
+        "on synthetic check results."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checks", type=int, default=1000)
+        parser.add_argument("--body-size", type=int, default=4096)
+        parser.add_argument(
+            "--pass-ratio",
+            type=float,
+            default=0.95,
+            help="The share of PASS checks, the others are FAIL.",
+        )
+
+    def handle(self, *args, **options):
+        results = [
+            sample_result(
+                i,
+                SiteResponseStatus.PASS
+                if random.random() < options["pass_ratio"]
+                else SiteResponseStatus.FAIL,
+                options["body_size"],
+            )
+            for i in range(options["checks"])
+        ]
+        before = sum(broker_bytes(data) for data in results)
+        after = sum(broker_bytes(compact_result(data)) for data in results)
+        checks = len(results) or 1
+        self.stdout.write(f"Full JSON results: {before / checks:.0f} bytes per check")
+        self.stdout.write(f"Compact results: {after / checks:.0f} bytes per check")
+        self.stdout.write(f"Saved: {1 - after / (before or 1):.1%}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from uptime_monitor.core.partitions import list_partitions, maintain_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the upcoming response history partitions, "
+        "remove the expired ones and apply the retention policies."
+    )
+
+    def handle(self, *args, **options):
+        maintain_partitions()
+        for partition in list_partitions():
+            self.stdout.write(
+                f"{partition.name}: {partition.start:%Y-%m-%d} - {partition.end:%Y-%m-%d}"
+            )
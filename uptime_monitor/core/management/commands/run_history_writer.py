@@ -0,0 +1,23 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from uptime_monitor.core.consumer import write_response_history
+from uptime_monitor.core.result_stream import ResultStreamWriter
+
+
+class Command(BaseCommand):
+    help = "Write the check results of the result stream to the response history."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--name", help="The consumer name of the writer, host:pid by default."
+        )
+
+    def handle(self, *args, **options):
+        writer = ResultStreamWriter(write_response_history, name=options["name"])
+        signal.signal(signal.SIGTERM, lambda signum, frame: writer.stop())
+        try:
+            writer.run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from uptime_monitor.core.scheduler import WheelScheduler
+
+
+class Command(BaseCommand):
+    help = "Run the timing-wheel scheduler that dispatches site checks in batches."
+
+    def handle(self, *args, **options):
+        try:
+            WheelScheduler().run()
+        except KeyboardInterrupt:
+            pass
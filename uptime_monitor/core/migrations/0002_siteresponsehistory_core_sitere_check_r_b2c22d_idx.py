@@ -6,12 +6,14 @@ from django.db import migrations, models
 class Migration(migrations.Migration):
 
     dependencies = [
-        ('core', '0001_initial'),
+        ("core", "0001_initial"),
     ]
 
     operations = [
         migrations.AddIndex(
-            model_name='siteresponsehistory',
-            index=models.Index(fields=['check_registry'], name='core_sitere_check_r_b2c22d_idx'),
+            model_name="siteresponsehistory",
+            index=models.Index(
+                fields=["check_registry"], name="core_sitere_check_r_b2c22d_idx"
+            ),
         ),
     ]
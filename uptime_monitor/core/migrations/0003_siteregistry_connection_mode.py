@@ -0,0 +1,31 @@
+# Generated by Django 4.0.8 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_siteresponsehistory_core_sitere_check_r_b2c22d_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="siteregistry",
+            name="connection_mode",
+            field=models.CharField(
+                choices=[
+                    (
+                        "WARM",
+                        "Reuse pooled keep-alive connections, the response time excludes connection setup.",
+                    ),
+                    (
+                        "COLD",
+                        "Open a new connection for every check, the response time includes DNS, TCP and TLS setup.",
+                    ),
+                ],
+                default="WARM",
+                max_length=4,
+            ),
+        ),
+    ]
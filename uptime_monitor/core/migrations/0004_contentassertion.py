@@ -0,0 +1,66 @@
+# Generated by Django 4.0.8 on 2026-10-18 02:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_siteregistry_connection_mode"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentAssertion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("CONTAINS", "The response body must contain the value."),
+                            (
+                                "NOT_CONTAINS",
+                                "The response body must not contain the value.",
+                            ),
+                            (
+                                "REGEX",
+                                "The response body must match the regular expression.",
+                            ),
+                            (
+                                "JSON_PATH",
+                                "The value at the JSON path must equal the expected value.",
+                            ),
+                        ],
+                        max_length=12,
+                    ),
+                ),
+                ("value", models.CharField(max_length=512)),
+                ("expected", models.CharField(blank=True, max_length=512, null=True)),
+                ("case_sensitive", models.BooleanField(default=False)),
+                (
+                    "check_registry",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="assertions",
+                        to="core.siteregistry",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="contentassertion",
+            index=models.Index(
+                fields=["check_registry"], name="core_conten_check_r_883131_idx"
+            ),
+        ),
+    ]
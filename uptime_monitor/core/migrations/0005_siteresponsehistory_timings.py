@@ -0,0 +1,18 @@
+# Generated by Django 4.0.8 on 2026-10-18 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_contentassertion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="siteresponsehistory",
+            name="timings",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.8 on 2026-10-18 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_siteresponsehistory_timings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="siteregistry",
+            name="bypass_dns_cache",
+            field=models.BooleanField(default=False),
+        ),
+    ]
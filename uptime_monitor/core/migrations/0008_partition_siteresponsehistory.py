@@ -0,0 +1,90 @@
+# Range partitions core_siteresponsehistory by created_at.
+#
+# Existing rows are copied into the default partition, the first run of the
+# maintain_history_partitions command moves them into their range partitions,
+# see uptime_monitor/core/partitions.py. Django keeps seeing id as the primary
+# key, Postgres requires the partition key in it so it is (id, created_at).
+
+from django.db import migrations
+
+INDEXES = (
+    ("core_sitere_check_r_b2c22d_idx", "(check_registry_id)"),
+    ("core_sitere_created_1090e4_idx", "(created_at DESC)"),
+    ("core_siteresponsehistory_check_registry_id_ca93318b", "(check_registry_id)"),
+)
+FOREIGN_KEY = "core_siteresponsehis_check_registry_id_ca93318b_fk_core_site"
+
+
+def rename_indexes(suffix_from, suffix_to):
+    return [
+        f"ALTER INDEX {name}{suffix_from} RENAME TO {name}{suffix_to};"
+        for name, _ in INDEXES
+    ]
+
+
+def create_indexes(table):
+    return [f"CREATE INDEX {name} ON {table} {columns};" for name, columns in INDEXES]
+
+
+PARTITION = [
+    "ALTER TABLE core_siteresponsehistory RENAME TO core_siteresponsehistory_old;",
+    "ALTER INDEX core_siteresponsehistory_pkey RENAME TO core_siteresponsehistory_old_pkey;",
+    *rename_indexes("", "_old"),
+    """
+    CREATE TABLE core_siteresponsehistory (
+        LIKE core_siteresponsehistory_old INCLUDING DEFAULTS
+    ) PARTITION BY RANGE (created_at);
+    """,
+    """
+    ALTER TABLE core_siteresponsehistory
+        ADD CONSTRAINT core_siteresponsehistory_pkey PRIMARY KEY (id, created_at);
+    """,
+    f"""
+    ALTER TABLE core_siteresponsehistory
+        ADD CONSTRAINT {FOREIGN_KEY} FOREIGN KEY (check_registry_id)
+        REFERENCES core_siteregistry (id) DEFERRABLE INITIALLY DEFERRED;
+    """,
+    *create_indexes("core_siteresponsehistory"),
+    """
+    CREATE TABLE core_siteresponsehistory_default
+        PARTITION OF core_siteresponsehistory DEFAULT;
+    """,
+    "INSERT INTO core_siteresponsehistory SELECT * FROM core_siteresponsehistory_old;",
+    "ALTER SEQUENCE core_siteresponsehistory_id_seq OWNED BY core_siteresponsehistory.id;",
+    "DROP TABLE core_siteresponsehistory_old;",
+]
+
+UNPARTITION = [
+    "ALTER TABLE core_siteresponsehistory RENAME TO core_siteresponsehistory_old;",
+    "ALTER INDEX core_siteresponsehistory_pkey RENAME TO core_siteresponsehistory_old_pkey;",
+    *rename_indexes("", "_old"),
+    """
+    CREATE TABLE core_siteresponsehistory (
+        LIKE core_siteresponsehistory_old INCLUDING DEFAULTS
+    );
+    """,
+    """
+    ALTER TABLE core_siteresponsehistory
+        ADD CONSTRAINT core_siteresponsehistory_pkey PRIMARY KEY (id);
+    """,
+    f"""
+    ALTER TABLE core_siteresponsehistory
+        ADD CONSTRAINT {FOREIGN_KEY} FOREIGN KEY (check_registry_id)
+        REFERENCES core_siteregistry (id) DEFERRABLE INITIALLY DEFERRED;
+    """,
+    *create_indexes("core_siteresponsehistory"),
+    "INSERT INTO core_siteresponsehistory SELECT * FROM core_siteresponsehistory_old;",
+    "ALTER SEQUENCE core_siteresponsehistory_id_seq OWNED BY core_siteresponsehistory.id;",
+    "DROP TABLE core_siteresponsehistory_old;",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_retentionpolicy"),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION, UNPARTITION),
+    ]
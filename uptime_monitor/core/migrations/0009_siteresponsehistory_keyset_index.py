@@ -0,0 +1,24 @@
+# Generated by Django 4.0.8 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_partition_siteresponsehistory"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="siteresponsehistory",
+            name="core_sitere_check_r_b2c22d_idx",
+        ),
+        migrations.AddIndex(
+            model_name="siteresponsehistory",
+            index=models.Index(
+                fields=["check_registry", "-created_at", "-id"],
+                name="core_sitere_check_r_1ac465_idx",
+            ),
+        ),
+    ]
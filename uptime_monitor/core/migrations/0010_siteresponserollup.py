@@ -0,0 +1,64 @@
+# Generated by Django 4.0.8 on 2026-10-18 02:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_siteresponsehistory_keyset_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SiteResponseRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[
+                            ("MINUTE", "One minute buckets."),
+                            ("HOUR", "One hour buckets."),
+                            ("DAY", "One day buckets."),
+                        ],
+                        max_length=6,
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("pass_count", models.PositiveIntegerField(default=0)),
+                ("fail_count", models.PositiveIntegerField(default=0)),
+                ("mismatch_count", models.PositiveIntegerField(default=0)),
+                ("timeout_count", models.PositiveIntegerField(default=0)),
+                ("error_count", models.PositiveIntegerField(default=0)),
+                ("response_time_min", models.FloatField(blank=True, null=True)),
+                ("response_time_max", models.FloatField(blank=True, null=True)),
+                ("response_time_sum", models.FloatField(default=0.0)),
+                ("response_time_histogram", models.JSONField(default=dict)),
+                (
+                    "check_registry",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="core.siteregistry",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="siteresponserollup",
+            constraint=models.UniqueConstraint(
+                fields=("check_registry", "granularity", "bucket"),
+                name="unique_site_response_rollup",
+            ),
+        ),
+    ]
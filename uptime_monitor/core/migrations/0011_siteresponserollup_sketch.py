@@ -0,0 +1,82 @@
+# Generated by Django 4.0.8 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+import math
+import struct
+
+# Bins of the histograms replaced by the sketches, see 0010_siteresponserollup.
+HISTOGRAM_GROWTH = 1.05
+
+# Frozen copy of the version 1 encoding of uptime_monitor.core.sketches, so this migration keeps
+# writing the sketches the code of this migration read, whatever later versions of the module do.
+SKETCH_VERSION = 1
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_LOG_GAMMA = math.log(
+    (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+)
+SKETCH_MIN_VALUE = 1e-6
+SKETCH_HEADER = struct.Struct("<Bd")
+
+
+def write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def histogram_to_sketch(histogram):
+    """
+    Returns the serialized sketch of the values of a histogram, at the geometric middle of their bin.
+        Histograms have less bins than the sketch limit, so bins are never collapsed.
+    """
+    zero_count = 0
+    bins = {}
+    for index, count in histogram.items():
+        value = HISTOGRAM_GROWTH ** (int(index) + 0.5)
+        if value < SKETCH_MIN_VALUE:
+            zero_count += count
+        else:
+            sketch_index = math.ceil(math.log(value) / SKETCH_LOG_GAMMA)
+            bins[sketch_index] = bins.get(sketch_index, 0) + count
+    buffer = bytearray(SKETCH_HEADER.pack(SKETCH_VERSION, SKETCH_RELATIVE_ACCURACY))
+    write_varint(buffer, zero_count)
+    write_varint(buffer, len(bins))
+    previous = 0
+    for sketch_index in sorted(bins):
+        delta = sketch_index - previous
+        write_varint(buffer, delta * 2 if delta >= 0 else -delta * 2 - 1)
+        write_varint(buffer, bins[sketch_index])
+        previous = sketch_index
+    return bytes(buffer)
+
+
+def histograms_to_sketches(apps, schema_editor):
+    SiteResponseRollup = apps.get_model("core", "SiteResponseRollup")
+    rollups = SiteResponseRollup.objects.exclude(response_time_histogram={})
+    for rollup in rollups.iterator():
+        rollup.response_time_sketch = histogram_to_sketch(
+            rollup.response_time_histogram
+        )
+        rollup.save(update_fields=["response_time_sketch"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_siteresponserollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="siteresponserollup",
+            name="response_time_sketch",
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.RunPython(histograms_to_sketches, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="siteresponserollup",
+            name="response_time_histogram",
+        ),
+    ]
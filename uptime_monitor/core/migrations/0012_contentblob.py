@@ -0,0 +1,92 @@
+# Generated by Django 4.0.8 on 2026-10-18 02:54
+
+import hashlib
+import zlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 2000
+
+
+def headers_to_blobs(apps, schema_editor):
+    """Move the header texts of the history into content blobs, once per distinct text."""
+    ContentBlob = apps.get_model("core", "ContentBlob")
+    SiteResponseHistory = apps.get_model("core", "SiteResponseHistory")
+    histories = SiteResponseHistory.objects.exclude(response_headers_text=None).only(
+        "id", "response_headers_text"
+    )
+    batch = []
+    for history in histories.iterator(chunk_size=BATCH_SIZE):
+        content = history.response_headers_text.encode()
+        digest = hashlib.sha256(content).hexdigest()
+        history.response_headers_id = digest
+        history.blob = ContentBlob(
+            digest=digest, size=len(content), data=zlib.compress(content)
+        )
+        batch.append(history)
+        if len(batch) == BATCH_SIZE:
+            save_batch(ContentBlob, SiteResponseHistory, batch)
+            batch = []
+    save_batch(ContentBlob, SiteResponseHistory, batch)
+
+
+def save_batch(ContentBlob, SiteResponseHistory, batch):
+    ContentBlob.objects.bulk_create([h.blob for h in batch], ignore_conflicts=True)
+    SiteResponseHistory.objects.bulk_update(batch, ["response_headers"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_siteresponserollup_sketch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentBlob",
+            fields=[
+                (
+                    "digest",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("size", models.PositiveIntegerField()),
+                ("data", models.BinaryField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="siteresponsehistory",
+            name="response_body",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="core.contentblob",
+            ),
+        ),
+        migrations.RenameField(
+            model_name="siteresponsehistory",
+            old_name="response_headers",
+            new_name="response_headers_text",
+        ),
+        migrations.AddField(
+            model_name="siteresponsehistory",
+            name="response_headers",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="core.contentblob",
+            ),
+        ),
+        migrations.RunPython(headers_to_blobs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="siteresponsehistory",
+            name="response_headers_text",
+        ),
+    ]
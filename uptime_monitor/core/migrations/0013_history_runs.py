@@ -0,0 +1,38 @@
+# Generated by Django 4.0.8 on 2026-10-18 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_contentblob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="siteregistry",
+            name="record_changes_only",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="siteresponsehistory",
+            name="last_seen_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="siteresponsehistory",
+            name="response_time_max",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="siteresponsehistory",
+            name="response_time_min",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="siteresponsehistory",
+            name="run_count",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.0.8 on 2026-10-18 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_history_runs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HistoryArchive",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start", models.DateTimeField(unique=True)),
+                ("end", models.DateTimeField()),
+                ("path", models.CharField(max_length=1024)),
+                (
+                    "format",
+                    models.CharField(
+                        choices=[
+                            ("parquet", "Parquet files."),
+                            ("arrow", "Arrow IPC files."),
+                        ],
+                        max_length=7,
+                    ),
+                ),
+                ("row_count", models.PositiveIntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
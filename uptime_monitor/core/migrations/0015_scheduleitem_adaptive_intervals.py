@@ -0,0 +1,23 @@
+# Generated by Django 4.0.8 on 2026-10-18 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_historyarchive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scheduleitem",
+            name="max_interval",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="scheduleitem",
+            name="recheck_interval",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
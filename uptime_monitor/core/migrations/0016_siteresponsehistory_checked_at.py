@@ -0,0 +1,21 @@
+# Generated by Django 4.0.8 on 2026-10-18 03:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_scheduleitem_adaptive_intervals"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="siteresponsehistory",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+    ]
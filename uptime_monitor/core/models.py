@@ -2,8 +2,10 @@ import json
 from http import HTTPMethod, HTTPStatus
 from typing import List, Tuple
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_celery_beat.models import IntervalSchedule, PeriodicTask
 
@@ -22,6 +24,30 @@ class SiteResponseStatus(models.TextChoices):
     ERROR = "ERROR", _("Request failed with an error.")
 
 
+class ConnectionMode(models.TextChoices):
+    WARM = "WARM", _(
+        "Reuse pooled keep-alive connections, the response time excludes connection setup."
+    )
+    COLD = "COLD", _(
+        "Open a new connection for every check, the response time includes DNS, TCP and TLS setup."
+    )
+
+
+class AssertionKind(models.TextChoices):
+    CONTAINS = "CONTAINS", _("The response body must contain the value.")
+    NOT_CONTAINS = "NOT_CONTAINS", _("The response body must not contain the value.")
+    REGEX = "REGEX", _("The response body must match the regular expression.")
+    JSON_PATH = "JSON_PATH", _(
+        "The value at the JSON path must equal the expected value."
+    )
+
+
+class RollupGranularity(models.TextChoices):
+    MINUTE = "MINUTE", _("One minute buckets.")
+    HOUR = "HOUR", _("One hour buckets.")
+    DAY = "DAY", _("One day buckets.")
+
+
 class SiteRegistry(models.Model):
     """
     Model representing a site registry for monitoring website status.
@@ -36,6 +62,10 @@ class SiteRegistry(models.Model):
         hosted_at (CharField): The name of the hosting service for the website.
         timeout (IntegerField): The maximum time allowed for the request before timing out.
         last_checked_at (DateTimeField): The date and time when this site registry was last checked.
+        connection_mode (CharField): Whether checks reuse pooled connections (warm) or open new ones (cold).
+        bypass_dns_cache (BooleanField): Whether new connections query DNS instead of the worker DNS cache.
+        record_changes_only (BooleanField): Whether consecutive identical outcomes are collapsed into
+            one history row, see core/runs.py.
     """
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -53,6 +83,11 @@ class SiteRegistry(models.Model):
     hosted_at = models.CharField(max_length=128, null=True, blank=True)
     timeout = models.IntegerField(default=5)
     last_checked_at = models.DateTimeField(null=True, blank=True)
+    connection_mode = models.CharField(
+        choices=ConnectionMode.choices, default=ConnectionMode.WARM, max_length=4
+    )
+    bypass_dns_cache = models.BooleanField(default=False)
+    record_changes_only = models.BooleanField(default=False)
 
     class Meta:
         indexes = [
@@ -66,17 +101,49 @@ class SiteRegistry(models.Model):
         return self.url
 
 
+class ContentBlob(models.Model):
+    """
+    ContentBlob representing a response body or header set, stored once and compressed.
+        Addressed by the SHA-256 of its content, see core/blobs.py.
+
+    Attributes:
+        digest (CharField): The SHA-256 hex digest of the content.
+        size (PositiveIntegerField): The size of the content in bytes, uncompressed.
+        data (BinaryField): The zlib compressed content.
+        created_at (DateTimeField): The date and time when this blob was first stored.
+    """
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.digest
+
+
 class SiteResponseHistory(models.Model):
     """
     SiteResponseHistory representing a site response history for monitoring website status.
+        The table is range partitioned by created_at in Postgres, with primary key (id, created_at),
+        see core/partitions.py for the partition maintenance and retention.
 
     Attributes:
         check_registry (ForeignKey): The site registry that this response history belongs to.
         response_code (CharField): The HTTP status code of the response.
-        response_text (CharField): The text of the response.
-        response_time (FloatField): The time taken to receive the response.
-        response_headers (TextField): The headers of the response.
-        created_at (DateTimeField): The date and time when this response history was created.
+        response_text (CharField): The error message of TIMEOUT and ERROR checks.
+        response_body (ForeignKey): The ContentBlob of the response body snippet, kept
+            according to HISTORY_BODY_POLICY.
+        response_time (FloatField): The time taken to receive the response, the mean of a run.
+        response_headers (ForeignKey): The ContentBlob of the response headers.
+        run_count (PositiveIntegerField): The number of identical consecutive checks the row
+            stands for, 1 unless the site registry records changes only.
+        last_seen_at (DateTimeField): The date and time of the last check of a run of more than one check.
+        response_time_min (FloatField): The shortest response time of the run.
+        response_time_max (FloatField): The longest response time of the run.
+        timings (JSONField): Seconds spent per phase of the request (dns, connect, tls, ttfb, download, total).
+        created_at (DateTimeField): The date and time of the check, stamped by the producer, or
+            when the consumer wrote it for results sent without it.
     """
 
     check_registry = models.ForeignKey(
@@ -84,20 +151,176 @@ class SiteResponseHistory(models.Model):
     )
     response_code = models.CharField(choices=SiteResponseStatus.choices, max_length=10)
     response_text = models.CharField(max_length=256, null=True, blank=True)
+    # Blobs are shared across rows and partitions, so no foreign key constraint is checked
+    # on insert. Unreferenced blobs are deleted by core/blobs.py delete_orphan_blobs.
+    response_body = models.ForeignKey(
+        ContentBlob,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
     response_time = models.FloatField()
-    response_headers = models.TextField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    response_headers = models.ForeignKey(
+        ContentBlob,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    timings = models.JSONField(null=True, blank=True)
+    run_count = models.PositiveIntegerField(default=1)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    response_time_min = models.FloatField(null=True, blank=True)
+    response_time_max = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         indexes = [
             models.Index(fields=["-created_at"]),
-            models.Index(fields=["check_registry"]),
+            # Serves the latest history of a site and the keyset pages of core/pagination.py.
+            models.Index(fields=["check_registry", "-created_at", "-id"]),
         ]
 
     def __str__(self) -> str:
         return "{} - {}".format(self.check_registry.url, self.response_code)
 
 
+class SiteResponseRollup(models.Model):
+    """
+    SiteResponseRollup representing the aggregated checks of a site registry in a time bucket.
+        Maintained by the response history consumer, see core/rollups.py. Latency statistics
+        only cover checks that got a response (PASS, FAIL and MISMATCH).
+
+    Attributes:
+        check_registry (ForeignKey): The site registry that this rollup belongs to.
+        granularity (CharField): The length of the bucket.
+        bucket (DateTimeField): The start of the bucket.
+        pass_count (PositiveIntegerField): Number of PASS checks.
+        fail_count (PositiveIntegerField): Number of FAIL checks.
+        mismatch_count (PositiveIntegerField): Number of MISMATCH checks.
+        timeout_count (PositiveIntegerField): Number of TIMEOUT checks.
+        error_count (PositiveIntegerField): Number of ERROR checks.
+        response_time_min (FloatField): The shortest response time.
+        response_time_max (FloatField): The longest response time.
+        response_time_sum (FloatField): The sum of the response times.
+        response_time_sketch (BinaryField): DDSketch of the response times, for percentiles,
+            see core/sketches.py.
+    """
+
+    check_registry = models.ForeignKey(
+        SiteRegistry, on_delete=models.CASCADE, related_name="rollups"
+    )
+    granularity = models.CharField(choices=RollupGranularity.choices, max_length=6)
+    bucket = models.DateTimeField()
+    pass_count = models.PositiveIntegerField(default=0)
+    fail_count = models.PositiveIntegerField(default=0)
+    mismatch_count = models.PositiveIntegerField(default=0)
+    timeout_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    response_time_min = models.FloatField(null=True, blank=True)
+    response_time_max = models.FloatField(null=True, blank=True)
+    response_time_sum = models.FloatField(default=0.0)
+    response_time_sketch = models.BinaryField(default=bytes)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["check_registry", "granularity", "bucket"],
+                name="unique_site_response_rollup",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return "{} - {} {}".format(
+            self.check_registry_id, self.granularity, self.bucket
+        )
+
+
+class RetentionPolicy(models.Model):
+    """
+    RetentionPolicy representing how long the response history of a user is kept.
+        Users without a policy keep their history for settings.HISTORY_RETENTION_DAYS.
+
+    Attributes:
+        user (OneToOneField): The user that this policy belongs to.
+        history_days (PositiveIntegerField): Days the response history of the user is kept.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name="retention_policy"
+    )
+    history_days = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name_plural = "retention policies"
+
+    def __str__(self) -> str:
+        return "{} - {} days".format(self.user, self.history_days)
+
+
+class ArchiveFormat(models.TextChoices):
+    PARQUET = "parquet", _("Parquet files.")
+    ARROW = "arrow", _("Arrow IPC files.")
+
+
+class HistoryArchive(models.Model):
+    """
+    HistoryArchive representing a closed time window of the response history archived to a file.
+        Written by core/archive.py.
+
+    Attributes:
+        start (DateTimeField): The first created_at of the window.
+        end (DateTimeField): The created_at the window ends before.
+        path (CharField): The path of the file in the HISTORY_ARCHIVE_URI filesystem.
+        format (CharField): The format of the file.
+        row_count (PositiveIntegerField): The number of archived history rows.
+        created_at (DateTimeField): The date and time when the window was archived.
+    """
+
+    start = models.DateTimeField(unique=True)
+    end = models.DateTimeField()
+    path = models.CharField(max_length=1024)
+    format = models.CharField(choices=ArchiveFormat.choices, max_length=7)
+    row_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.path
+
+
+class ContentAssertion(models.Model):
+    """
+    ContentAssertion representing a check of the response body of a site registry.
+        A failed assertion makes the check a SiteResponseStatus.MISMATCH.
+
+    Attributes:
+        check_registry (ForeignKey): The site registry that this assertion belongs to.
+        kind (CharField): The kind of the assertion.
+        value (CharField): The literal, regular expression or JSON path (e.g. $.status[0].name).
+        expected (CharField): The expected JSON value at the JSON path.
+        case_sensitive (BooleanField): Whether literals and regular expressions are case sensitive.
+    """
+
+    check_registry = models.ForeignKey(
+        SiteRegistry, on_delete=models.CASCADE, related_name="assertions"
+    )
+    kind = models.CharField(choices=AssertionKind.choices, max_length=12)
+    value = models.CharField(max_length=512)
+    expected = models.CharField(max_length=512, null=True, blank=True)
+    case_sensitive = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["check_registry"]),
+        ]
+
+    def __str__(self) -> str:
+        return "{} - {} {}".format(self.check_registry.url, self.kind, self.value)
+
+
 class ScheduleItem(models.Model):
     """
     ScheduleItem model representing a schedule item for monitoring website status.
@@ -107,6 +330,10 @@ class ScheduleItem(models.Model):
         check_registry (ForeignKey): The site registry that this schedule item belongs to.
         schedule (ForeignKey): The schedule of the schedule item.
         periodic_task (ForeignKey): The periodic task of the schedule item.
+        recheck_interval (PositiveIntegerField): Seconds between the checks following a failed check,
+            until the site passes again or SCHEDULER_RECHECK_CHECKS failures, null to keep the interval.
+        max_interval (PositiveIntegerField): Seconds the interval of a stable site can back off to,
+            null to keep the interval. Both are applied by the wheel scheduler only.
     """
 
     PRODUCER_TASK_NAME = "check_site"
@@ -119,6 +346,8 @@ class ScheduleItem(models.Model):
     periodic_task = models.ForeignKey(
         PeriodicTask, on_delete=models.SET_NULL, null=True, blank=True
     )
+    recheck_interval = models.PositiveIntegerField(null=True, blank=True)
+    max_interval = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         indexes = [
@@ -131,7 +360,15 @@ class ScheduleItem(models.Model):
     def save(self, *args, **kwargs):
         """
         Save the schedule item and create a periodic task if it does not exist.
+            The periodic task is only used by the beat scheduler, see settings.CHECK_SCHEDULER.
+            With the wheel scheduler, the periodic task left by beat is disabled.
         """
+        if settings.CHECK_SCHEDULER != "beat":
+            if self.periodic_task is not None and self.periodic_task.enabled:
+                self.periodic_task.enabled = False
+                self.periodic_task.save()
+            super().save(*args, **kwargs)
+            return
 
         try:
             self.periodic_task = PeriodicTask.objects.get(
@@ -152,5 +389,6 @@ class ScheduleItem(models.Model):
         """
         Delete the schedule item and the periodic task.
         """
-        self.periodic_task.delete()
+        if self.periodic_task:
+            self.periodic_task.delete()
         super().delete(*args, **kwargs)
@@ -0,0 +1,332 @@
+"""
+httpcore network backends that resolve hosts themselves.
+
+httpcore resolves the host inside connect_tcp, so the DNS lookup would be part of
+the connect phase. These backends resolve first, through the DNS cache of
+core/dns_cache.py unless DNS_CACHE_ENABLED is off, record the lookup as the dns
+phase of the current PhaseTimings, see core/timings.py, and then connect to the
+resolved addresses in order.
+
+httpx has no option for the network backend, make_transport and
+make_async_transport return transports sending the requests of httpx clients
+through httpcore connection pools using these backends.
+"""
+import contextlib
+import ipaddress
+import socket
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    cast,
+)
+
+import anyio
+import httpcore
+import httpx
+from django.conf import settings
+
+from uptime_monitor.core.dns_cache import bypass_dns_cache, dns_cache
+from uptime_monitor.core.timings import current_timings
+
+Address = Tuple[str, int]
+
+# The default limits of httpx transports.
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+
+def is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def addresses_from_addrinfo(addrinfo: Iterable[tuple]) -> List[Address]:
+    """
+    Returns the distinct (ip, port) addresses of getaddrinfo results, in order.
+    """
+    addresses: List[Address] = []
+    for _, _, _, _, sockaddr in addrinfo:
+        address = (sockaddr[0], sockaddr[1])
+        if address not in addresses:
+            addresses.append(address)
+    return addresses
+
+
+class ResolvingBackend(httpcore.SyncBackend):
+    """
+    Sync network backend timing the DNS lookup separately from the connection.
+    """
+
+    def resolve(
+        self, host: str, port: int, timeout: Optional[float] = None
+    ) -> List[Address]:
+        if settings.DNS_CACHE_ENABLED:
+            addresses = dns_cache.resolve(host, timeout, bypass=bypass_dns_cache.get())
+            return [(address, port) for address in addresses]
+        try:
+            addrinfo = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            raise httpcore.ConnectError(f"Failed to resolve {host}: {e}") from e
+        return addresses_from_addrinfo(addrinfo)
+
+    def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options=None,
+    ) -> httpcore.NetworkStream:
+        if is_ip_address(host):
+            addresses = [(host, port)]
+        else:
+            timings = current_timings.get()
+            if timings:
+                timings.start("dns")
+            try:
+                addresses = self.resolve(host, port, timeout)
+            finally:
+                if timings:
+                    timings.stop("dns")
+        error = None
+        for address, address_port in addresses:
+            try:
+                return super().connect_tcp(
+                    address,
+                    address_port,
+                    timeout=timeout,
+                    local_address=local_address,
+                    socket_options=socket_options,
+                )
+            except httpcore.ConnectTimeout:
+                raise
+            except httpcore.ConnectError as e:
+                error = e
+        raise error or httpcore.ConnectError(f"No addresses for {host}")
+
+
+class AsyncResolvingBackend(httpcore.AnyIOBackend):
+    """
+    Async network backend timing the DNS lookup separately from the connection.
+    """
+
+    async def resolve(
+        self, host: str, port: int, timeout: Optional[float] = None
+    ) -> List[Address]:
+        if settings.DNS_CACHE_ENABLED:
+            try:
+                with anyio.fail_after(timeout):
+                    addresses = await dns_cache.aresolve(
+                        host, timeout, bypass=bypass_dns_cache.get()
+                    )
+            except TimeoutError as e:
+                raise httpcore.ConnectTimeout(f"Timed out resolving {host}") from e
+            return [(address, port) for address in addresses]
+        try:
+            with anyio.fail_after(timeout):
+                addrinfo = await anyio.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except TimeoutError as e:
+            raise httpcore.ConnectTimeout(f"Timed out resolving {host}") from e
+        except OSError as e:
+            raise httpcore.ConnectError(f"Failed to resolve {host}: {e}") from e
+        return addresses_from_addrinfo(addrinfo)
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options=None,
+    ) -> httpcore.AsyncNetworkStream:
+        if is_ip_address(host):
+            addresses = [(host, port)]
+        else:
+            timings = current_timings.get()
+            if timings:
+                timings.start("dns")
+            try:
+                addresses = await self.resolve(host, port, timeout)
+            finally:
+                if timings:
+                    timings.stop("dns")
+        error = None
+        for address, address_port in addresses:
+            try:
+                return await super().connect_tcp(
+                    address,
+                    address_port,
+                    timeout=timeout,
+                    local_address=local_address,
+                    socket_options=socket_options,
+                )
+            except httpcore.ConnectTimeout:
+                raise
+            except httpcore.ConnectError as e:
+                error = e
+        raise error or httpcore.ConnectError(f"No addresses for {host}")
+
+
+# The httpx exception raised for each httpcore exception, most specific first.
+HTTPCORE_EXCEPTIONS: List[Tuple[Type[Exception], Type[httpx.HTTPError]]] = [
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.ProxyError, httpx.ProxyError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+]
+
+
+@contextlib.contextmanager
+def map_httpcore_exceptions() -> Iterator[None]:
+    """
+    Raise the httpcore exceptions as the httpx exceptions the checks handle.
+    """
+    try:
+        yield
+    except Exception as e:
+        for httpcore_exception, httpx_exception in HTTPCORE_EXCEPTIONS:
+            if isinstance(e, httpcore_exception):
+                raise httpx_exception(str(e)) from e
+        raise
+
+
+def core_request(request: httpx.Request) -> httpcore.Request:
+    return httpcore.Request(
+        method=request.method,
+        url=httpcore.URL(
+            scheme=request.url.raw_scheme,
+            host=request.url.raw_host,
+            port=request.url.port,
+            target=request.url.raw_path,
+        ),
+        headers=request.headers.raw,
+        content=request.stream,
+        extensions=request.extensions,
+    )
+
+
+class ResponseStream(httpx.SyncByteStream):
+    def __init__(self, stream: Iterable[bytes]):
+        self._stream = stream
+
+    def __iter__(self) -> Iterator[bytes]:
+        with map_httpcore_exceptions():
+            yield from self._stream
+
+    def close(self) -> None:
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+
+
+class AsyncResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream: AsyncIterable[bytes]):
+        self._stream = stream
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with map_httpcore_exceptions():
+            async for part in self._stream:
+                yield part
+
+    async def aclose(self) -> None:
+        aclose = getattr(self._stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class PoolTransport(httpx.BaseTransport):
+    """
+    httpx transport sending the requests through an httpcore.ConnectionPool.
+
+    Attributes:
+        pool (httpcore.ConnectionPool): The pool of connections.
+    """
+
+    def __init__(self, pool: httpcore.ConnectionPool):
+        self.pool = pool
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with map_httpcore_exceptions():
+            response = self.pool.handle_request(core_request(request))
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=ResponseStream(cast(Iterable[bytes], response.stream)),
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class AsyncPoolTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport sending the requests through an httpcore.AsyncConnectionPool.
+
+    Attributes:
+        pool (httpcore.AsyncConnectionPool): The pool of connections.
+    """
+
+    def __init__(self, pool: httpcore.AsyncConnectionPool):
+        self.pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with map_httpcore_exceptions():
+            response = await self.pool.handle_async_request(core_request(request))
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=AsyncResponseStream(cast(AsyncIterable[bytes], response.stream)),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+
+
+def make_transport(limits: httpx.Limits = DEFAULT_LIMITS) -> PoolTransport:
+    """
+    Returns a transport connecting through a ResolvingBackend.
+    """
+    return PoolTransport(
+        httpcore.ConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=ResolvingBackend(),
+        )
+    )
+
+
+def make_async_transport(limits: httpx.Limits = DEFAULT_LIMITS) -> AsyncPoolTransport:
+    """
+    Returns a transport connecting through an AsyncResolvingBackend.
+    """
+    return AsyncPoolTransport(
+        httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=AsyncResolvingBackend(),
+        )
+    )
@@ -0,0 +1,122 @@
+"""
+Keyset pagination of the response history.
+
+Pages are ordered newest first by (created_at, id) and the cursor holds the key
+of the last row of the previous page, so every page is one index range scan of
+page size rows, however deep it is, instead of an OFFSET that scans and
+discards all rows before it.
+
+Runs of site registries recording changes only are rows like the others, keyed
+by their first check, see core/runs.py.
+"""
+import base64
+import binascii
+import datetime
+from typing import Any, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+Key = Tuple[datetime.datetime, int]
+
+
+def encode_cursor(key: Key) -> str:
+    created_at, pk = key
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{pk}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Key:
+    """
+    Raises:
+        ValueError: If the cursor is not valid.
+    """
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(cursor) from e
+
+
+def row_key(row: Any) -> Key:
+    if isinstance(row, dict):
+        return row["created_at"], row["id"]
+    return row.created_at, row.id
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest first pagination on (created_at, id) with an opaque cursor.
+
+    Attributes:
+        page_size (int): Default number of rows per page.
+        max_page_size (int): Maximum page_size a client can ask for.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    ordering = ("-created_at", "-id")
+
+    def __init__(self):
+        self.page_size = settings.HISTORY_PAGE_SIZE
+        self.max_page_size = settings.HISTORY_MAX_PAGE_SIZE
+        self.next_key: Optional[Key] = None
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> List[Any]:
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                created_at, pk = decode_cursor(cursor)
+            except ValueError:
+                raise NotFound("Invalid cursor.")
+            # The created_at__lte bound lets Postgres start the index scan at the cursor.
+            queryset = queryset.filter(created_at__lte=created_at).filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        rows = list(queryset.order_by(*self.ordering)[: page_size + 1])
+        self.next_key = row_key(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_key is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, encode_cursor(self.next_key)
+        )
+
+    def get_first_link(self) -> str:
+        return remove_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param
+        )
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(
+            {
+                "first": self.get_first_link(),
+                "next": self.get_next_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "first": {"type": "string", "format": "uri"},
+                "next": {"type": "string", "format": "uri", "nullable": True},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,270 @@
+"""
+Partition maintenance and retention of the response history.
+
+core_siteresponsehistory is range partitioned by created_at, see migration
+0008_partition_siteresponsehistory. Partitions span HISTORY_PARTITION_DAYS days,
+aligned on UTC midnight (weeks start on Monday), and are named after their first
+day, e.g. core_siteresponsehistory_p20230516. A default partition catches rows
+no partition covers yet; creating a partition moves its rows out of it.
+
+maintain_partitions runs hourly through the maintain_history_partitions task,
+or with the maintain_history_partitions command:
+
+- partitions are created up to HISTORY_PARTITIONS_AHEAD_DAYS days ahead;
+- partitions older than the longest retention are dropped, or detached to be
+  archived when HISTORY_ARCHIVE_EXPIRED_PARTITIONS is set, but not before
+  core/archive.py archived them when HISTORY_ARCHIVE_URI is set;
+- users keeping their history for less than the longest retention, by their
+  RetentionPolicy or HISTORY_RETENTION_DAYS, get their expired rows deleted;
+- content blobs no row references anymore are deleted.
+"""
+import datetime
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from config.celery_app import app
+from uptime_monitor.core.blobs import delete_orphan_blobs
+from uptime_monitor.core.models import (
+    HistoryArchive,
+    RetentionPolicy,
+    SiteResponseHistory,
+)
+from uptime_monitor.core.rollups import delete_expired_rollups
+
+logger = logging.getLogger(__name__)
+
+TABLE = SiteResponseHistory._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+@dataclass
+class Partition:
+    """
+    A range partition of the response history.
+
+    Attributes:
+        name (str): The table name of the partition.
+        start (datetime.datetime): The first created_at of the partition.
+        end (datetime.datetime): The created_at the partition ends before.
+    """
+
+    name: str
+    start: datetime.datetime
+    end: datetime.datetime
+
+
+def parse_bound(value: str) -> datetime.datetime:
+    if re.search(r"[+-]\d\d$", value):
+        value += ":00"
+    return datetime.datetime.fromisoformat(value)
+
+
+def list_partitions() -> List[Partition]:
+    """
+    Returns the range partitions of the response history, by start.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """,
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = PARTITION_BOUND.search(bound)
+        if match:
+            partitions.append(
+                Partition(name, parse_bound(match[1]), parse_bound(match[2]))
+            )
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+def align(moment: datetime.datetime, days: int) -> datetime.datetime:
+    """
+    Returns the start of the partition span containing moment.
+    """
+    day = moment.astimezone(datetime.timezone.utc).date()
+    day = datetime.date.fromordinal(day.toordinal() - (day.toordinal() - 1) % days)
+    return datetime.datetime.combine(day, datetime.time(), datetime.timezone.utc)
+
+
+def create_partition(start: datetime.datetime, end: datetime.datetime) -> Partition:
+    """
+    Create and attach the partition of [start, end), moving its rows out of the default partition.
+    """
+    partition = Partition(f"{TABLE}_p{start:%Y%m%d}", start, end)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # ATTACH requires the CHECK constraints of the table, e.g. of PositiveIntegerField.
+        cursor.execute(
+            f"CREATE TABLE {partition.name} "
+            f"(LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE created_at >= %s AND created_at < %s
+                RETURNING *
+            )
+            INSERT INTO {partition.name} SELECT * FROM moved
+            """,
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {partition.name} "
+            "FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    logger.info("Created history partition %s", partition.name)
+    return partition
+
+
+def oldest_default_row() -> Optional[datetime.datetime]:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(created_at) FROM {DEFAULT_PARTITION}")
+        return cursor.fetchone()[0]
+
+
+def create_partitions(now: datetime.datetime) -> List[Partition]:
+    """
+    Create the partitions missing from the oldest row of the default partition, or now,
+    up to HISTORY_PARTITIONS_AHEAD_DAYS days ahead. Spans overlapping existing partitions are clipped.
+
+    returns:
+        The created partitions.
+    """
+    days = settings.HISTORY_PARTITION_DAYS
+    start = now
+    oldest = oldest_default_row()
+    if oldest is not None:
+        start = max(min(start, oldest), retention_cutoff(now))
+    end = now + datetime.timedelta(days=settings.HISTORY_PARTITIONS_AHEAD_DAYS)
+
+    existing = list_partitions()
+    created = []
+    cursor = align(start, days)
+    while cursor < end:
+        covering = [p for p in existing if p.start <= cursor < p.end]
+        if covering:
+            cursor = covering[0].end
+            continue
+        upper = cursor + datetime.timedelta(days=days)
+        upper = min([upper] + [p.start for p in existing if p.start > cursor])
+        partition = create_partition(cursor, upper)
+        existing.append(partition)
+        created.append(partition)
+        cursor = upper
+    return created
+
+
+def retention_days() -> Dict[Optional[int], int]:
+    """
+    Returns the history days by user id of every retention policy, None for the default.
+    """
+    days: Dict[Optional[int], int] = {None: settings.HISTORY_RETENTION_DAYS}
+    days.update(RetentionPolicy.objects.values_list("user_id", "history_days"))
+    return days
+
+
+def retention_cutoff(now: datetime.datetime) -> datetime.datetime:
+    """
+    Returns the created_at before which no user keeps history.
+    """
+    return now - datetime.timedelta(days=max(retention_days().values()))
+
+
+def drop_expired_partitions(now: datetime.datetime) -> List[Partition]:
+    """
+    Drop, or detach for archiving, the partitions older than every retention
+    and delete the expired rows of the default partition.
+
+    returns:
+        The removed partitions.
+    """
+    cutoff = retention_cutoff(now)
+    if settings.HISTORY_ARCHIVE_URI:
+        # Keep the partitions core/archive.py hasn't archived yet.
+        archived = HistoryArchive.objects.aggregate(end=Max("end"))["end"]
+        if archived is None:
+            return []
+        cutoff = min(cutoff, archived)
+    expired = [p for p in list_partitions() if p.end <= cutoff]
+    with connection.cursor() as cursor:
+        for partition in expired:
+            if settings.HISTORY_ARCHIVE_EXPIRED_PARTITIONS:
+                cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {partition.name}")
+                logger.info(
+                    "Detached history partition %s for archiving", partition.name
+                )
+            else:
+                cursor.execute(f"DROP TABLE {partition.name}")
+                logger.info("Dropped history partition %s", partition.name)
+        cursor.execute(
+            f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < %s", [cutoff]
+        )
+    return expired
+
+
+def delete_expired_history(now: datetime.datetime) -> int:
+    """
+    Delete the history of users keeping it for less than the longest retention.
+
+    returns:
+        The number of deleted rows.
+    """
+    days_by_user = retention_days()
+    longest = max(days_by_user.values())
+    default_days = days_by_user.pop(None)
+    deleted = 0
+    if default_days < longest:
+        deleted += SiteResponseHistory.objects.filter(
+            created_at__lt=now - datetime.timedelta(days=default_days),
+            check_registry__user__retention_policy__isnull=True,
+        ).delete()[0]
+    for days in set(days_by_user.values()):
+        if days < longest:
+            deleted += SiteResponseHistory.objects.filter(
+                created_at__lt=now - datetime.timedelta(days=days),
+                check_registry__user__retention_policy__history_days=days,
+            ).delete()[0]
+    return deleted
+
+
+def maintain_partitions(now: datetime.datetime = None) -> None:
+    now = now or timezone.now()
+    create_partitions(now)
+    drop_expired_partitions(now)
+    deleted = delete_expired_history(now)
+    if deleted:
+        logger.info("Deleted %d expired response histories", deleted)
+    deleted = delete_expired_rollups(now)
+    if deleted:
+        logger.info("Deleted %d expired response rollups", deleted)
+    deleted = delete_orphan_blobs()
+    if deleted:
+        logger.info("Deleted %d unreferenced content blobs", deleted)
+
+
+@app.task(
+    name="maintain_history_partitions",
+    ignore_result=True,
+    soft_time_limit=20 * 60,
+    time_limit=30 * 60,
+)
+def maintain_history_partitions() -> None:
+    """
+    Create the upcoming history partitions and apply the retention policies.
+    """
+    maintain_partitions()
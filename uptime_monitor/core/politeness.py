@@ -0,0 +1,234 @@
+"""
+Per-host politeness of the check engine.
+
+Probes of a check_sites batch to the same origin (scheme, host and port) wait
+for a slot of its HostLimiter before taking one of the batch semaphore:
+
+- at most "concurrency" probes of the origin are in flight;
+- probes start at most "rate" per second, with bursts of "burst" probes, by a
+  token bucket. A rate of 0 disables the bucket.
+
+Limits are CHECK_HOST_CONCURRENCY, CHECK_HOST_RATE and CHECK_HOST_BURST, and can
+be overridden per hosted_at group of the site registries in CHECK_HOST_LIMITS,
+e.g. {"cloudflare": {"concurrency": 16, "rate": 50, "burst": 50}}. Limiters live
+as long as the event loop of the worker process, so rates hold across batches;
+they are not shared between processes.
+
+The time spent waiting for a host slot is excluded from the response time and
+recorded by group in the Redis hash engine:host_wait after every batch, as
+<group>:probes, <group>:delayed and <group>:wait_seconds counters, so dashboards
+can graph the delay the limiter adds.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Tuple
+from urllib.parse import urlsplit
+
+import redis
+from django.conf import settings
+
+from uptime_monitor.core.models import SiteRegistry
+from uptime_monitor.utils.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+HOST_WAIT_KEY = "engine:host_wait"
+DEFAULT_GROUP = "default"
+
+
+@dataclass(frozen=True)
+class HostLimits:
+    """
+    Attributes:
+        concurrency (int): Maximum number of in-flight probes of an origin.
+        rate (float): Probes started per second, 0 for no limit.
+        burst (int): Probes that can start at once under the rate.
+    """
+
+    concurrency: int
+    rate: float
+    burst: int
+
+
+def limits_for(group: str) -> HostLimits:
+    """
+    Returns the limits of the hosted_at group, the defaults overridden by CHECK_HOST_LIMITS.
+    """
+    overrides = settings.CHECK_HOST_LIMITS.get(group, {})
+    return HostLimits(
+        concurrency=int(overrides.get("concurrency", settings.CHECK_HOST_CONCURRENCY)),
+        rate=float(overrides.get("rate", settings.CHECK_HOST_RATE)),
+        burst=int(overrides.get("burst", settings.CHECK_HOST_BURST)),
+    )
+
+
+def host_key(check_registry: SiteRegistry) -> Tuple[str, str]:
+    """
+    Returns the hosted_at group and the origin of the site registry.
+    """
+    url = urlsplit(check_registry.url)
+    group = check_registry.hosted_at or DEFAULT_GROUP
+    return group, f"{url.scheme}://{url.netloc}".lower()
+
+
+class TokenBucket:
+    """
+    Token bucket starting at most rate acquisitions per second, in bursts of burst.
+    """
+
+    def __init__(
+        self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.tokens = float(self.burst)
+        self.updated = clock()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Take a token, waiting for it to refill. Waiters are served in order.
+        """
+        async with self._lock:
+            while True:
+                now = self.clock()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def idle(self) -> bool:
+        full = self.tokens + (self.clock() - self.updated) * self.rate >= self.burst
+        return full and not self._lock.locked()
+
+
+class HostLimiter:
+    """
+    Concurrency and rate limit of the probes of one origin.
+    """
+
+    def __init__(self, limits: HostLimits):
+        self.limits = limits
+        self.semaphore = asyncio.Semaphore(limits.concurrency)
+        self.bucket = TokenBucket(limits.rate, limits.burst) if limits.rate else None
+        self.waiting = 0
+        self.active = 0
+
+    def idle(self) -> bool:
+        return (
+            self.waiting == 0
+            and self.active == 0
+            and (self.bucket is None or self.bucket.idle())
+        )
+
+
+@dataclass
+class WaitStats:
+    probes: int = 0
+    delayed: int = 0
+    wait_seconds: float = 0.0
+
+
+class HostLimiters:
+    """
+    The host limiters of a worker process, by hosted_at group and origin.
+
+    Attributes:
+        stats (Dict[str, WaitStats]): The waits by group since the last publish_stats.
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or settings.CHECK_HOST_LIMITERS_MAX_SIZE
+        self._limiters: Dict[Tuple[str, str], HostLimiter] = {}
+        self.stats: Dict[str, WaitStats] = defaultdict(WaitStats)
+
+    def __len__(self) -> int:
+        return len(self._limiters)
+
+    def get(self, key: Tuple[str, str]) -> HostLimiter:
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            if len(self._limiters) >= self.max_size:
+                self.prune()
+            limiter = self._limiters[key] = HostLimiter(limits_for(key[0]))
+        return limiter
+
+    def prune(self) -> None:
+        """
+        Drop the limiters no probe is using or waiting for and with a full bucket.
+        """
+        for key in [key for key, limiter in self._limiters.items() if limiter.idle()]:
+            del self._limiters[key]
+
+    @asynccontextmanager
+    async def slot(self, check_registry: SiteRegistry) -> AsyncIterator[float]:
+        """
+        Wait for a slot of the origin of the site registry.
+
+        returns:
+            The seconds spent waiting.
+        """
+        key = host_key(check_registry)
+        limiter = self.get(key)
+        started = time.monotonic()
+        limiter.waiting += 1
+        try:
+            await limiter.semaphore.acquire()
+        finally:
+            limiter.waiting -= 1
+        limiter.active += 1
+        try:
+            if limiter.bucket is not None:
+                await limiter.bucket.acquire()
+            waited = time.monotonic() - started
+            stats = self.stats[key[0]]
+            stats.probes += 1
+            stats.wait_seconds += waited
+            if waited >= settings.CHECK_HOST_DELAY_THRESHOLD:
+                stats.delayed += 1
+            yield waited
+        finally:
+            limiter.active -= 1
+            limiter.semaphore.release()
+
+    def publish_stats(self) -> None:
+        """
+        Add the waits since the last call to the counters of HOST_WAIT_KEY.
+        """
+        stats, self.stats = self.stats, defaultdict(WaitStats)
+        if not stats:
+            return
+        try:
+            with get_redis_connection().pipeline(transaction=False) as pipeline:
+                for group, group_stats in stats.items():
+                    pipeline.hincrby(
+                        HOST_WAIT_KEY, f"{group}:probes", group_stats.probes
+                    )
+                    pipeline.hincrby(
+                        HOST_WAIT_KEY, f"{group}:delayed", group_stats.delayed
+                    )
+                    pipeline.hincrbyfloat(
+                        HOST_WAIT_KEY, f"{group}:wait_seconds", group_stats.wait_seconds
+                    )
+                pipeline.execute()
+        except redis.RedisError:
+            logger.exception("Failed to publish the host wait stats")
+
+    def after_fork(self) -> None:
+        self._limiters = {}
+        self.stats = defaultdict(WaitStats)
+
+
+host_limiters = HostLimiters()
+
+os.register_at_fork(after_in_child=host_limiters.after_fork)
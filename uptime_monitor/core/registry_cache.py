@@ -0,0 +1,174 @@
+"""
+Worker-local cache of SiteRegistry configuration.
+
+Checks read their site registry, with its content assertions, from this cache
+instead of Postgres. Entries expire after REGISTRY_CACHE_TTL seconds and the
+least recently used ones are evicted beyond REGISTRY_CACHE_MAX_SIZE. Changes are
+pushed by the signal handlers in core/signals.py through the Redis channel
+REGISTRY_INVALIDATION_CHANNEL, which a daemon thread of every worker process
+listens to; the TTL bounds staleness when Redis messages are missed.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import redis
+from django.conf import settings
+
+from uptime_monitor.core.models import SiteRegistry
+from uptime_monitor.utils.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_INVALIDATION_CHANNEL = "registry:invalidate"
+
+
+def publish_registry_changed(*check_registry_ids: int) -> None:
+    """
+    Tell every worker to drop the cached site registries.
+    """
+    if not check_registry_ids:
+        return
+    try:
+        get_redis_connection().publish(
+            REGISTRY_INVALIDATION_CHANNEL, ",".join(map(str, check_registry_ids))
+        )
+    except redis.RedisError:
+        logger.exception("Failed to publish registry changes %s", check_registry_ids)
+
+
+class RegistryCache:
+    """
+    TTL and LRU cache of SiteRegistry objects with their assertions prefetched.
+
+    Attributes:
+        max_size (int): Maximum number of cached registries.
+        ttl (float): Seconds a cached registry is used before it is loaded again.
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size or settings.REGISTRY_CACHE_MAX_SIZE
+        self.ttl = settings.REGISTRY_CACHE_TTL if ttl is None else ttl
+        self.clock = clock
+        self._entries: "OrderedDict[int, Tuple[float, SiteRegistry]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._listener: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, check_registry_ids: Iterable[int]) -> List[SiteRegistry]:
+        return list(
+            SiteRegistry.objects.filter(id__in=check_registry_ids).prefetch_related(
+                "assertions"
+            )
+        )
+
+    def get_many(self, check_registry_ids: Iterable[int]) -> Dict[int, SiteRegistry]:
+        """
+        Returns the site registries by id, loading the missing ones with one query.
+            Registries that do not exist are left out.
+        """
+        self.ensure_listener()
+        now = self.clock()
+        found: Dict[int, SiteRegistry] = {}
+        missing = []
+        with self._lock:
+            generation = self._generation
+            for check_registry_id in check_registry_ids:
+                entry = self._entries.get(check_registry_id)
+                if entry and entry[0] > now:
+                    self._entries.move_to_end(check_registry_id)
+                    found[check_registry_id] = entry[1]
+                else:
+                    missing.append(check_registry_id)
+        if missing:
+            loaded = self.load(missing)
+            with self._lock:
+                # Registries invalidated while loading may be stale, use them only once.
+                cacheable = generation == self._generation
+                for check_registry in loaded:
+                    found[check_registry.id] = check_registry
+                    if cacheable:
+                        self._entries[check_registry.id] = (
+                            now + self.ttl,
+                            check_registry,
+                        )
+                        self._entries.move_to_end(check_registry.id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return found
+
+    def get(self, check_registry_id: int) -> SiteRegistry:
+        """
+        Returns the site registry.
+
+        Raises:
+            SiteRegistry.DoesNotExist: If the registry does not exist.
+        """
+        found = self.get_many([check_registry_id])
+        if check_registry_id not in found:
+            raise SiteRegistry.DoesNotExist(check_registry_id)
+        return found[check_registry_id]
+
+    def invalidate(self, *check_registry_ids: int) -> None:
+        with self._lock:
+            self._generation += 1
+            for check_registry_id in check_registry_ids:
+                self._entries.pop(check_registry_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def ensure_listener(self) -> None:
+        """
+        Start the invalidation listener thread of this process, if it is not running.
+        """
+        if self._listener is None or not self._listener.is_alive():
+            self._listener = threading.Thread(
+                target=self.listen, name="registry-cache-invalidation", daemon=True
+            )
+            self._listener.start()
+
+    def listen(self) -> None:
+        """
+        Drop the registries published on REGISTRY_INVALIDATION_CHANNEL, reconnecting on errors.
+            The cache is cleared on every (re)subscription, as messages may have been missed.
+        """
+        while True:
+            try:
+                pubsub = get_redis_connection().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REGISTRY_INVALIDATION_CHANNEL)
+                self.clear()
+                for message in pubsub.listen():
+                    data = message["data"].decode()
+                    self.invalidate(*(int(pk) for pk in data.split(",") if pk))
+            except (redis.RedisError, ValueError):
+                logger.warning(
+                    "Registry cache invalidation listener failed", exc_info=True
+                )
+                time.sleep(settings.REGISTRY_CACHE_RECONNECT_DELAY)
+
+    def after_fork(self) -> None:
+        """
+        Drop the entries and the listener inherited from the parent process.
+        """
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener = None
+
+
+registry_cache = RegistryCache()
+
+os.register_at_fork(after_in_child=registry_cache.after_fork)
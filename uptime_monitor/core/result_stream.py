@@ -0,0 +1,263 @@
+"""
+Redis Stream transport of check results to the response history writers.
+
+With HISTORY_TRANSPORT set to "stream", producers XADD the envelope of every
+check result, see core/envelopes.py, to the stream history:results instead of
+sending a save_response_history_batch task per result. Written entries are
+deleted, so the length of the stream is the backlog of the writers. The stream
+isn't capped, which would drop unwritten results; writers log a warning while
+the backlog is over HISTORY_STREAM_BACKLOG_WARNING entries instead.
+
+The run_history_writer command runs a ResultStreamWriter, a consumer of the
+history-writers group: it reads up to HISTORY_STREAM_BATCH_SIZE entries with
+XREADGROUP, writes them with write_response_history, then acknowledges and
+deletes them. Any number of writers can run, the group shares the entries out.
+Entries that could not be written stay pending, and every
+HISTORY_STREAM_CLAIM_INTERVAL seconds writers claim with XAUTOCLAIM the entries
+pending for more than HISTORY_STREAM_CLAIM_IDLE seconds, including those read by
+writers that crashed, and write them again. Delivery is at-least-once, like the
+Celery transport. Entries delivered more than HISTORY_STREAM_MAX_DELIVERIES times
+by then, by the XPENDING count, are moved to the dead letter stream
+history:results:dead with their entry id instead, for inspection.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import redis
+from django.conf import settings
+from django.db import close_old_connections
+
+from uptime_monitor.utils.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+RESULTS_STREAM_KEY = "history:results"
+DEAD_LETTER_KEY = "history:results:dead"
+WRITERS_GROUP = "history-writers"
+ENVELOPE_FIELD = b"r"
+
+Entry = Tuple[bytes, Dict[bytes, bytes]]
+
+
+def add_results(envelopes: Iterable[bytes]) -> None:
+    """
+    Append check result envelopes to the stream, in one round trip.
+
+    Raises:
+        redis.RedisError: If Redis is unavailable.
+    """
+    with get_redis_connection().pipeline(transaction=False) as pipeline:
+        for envelope in envelopes:
+            pipeline.xadd(RESULTS_STREAM_KEY, {ENVELOPE_FIELD: envelope})
+        pipeline.execute()
+
+
+class ResultStreamWriter:
+    """
+    Writes the check results of the stream to the database, as a consumer of WRITERS_GROUP.
+
+    Attributes:
+        write (Callable[[List[Any]], Any]): Saves a batch of envelopes, raising on failure.
+        name (str): The consumer name, unique among the running writers.
+        batch_size (int): Entries read at once.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[Any]], Any],
+        name: str = None,
+        batch_size: int = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.write = write
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.batch_size = batch_size or settings.HISTORY_STREAM_BATCH_SIZE
+        self.clock = clock
+        self._claim_from = "0-0"
+        self._stopped = threading.Event()
+
+    def ensure_group(self) -> None:
+        """
+        Create the stream and the group of the writers if missing.
+        """
+        try:
+            get_redis_connection().xgroup_create(
+                RESULTS_STREAM_KEY, WRITERS_GROUP, id="0", mkstream=True
+            )
+        except redis.ResponseError as error:
+            if "BUSYGROUP" not in str(error):
+                raise
+
+    def read(self, block: Optional[float] = None) -> List[Entry]:
+        """
+        Returns the next entries of the stream, waiting for at most block seconds for some.
+        """
+        response = get_redis_connection().xreadgroup(
+            WRITERS_GROUP,
+            self.name,
+            {RESULTS_STREAM_KEY: ">"},
+            count=self.batch_size,
+            block=None if block is None else int(block * 1000),
+        )
+        return response[0][1] if response else []
+
+    def claim(self) -> List[Entry]:
+        """
+        Returns the entries pending for more than HISTORY_STREAM_CLAIM_IDLE seconds, claimed
+        for this writer. Scans the pending entries a batch per call, from the start once through.
+        """
+        cursor, entries, *_ = get_redis_connection().xautoclaim(
+            RESULTS_STREAM_KEY,
+            WRITERS_GROUP,
+            self.name,
+            min_idle_time=int(settings.HISTORY_STREAM_CLAIM_IDLE * 1000),
+            start_id=self._claim_from,
+            count=self.batch_size,
+        )
+        self._claim_from = cursor if len(entries) >= self.batch_size else "0-0"
+        # Entries deleted while pending, written by a writer the entry was claimed from, are
+        # returned without fields and left pending by Redis before 7.0.
+        deleted = [entry_id for entry_id, fields in entries if not fields]
+        if deleted:
+            get_redis_connection().xack(RESULTS_STREAM_KEY, WRITERS_GROUP, *deleted)
+        return [(entry_id, fields) for entry_id, fields in entries if fields]
+
+    def process(self, entries: List[Entry]) -> int:
+        """
+        Write the entries, then acknowledge and delete them. They stay pending if the write fails.
+
+        returns:
+            The number of written entries.
+        """
+        if not entries:
+            return 0
+        try:
+            self.write([fields.get(ENVELOPE_FIELD) for _, fields in entries])
+        except Exception:
+            logger.exception(
+                "Failed to save %d response histories, retrying after %s seconds",
+                len(entries),
+                settings.HISTORY_STREAM_CLAIM_IDLE,
+            )
+            return 0
+        ids = [entry_id for entry_id, _ in entries]
+        with get_redis_connection().pipeline() as pipeline:
+            pipeline.xack(RESULTS_STREAM_KEY, WRITERS_GROUP, *ids)
+            pipeline.xdel(RESULTS_STREAM_KEY, *ids)
+            pipeline.execute()
+        return len(entries)
+
+    def dead_letter(self, entries: List[Entry]) -> List[Entry]:
+        """
+        Move the claimed entries delivered more than HISTORY_STREAM_MAX_DELIVERIES times to
+        DEAD_LETTER_KEY.
+
+        returns:
+            The other entries.
+        """
+        if not entries:
+            return entries
+        connection = get_redis_connection()
+        # Claimed entries are not contiguous in the pending list of the writer, so
+        # each one is looked up by its id.
+        with connection.pipeline(transaction=False) as pipeline:
+            for entry_id, _ in entries:
+                pipeline.xpending_range(
+                    RESULTS_STREAM_KEY,
+                    WRITERS_GROUP,
+                    min=entry_id,
+                    max=entry_id,
+                    count=1,
+                    consumername=self.name,
+                )
+            pending = pipeline.execute()
+        deliveries = {
+            item["message_id"]: item["times_delivered"]
+            for items in pending
+            for item in items
+        }
+        dead = [
+            (entry_id, fields)
+            for entry_id, fields in entries
+            if deliveries.get(entry_id, 0) > settings.HISTORY_STREAM_MAX_DELIVERIES
+        ]
+        if not dead:
+            return entries
+        with connection.pipeline() as pipeline:
+            for entry_id, fields in dead:
+                pipeline.xadd(DEAD_LETTER_KEY, {**fields, b"id": entry_id})
+            ids = [entry_id for entry_id, _ in dead]
+            pipeline.xack(RESULTS_STREAM_KEY, WRITERS_GROUP, *ids)
+            pipeline.xdel(RESULTS_STREAM_KEY, *ids)
+            pipeline.execute()
+        logger.error(
+            "Moved %d response histories delivered more than %d times to %s",
+            len(dead),
+            settings.HISTORY_STREAM_MAX_DELIVERIES,
+            DEAD_LETTER_KEY,
+        )
+        dead_ids = set(ids)
+        return [entry for entry in entries if entry[0] not in dead_ids]
+
+    def recover(self) -> int:
+        """
+        Write the entries left pending by failed writes and crashed writers, dead lettering
+        the ones that failed too many times.
+
+        returns:
+            The number of written entries.
+        """
+        written = 0
+        while True:
+            written += self.process(self.dead_letter(self.claim()))
+            if self._claim_from == "0-0":
+                return written
+
+    def check_backlog(self) -> int:
+        """
+        Log a warning if the backlog is over HISTORY_STREAM_BACKLOG_WARNING entries.
+
+        returns:
+            The number of entries of the stream, written or not.
+        """
+        backlog = get_redis_connection().xlen(RESULTS_STREAM_KEY)
+        if backlog > settings.HISTORY_STREAM_BACKLOG_WARNING:
+            logger.warning("The result stream holds %d unwritten results", backlog)
+        return backlog
+
+    def run(self) -> None:
+        """
+        Write the results of the stream until stopped.
+        """
+        logger.info("Writing the result stream as %s", self.name)
+        next_claim = 0.0
+        group_ready = False
+        while not self._stopped.is_set():
+            try:
+                close_old_connections()
+                if not group_ready:
+                    self.ensure_group()
+                    group_ready = True
+                if self.clock() >= next_claim:
+                    self.check_backlog()
+                    recovered = self.recover()
+                    if recovered:
+                        logger.info(
+                            "Recovered %d pending response histories", recovered
+                        )
+                    next_claim = self.clock() + settings.HISTORY_STREAM_CLAIM_INTERVAL
+                self.process(self.read(block=settings.HISTORY_STREAM_BLOCK))
+            except redis.RedisError:
+                logger.exception("Failed to read the result stream")
+                group_ready = False
+                self._stopped.wait(settings.HISTORY_STREAM_BLOCK)
+            except Exception:
+                logger.exception("Failed to write the result stream")
+                self._stopped.wait(settings.HISTORY_STREAM_BLOCK)
+
+    def stop(self) -> None:
+        self._stopped.set()
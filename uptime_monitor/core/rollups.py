@@ -0,0 +1,250 @@
+"""
+Pre-aggregated uptime and latency statistics of site registries.
+
+The response history consumer folds every batch into SiteResponseRollup rows of
+one minute, one hour and one day per site registry, inside the transaction that
+writes the batch. Rows are created with ON CONFLICT DO NOTHING and then locked in
+id order, so concurrent consumers merge into them without lost updates or
+deadlocks.
+
+Percentiles come from the DDSketch of every bucket, see core/sketches.py: the
+sketches of any number of buckets merge into one, so percentiles of a range read
+one small row per bucket.
+"""
+import datetime
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import QuerySet
+
+from uptime_monitor.core.models import (
+    RollupGranularity,
+    SiteResponseHistory,
+    SiteResponseRollup,
+    SiteResponseStatus,
+)
+from uptime_monitor.core.sketches import DDSketch
+
+GRANULARITY_SPANS = {
+    RollupGranularity.MINUTE: datetime.timedelta(minutes=1),
+    RollupGranularity.HOUR: datetime.timedelta(hours=1),
+    RollupGranularity.DAY: datetime.timedelta(days=1),
+}
+COUNT_FIELDS: Dict[str, str] = {
+    SiteResponseStatus.PASS: "pass_count",
+    SiteResponseStatus.FAIL: "fail_count",
+    SiteResponseStatus.MISMATCH: "mismatch_count",
+    SiteResponseStatus.TIMEOUT: "timeout_count",
+    SiteResponseStatus.ERROR: "error_count",
+}
+# Checks that got a response, the only ones in the latency statistics.
+RESPONDED = (
+    SiteResponseStatus.PASS,
+    SiteResponseStatus.FAIL,
+    SiteResponseStatus.MISMATCH,
+)
+PERCENTILES = (50, 95, 99)
+
+RollupKey = Tuple[int, str, datetime.datetime]
+
+
+def bucket_start(moment: datetime.datetime, granularity: str) -> datetime.datetime:
+    """
+    Returns the start of the bucket containing moment, in UTC.
+    """
+    moment = moment.astimezone(datetime.timezone.utc)
+    if granularity == RollupGranularity.MINUTE:
+        return moment.replace(second=0, microsecond=0)
+    if granularity == RollupGranularity.HOUR:
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class RollupDelta:
+    """
+    The aggregate of the new results of one rollup bucket.
+    """
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.response_time_min: Optional[float] = None
+        self.response_time_max: Optional[float] = None
+        self.response_time_sum = 0.0
+        self.sketch = DDSketch()
+
+    def add(self, history: SiteResponseHistory) -> None:
+        self.counts[COUNT_FIELDS[history.response_code]] += 1
+        if history.response_code not in RESPONDED:
+            return
+        response_time = history.response_time
+        if self.response_time_min is None or response_time < self.response_time_min:
+            self.response_time_min = response_time
+        if self.response_time_max is None or response_time > self.response_time_max:
+            self.response_time_max = response_time
+        self.response_time_sum += response_time
+        self.sketch.add(response_time)
+
+    def apply(self, rollup: SiteResponseRollup) -> None:
+        """
+        Merge the delta into a locked rollup row.
+        """
+        for field, count in self.counts.items():
+            setattr(rollup, field, getattr(rollup, field) + count)
+        if self.response_time_min is not None and self.response_time_max is not None:
+            minimum, maximum = rollup.response_time_min, rollup.response_time_max
+            rollup.response_time_min = (
+                self.response_time_min
+                if minimum is None
+                else min(minimum, self.response_time_min)
+            )
+            rollup.response_time_max = (
+                self.response_time_max
+                if maximum is None
+                else max(maximum, self.response_time_max)
+            )
+        rollup.response_time_sum += self.response_time_sum
+        if self.sketch:
+            sketch = DDSketch.from_bytes(rollup.response_time_sketch)
+            sketch.merge(self.sketch)
+            rollup.response_time_sketch = sketch.to_bytes()
+
+
+ROLLUP_FIELDS = [
+    *COUNT_FIELDS.values(),
+    "response_time_min",
+    "response_time_max",
+    "response_time_sum",
+    "response_time_sketch",
+]
+
+
+def update_rollups(histories: Iterable[SiteResponseHistory]) -> int:
+    """
+    Fold saved response histories into their rollup rows. Must run in a transaction.
+
+    returns:
+        The number of updated rollup rows.
+    """
+    deltas: Dict[RollupKey, RollupDelta] = defaultdict(RollupDelta)
+    for history in histories:
+        for granularity in RollupGranularity.values:
+            bucket = bucket_start(history.created_at, granularity)
+            deltas[(history.check_registry_id, granularity, bucket)].add(history)
+    if not deltas:
+        return 0
+
+    SiteResponseRollup.objects.bulk_create(
+        [
+            SiteResponseRollup(
+                check_registry_id=check_registry_id,
+                granularity=granularity,
+                bucket=bucket,
+            )
+            for check_registry_id, granularity, bucket in deltas
+        ],
+        ignore_conflicts=True,
+    )
+    rollups = (
+        SiteResponseRollup.objects.select_for_update()
+        .filter(
+            check_registry_id__in={key[0] for key in deltas},
+            bucket__in={key[2] for key in deltas},
+        )
+        .order_by("id")
+    )
+    changed = []
+    for rollup in rollups:
+        delta = deltas.get(
+            (rollup.check_registry_id, rollup.granularity, rollup.bucket)
+        )
+        if delta:
+            delta.apply(rollup)
+            changed.append(rollup)
+    SiteResponseRollup.objects.bulk_update(changed, ROLLUP_FIELDS)
+    return len(changed)
+
+
+def summarize(rollups: Iterable[SiteResponseRollup]) -> Dict[str, Any]:
+    """
+    Returns the uptime and latency statistics of rollups merged together.
+        Uptime is the share of PASS checks, latencies are in seconds.
+    """
+    counts: Counter = Counter()
+    sketch = DDSketch()
+    minimums: List[float] = []
+    maximums: List[float] = []
+    response_time_sum = 0.0
+    for rollup in rollups:
+        for field in COUNT_FIELDS.values():
+            counts[field] += getattr(rollup, field)
+        if rollup.response_time_min is not None:
+            minimums.append(rollup.response_time_min)
+        if rollup.response_time_max is not None:
+            maximums.append(rollup.response_time_max)
+        response_time_sum += rollup.response_time_sum
+        sketch.merge(DDSketch.from_bytes(rollup.response_time_sketch))
+
+    total = sum(counts.values())
+    responded = sum(counts[COUNT_FIELDS[status]] for status in RESPONDED)
+    summary: Dict[str, Any] = {field: counts[field] for field in COUNT_FIELDS.values()}
+    summary.update(
+        {
+            "total": total,
+            "uptime": counts["pass_count"] / total if total else None,
+            "response_time_min": min(minimums, default=None),
+            "response_time_avg": response_time_sum / responded if responded else None,
+            "response_time_max": max(maximums, default=None),
+        }
+    )
+    for percentile in PERCENTILES:
+        summary[f"response_time_p{percentile}"] = sketch.quantile(percentile / 100)
+    return summary
+
+
+def get_stats(
+    rollups: QuerySet,
+    granularity: str,
+    since: datetime.datetime,
+    until: datetime.datetime,
+) -> Dict[str, Any]:
+    """
+    Returns the statistics of every bucket of the range and of the whole range.
+    """
+    rows = list(
+        rollups.filter(
+            granularity=granularity,
+            bucket__gte=bucket_start(since, granularity),
+            bucket__lt=until,
+        ).order_by("bucket")
+    )
+    buckets: List[Dict[str, Any]] = [
+        {"bucket": rollup.bucket, **summarize([rollup])} for rollup in rows
+    ]
+    return {
+        "granularity": granularity,
+        "since": since,
+        "until": until,
+        "summary": summarize(rows),
+        "buckets": buckets,
+    }
+
+
+def delete_expired_rollups(now: datetime.datetime) -> int:
+    """
+    Delete the minute and hour rollups older than their retention, day rollups are kept.
+
+    returns:
+        The number of deleted rows.
+    """
+    retention = {
+        RollupGranularity.MINUTE: settings.ROLLUP_MINUTE_RETENTION_DAYS,
+        RollupGranularity.HOUR: settings.ROLLUP_HOUR_RETENTION_DAYS,
+    }
+    deleted = 0
+    for granularity, days in retention.items():
+        deleted += SiteResponseRollup.objects.filter(
+            granularity=granularity,
+            bucket__lt=now - datetime.timedelta(days=days),
+        ).delete()[0]
+    return deleted
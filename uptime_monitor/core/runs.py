@@ -0,0 +1,151 @@
+"""
+Change-only recording of the response history.
+
+Site registries with record_changes_only collapse consecutive identical checks
+into one history row, a run: created_at is the first check of the run,
+last_seen_at the last one (null until it has two), run_count the number of
+checks and response_time their mean, with response_time_min and response_time_max. A check extends the
+open run of its site when it has the same response code, response text and
+response body, its response time is within the latency band of the run mean,
+and it was made less than HISTORY_RUN_MAX_SECONDS after the start of the run, so
+runs stay in one partition and expire with it. Otherwise it opens a new run.
+Checks delivered late, made before the last check of the open run, are written
+as rows of their own.
+
+The latency band is HISTORY_RUN_LATENCY_BAND times the run mean, and at least
+HISTORY_RUN_LATENCY_MIN_BAND seconds. The headers of a run are those of its
+first check.
+
+Rollups count every check. The history API and the exports return runs as they
+are, with their run_count, last_seen_at and latency aggregates, ordered by their
+first check like the other rows, and the time range filters return the runs
+that overlap the range. Checks of a run aren't made up again, their times
+weren't recorded.
+"""
+import copy
+import datetime
+from typing import Dict, List, Set, Tuple
+
+from django.conf import settings
+
+from uptime_monitor.core.models import SiteResponseHistory
+
+RUN_FIELDS = [
+    "run_count",
+    "last_seen_at",
+    "response_time",
+    "response_time_min",
+    "response_time_max",
+]
+
+
+def same_outcome(run: SiteResponseHistory, history: SiteResponseHistory) -> bool:
+    return (
+        run.response_code == history.response_code
+        and run.response_text == history.response_text
+        and run.response_body_id == history.response_body_id
+    )
+
+
+def within_band(run: SiteResponseHistory, response_time: float) -> bool:
+    band = max(
+        run.response_time * settings.HISTORY_RUN_LATENCY_BAND,
+        settings.HISTORY_RUN_LATENCY_MIN_BAND,
+    )
+    return abs(response_time - run.response_time) <= band
+
+
+def extend(run: SiteResponseHistory, history: SiteResponseHistory) -> None:
+    """
+    Add a check to a run.
+    """
+    response_time = history.response_time
+    run.response_time = (run.response_time * run.run_count + response_time) / (
+        run.run_count + 1
+    )
+    minimum, maximum = run.response_time_min, run.response_time_max
+    run.response_time_min = (
+        response_time if minimum is None else min(minimum, response_time)
+    )
+    run.response_time_max = (
+        response_time if maximum is None else max(maximum, response_time)
+    )
+    run.run_count += 1
+    run.last_seen_at = history.created_at
+
+
+def open_run(history: SiteResponseHistory) -> SiteResponseHistory:
+    history.run_count = 1
+    history.last_seen_at = None
+    history.response_time_min = history.response_time_max = history.response_time
+    return history
+
+
+def collapse_runs(
+    histories: List[SiteResponseHistory], registry_ids: Set[int]
+) -> Tuple[List[SiteResponseHistory], List[SiteResponseHistory]]:
+    """
+    Collapse the checks of registry_ids into their runs.
+        The site registries must be locked, so that no other writer extends their runs.
+        Runs opened by a check are copies of it, so the histories keep the response time of
+        their check for the rollups and statuses.
+
+    Args:
+        histories (List[SiteResponseHistory]): The unsaved checks, by created_at, the time they
+            were made.
+        registry_ids (Set[int]): The ids of the site registries recording changes only.
+    Returns:
+        The histories to insert and the saved runs that were extended.
+    """
+    max_age = datetime.timedelta(seconds=settings.HISTORY_RUN_MAX_SECONDS)
+    runs: Dict[int, SiteResponseHistory] = {}
+    if registry_ids and histories:
+        oldest = min(history.created_at for history in histories)
+        runs = {
+            run.check_registry_id: run
+            for run in SiteResponseHistory.objects.filter(
+                check_registry_id__in=registry_ids, created_at__gte=oldest - max_age
+            )
+            .order_by("check_registry_id", "-created_at", "-id")
+            .distinct("check_registry_id")
+        }
+        for loaded in runs.values():
+            if loaded.response_time_min is None:
+                open_run(loaded)
+
+    inserted, extended = [], {}
+    for history in histories:
+        if history.check_registry_id not in registry_ids:
+            inserted.append(history)
+            continue
+        run = runs.get(history.check_registry_id)
+        if run is not None and history.created_at < (
+            run.last_seen_at or run.created_at
+        ):
+            inserted.append(open_run(copy.copy(history)))
+            continue
+        if (
+            run is not None
+            and same_outcome(run, history)
+            and within_band(run, history.response_time)
+            and history.created_at - run.created_at < max_age
+        ):
+            extend(run, history)
+            if run.pk is not None:
+                extended[run.pk] = run
+        else:
+            opened = open_run(copy.copy(history))
+            runs[history.check_registry_id] = opened
+            inserted.append(opened)
+    return inserted, list(extended.values())
+
+
+def save_runs(runs: List[SiteResponseHistory]) -> None:
+    """
+    Save the extended runs, only looking into the partitions runs can still be open in.
+    """
+    if runs:
+        oldest = min(run.created_at for run in runs)
+        SiteResponseHistory.objects.filter(created_at__gte=oldest).bulk_update(
+            runs, RUN_FIELDS
+        )
@@ -0,0 +1,473 @@
+"""
+Timing-wheel scheduler service for site checks.
+
+Replaces the per-site django_celery_beat PeriodicTask rows when
+settings.CHECK_SCHEDULER is "wheel". The service loads every ScheduleItem once,
+keeps their timers in a TimingWheel and sends the sites due in the same second
+as check_sites batches. Every item runs on a stable phase offset within its
+interval, derived from its id, plus optional jitter, so items sharing an
+interval are spread over it instead of firing in the same tick. With
+settings.CHECK_SHARDING, batches only hold sites of the same check shard, see
+core/sharding.py. ScheduleItem changes are picked up incrementally from
+a Redis set filled by the signal handlers in core/signals.py; a full reload
+only happens at startup and every SCHEDULER_FULL_SYNC_INTERVAL seconds.
+
+Intervals adapt to the health of the sites, read from their current status in
+Redis, see core/current_status.py, when the checks of an item are dispatched:
+
+- items with a recheck_interval are checked at that cadence after a failed
+  check, until the site passes again or fails SCHEDULER_RECHECK_CHECKS times in
+  a row. Sites that start failing are rescheduled right away, the consumer
+  queues them in the Redis set scheduler:failing;
+- items with a max_interval double their interval for every
+  SCHEDULER_BACKOFF_AFTER seconds their site has been passing, up to max_interval.
+"""
+import collections
+import datetime
+import json
+import logging
+import random
+import statistics
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+from django.conf import settings
+from django_celery_beat.models import IntervalSchedule, PeriodicTask, PeriodicTasks
+
+from uptime_monitor.core.current_status import FAILING_SITES_KEY, get_statuses
+from uptime_monitor.core.models import ScheduleItem, SiteResponseStatus
+from uptime_monitor.core.producer import check_sites
+from uptime_monitor.core.sharding import shard_router
+from uptime_monitor.core.timing_wheel import TimingWheel
+from uptime_monitor.utils.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_CHANGES_KEY = "scheduler:changed"
+DISPATCH_STATS_KEY = "scheduler:dispatch_stats"
+
+
+def interval_seconds(schedule: IntervalSchedule) -> int:
+    """
+    Returns the interval of the schedule in whole seconds, at least one.
+    """
+    interval = datetime.timedelta(**{schedule.period: schedule.every})
+    return max(1, int(interval.total_seconds()))
+
+
+def mark_schedule_changed(*schedule_item_ids: int) -> None:
+    """
+    Queue schedule items for reloading by the running scheduler.
+    """
+    if not schedule_item_ids:
+        return
+    try:
+        get_redis_connection().sadd(SCHEDULE_CHANGES_KEY, *schedule_item_ids)
+    except redis.RedisError:
+        logger.exception("Failed to queue schedule changes %s", schedule_item_ids)
+
+
+def disable_beat_checks() -> int:
+    """
+    Disable the beat periodic tasks of site checks, so that sites aren't checked twice.
+        Tells beat to reload its schedule.
+
+    returns:
+        The number of disabled periodic tasks.
+    """
+    disabled = PeriodicTask.objects.filter(
+        task=ScheduleItem.PRODUCER_TASK_NAME, enabled=True
+    ).update(enabled=False)
+    if disabled:
+        PeriodicTasks.update_changed()
+        logger.info("Disabled %d beat periodic tasks of site checks", disabled)
+    return disabled
+
+
+def phase_offset(schedule_item_id: int, interval: int) -> int:
+    """
+    Returns the stable offset of the schedule item within its interval.
+        Uses Knuth's multiplicative hash so neighbouring ids land far apart.
+    """
+    return (schedule_item_id * 2654435761) % 2**32 % interval
+
+
+def next_phase_tick(after: int, interval: int, phase: int) -> int:
+    """
+    Returns the first tick after the given one that is on the phase of the interval.
+    """
+    tick = after + (phase - after) % interval
+    return tick if tick > after else tick + interval
+
+
+class DispatchStats:
+    """
+    Number of sites dispatched per second over a sliding window.
+
+    Attributes:
+        counts (Deque[Tuple[int, int]]): (tick, dispatched sites) of the last window seconds.
+    """
+
+    def __init__(self, window: int):
+        self.counts: Deque[Tuple[int, int]] = collections.deque(maxlen=window)
+
+    def record(self, tick: int, dispatched: int) -> None:
+        self.counts.append((tick, dispatched))
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns the distribution of the window: its total, mean, stdev, min and max
+        dispatches per second and the per-second counts.
+        """
+        values = [count for _, count in self.counts]
+        if not values:
+            return {}
+        return {
+            "seconds": len(values),
+            "total": sum(values),
+            "mean": statistics.fmean(values),
+            "stdev": statistics.pstdev(values),
+            "min": min(values),
+            "max": max(values),
+            "per_second": dict(self.counts),
+        }
+
+
+@dataclass
+class ScheduledSite:
+    """
+    A schedule item kept in the wheel.
+
+    Attributes:
+        check_registry_id (int): The site registry to check.
+        interval (int): Seconds between checks.
+        phase (int): Offset of the checks within the interval.
+        due_tick (int): The second the next check is due at, before jitter.
+        recheck_interval (Optional[int]): Seconds between checks while the site fails.
+        max_interval (Optional[int]): Seconds the interval backs off to while the site passes.
+    """
+
+    check_registry_id: int
+    interval: int
+    phase: int = 0
+    due_tick: int = 0
+    recheck_interval: Optional[int] = None
+    max_interval: Optional[int] = None
+
+    @property
+    def adaptive(self) -> bool:
+        return bool(self.recheck_interval or self.max_interval)
+
+
+def adaptive_interval(
+    entry: ScheduledSite, status: Optional[Dict[str, Any]], now: float
+) -> int:
+    """
+    Returns the seconds until the next check of the entry, by the current status of its site.
+    """
+    if not entry.adaptive or not status or status["status"] is None:
+        return entry.interval
+    if status["status"] != SiteResponseStatus.PASS:
+        if (
+            entry.recheck_interval
+            and status["consecutive_failures"] <= settings.SCHEDULER_RECHECK_CHECKS
+        ):
+            return entry.recheck_interval
+        return entry.interval
+    if entry.max_interval and status["changed_at"]:
+        changed_at = datetime.datetime.fromisoformat(status["changed_at"])
+        stable = now - changed_at.timestamp()
+        doublings = min(int(stable // settings.SCHEDULER_BACKOFF_AFTER), 32)
+        return max(
+            entry.interval, min(entry.max_interval, entry.interval * 2**doublings)
+        )
+    return entry.interval
+
+
+class WheelScheduler:
+    """
+    Dispatches check_sites batches for the schedule items that are due.
+
+    Attributes:
+        batch_size (int): Maximum number of sites per check_sites task.
+        jitter (int): Maximum random delay in seconds added to every check.
+        stats (DispatchStats): Sites dispatched per second.
+        entries (Dict[int, ScheduledSite]): The scheduled sites by schedule item id.
+        items_by_site (Dict[int, Set[int]]): The schedule item ids by site registry id.
+        wheel (TimingWheel): The timers of the entries, with one second ticks.
+    """
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        jitter: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.batch_size = batch_size or settings.SCHEDULER_BATCH_SIZE
+        self.jitter = settings.SCHEDULER_JITTER if jitter is None else jitter
+        self.stats = DispatchStats(settings.SCHEDULER_STATS_WINDOW)
+        self.clock = clock
+        self.entries: Dict[int, ScheduledSite] = {}
+        self.items_by_site: Dict[int, Set[int]] = defaultdict(set)
+        self.wheel: TimingWheel[int] = TimingWheel(int(clock()))
+
+    def schedule(
+        self,
+        schedule_item_id: int,
+        check_registry_id: int,
+        interval: int,
+        recheck_interval: Optional[int] = None,
+        max_interval: Optional[int] = None,
+    ) -> None:
+        """
+        Add or update a schedule item. An item with an unchanged site and interval keeps its timer.
+        """
+        entry = self.entries.get(schedule_item_id)
+        if entry and (entry.check_registry_id, entry.interval) == (
+            check_registry_id,
+            interval,
+        ):
+            entry.recheck_interval = recheck_interval
+            entry.max_interval = max_interval
+            return
+        if entry:
+            self.items_by_site[entry.check_registry_id].discard(schedule_item_id)
+        phase = phase_offset(schedule_item_id, interval)
+        entry = ScheduledSite(
+            check_registry_id, interval, phase, 0, recheck_interval, max_interval
+        )
+        entry.due_tick = next_phase_tick(self.wheel.current_tick, interval, phase)
+        self.entries[schedule_item_id] = entry
+        self.items_by_site[check_registry_id].add(schedule_item_id)
+        self.wheel.add(schedule_item_id, entry.due_tick + self.jitter_for(entry))
+
+    def jitter_for(self, entry: ScheduledSite, interval: Optional[int] = None) -> int:
+        """
+        Returns a random delay for the next check, less than the interval.
+        """
+        jitter = min(self.jitter, (interval or entry.interval) - 1)
+        return random.randint(0, jitter) if jitter > 0 else 0
+
+    def unschedule(self, schedule_item_id: int) -> None:
+        entry = self.entries.pop(schedule_item_id, None)
+        if entry:
+            self.items_by_site[entry.check_registry_id].discard(schedule_item_id)
+            if not self.items_by_site[entry.check_registry_id]:
+                del self.items_by_site[entry.check_registry_id]
+        self.wheel.remove(schedule_item_id)
+
+    def load(self, schedule_items: Iterable[ScheduleItem]) -> None:
+        for item in schedule_items:
+            self.schedule(
+                item.id,
+                item.check_registry_id,
+                interval_seconds(item.schedule),
+                item.recheck_interval,
+                item.max_interval,
+            )
+
+    def load_all(self) -> None:
+        """
+        Reload every schedule item and drop the ones that no longer exist.
+            Disables the beat periodic tasks of site checks left by processes still scheduling with beat.
+        """
+        disable_beat_checks()
+        schedule_items = ScheduleItem.objects.select_related("schedule").only(
+            "id",
+            "check_registry_id",
+            "recheck_interval",
+            "max_interval",
+            "schedule__every",
+            "schedule__period",
+        )
+        seen = set()
+        for item in schedule_items.iterator(chunk_size=2000):
+            seen.add(item.id)
+            self.load([item])
+        for schedule_item_id in set(self.entries) - seen:
+            self.unschedule(schedule_item_id)
+        logger.info("Loaded %d schedule items", len(self.entries))
+
+    def apply_changes(self) -> int:
+        """
+        Reload the schedule items queued by mark_schedule_changed.
+
+        returns:
+            The number of changed schedule items.
+        """
+        connection = get_redis_connection()
+        changed = 0
+        while True:
+            ids = [int(i) for i in connection.spop(SCHEDULE_CHANGES_KEY, 1000) or []]
+            if not ids:
+                return changed
+            changed += len(ids)
+            schedule_items = ScheduleItem.objects.select_related("schedule").filter(
+                id__in=ids
+            )
+            found = {item.id: item for item in schedule_items}
+            for schedule_item_id in ids:
+                if schedule_item_id in found:
+                    self.load([found[schedule_item_id]])
+                else:
+                    self.unschedule(schedule_item_id)
+
+    def apply_failures(self) -> int:
+        """
+        Recheck the sites queued in FAILING_SITES_KEY by the consumer after their recheck_interval,
+        if their next check is later.
+
+        returns:
+            The number of rescheduled schedule items.
+        """
+        connection = get_redis_connection()
+        rescheduled = 0
+        while True:
+            ids = [int(i) for i in connection.spop(FAILING_SITES_KEY, 1000) or []]
+            if not ids:
+                return rescheduled
+            for check_registry_id in ids:
+                for schedule_item_id in self.items_by_site.get(check_registry_id, ()):
+                    entry = self.entries[schedule_item_id]
+                    if not entry.recheck_interval:
+                        continue
+                    due_tick = self.wheel.current_tick + entry.recheck_interval
+                    if due_tick < self.wheel.due_tick(schedule_item_id):
+                        entry.due_tick = due_tick
+                        self.wheel.add(schedule_item_id, due_tick)
+                        rescheduled += 1
+
+    def read_statuses(
+        self, entries: Iterable[ScheduledSite]
+    ) -> Dict[int, Optional[Dict[str, Any]]]:
+        """
+        Returns the current status of the sites of the adaptive entries, none if Redis fails.
+        """
+        check_registry_ids = list(
+            {entry.check_registry_id for entry in entries if entry.adaptive}
+        )
+        try:
+            return get_statuses(check_registry_ids)
+        except redis.RedisError:
+            logger.exception("Failed to read the site statuses, using the intervals")
+            return {}
+
+    def tick(self, now: Optional[float] = None) -> List[int]:
+        """
+        Dispatch the sites due up to now and schedule their next checks.
+
+        returns:
+            The ids of the dispatched site registries.
+        """
+        now = self.clock() if now is None else now
+        now_tick = int(now)
+        due: Dict[int, int] = {}
+        expired = [
+            (schedule_item_id, self.entries[schedule_item_id])
+            for schedule_item_id in self.wheel.advance(now_tick)
+        ]
+        statuses = self.read_statuses(entry for _, entry in expired)
+        for schedule_item_id, entry in expired:
+            interval = adaptive_interval(
+                entry, statuses.get(entry.check_registry_id), now
+            )
+            due[entry.check_registry_id] = min(
+                interval, due.get(entry.check_registry_id, interval)
+            )
+            entry.due_tick = self.next_due_tick(entry, now_tick, interval)
+            self.wheel.add(
+                schedule_item_id, entry.due_tick + self.jitter_for(entry, interval)
+            )
+        check_registry_ids = list(due)
+        self.stats.record(now_tick, len(check_registry_ids))
+        if not check_registry_ids:
+            return check_registry_ids
+        groups: Dict[Optional[str], List[int]] = {None: check_registry_ids}
+        if settings.CHECK_SHARDING:
+            groups = shard_router.group(check_registry_ids)
+        for queue, group in groups.items():
+            for start in range(0, len(group), self.batch_size):
+                end = start + self.batch_size
+                batch = group[start:end]
+                self.dispatch(batch, expires=min(due[pk] for pk in batch), queue=queue)
+        return check_registry_ids
+
+    def next_due_tick(
+        self, entry: ScheduledSite, now_tick: int, interval: Optional[int] = None
+    ) -> int:
+        """
+        Returns the tick of the check after the one due now.
+            Keeps the cadence of the item, and its phase if the scheduler fell a whole interval behind.
+            Adapted intervals count from now, the item is back on its phase after them.
+        """
+        if interval is not None and interval != entry.interval:
+            return now_tick + interval
+        due_tick = entry.due_tick + entry.interval
+        if due_tick <= now_tick or (due_tick - entry.phase) % entry.interval:
+            return next_phase_tick(now_tick, entry.interval, entry.phase)
+        return due_tick
+
+    def dispatch(
+        self, check_registry_ids: List[int], expires: int, queue: Optional[str] = None
+    ) -> None:
+        """
+        Send a check_sites task. It expires after the interval, when the next check supersedes it.
+            Sent to the queue of the shard of its sites when given, see core/sharding.py.
+        """
+        options = {"queue": queue} if queue else {}
+        check_sites.apply_async(
+            args=[check_registry_ids], expires=expires, ignore_result=True, **options
+        )
+
+    def publish_stats(self) -> None:
+        """
+        Log the dispatch distribution and store it in Redis for dashboards.
+        """
+        summary = self.stats.summary()
+        if not summary:
+            return
+        logger.info(
+            "Dispatched %(total)d sites in %(seconds)d seconds, per second: "
+            "mean %(mean).1f, stdev %(stdev).1f, min %(min)d, max %(max)d",
+            summary,
+        )
+        try:
+            get_redis_connection().set(
+                DISPATCH_STATS_KEY,
+                json.dumps(summary),
+                ex=2 * settings.SCHEDULER_STATS_WINDOW,
+            )
+        except redis.RedisError:
+            logger.exception("Failed to store dispatch stats")
+
+    def run(self) -> None:
+        """
+        Run the scheduler until interrupted, ticking once a second.
+        """
+        self.load_all()
+        next_full_sync = self.clock() + settings.SCHEDULER_FULL_SYNC_INTERVAL
+        next_stats = self.clock() + settings.SCHEDULER_STATS_WINDOW
+        while True:
+            now = self.clock()
+            if now >= next_stats:
+                self.publish_stats()
+                next_stats = now + settings.SCHEDULER_STATS_WINDOW
+            if now >= next_full_sync:
+                self.load_all()
+                next_full_sync = now + settings.SCHEDULER_FULL_SYNC_INTERVAL
+            else:
+                try:
+                    self.apply_changes()
+                except redis.RedisError:
+                    logger.exception("Failed to read schedule changes")
+            try:
+                self.apply_failures()
+            except redis.RedisError:
+                logger.exception("Failed to read failing sites")
+            dispatched = self.tick(now)
+            if dispatched:
+                logger.debug("Dispatched %d sites", len(dispatched))
+            time.sleep(max(0.0, 1.0 - (self.clock() % 1.0)))
@@ -1,7 +1,17 @@
+import datetime
+
 from django_celery_beat.models import IntervalSchedule
 from rest_framework import serializers
 
-from .models import ScheduleItem, SiteRegistry, SiteResponseHistory
+from .assertions import check_regex, parse_json_path
+from .models import (
+    AssertionKind,
+    ContentAssertion,
+    RollupGranularity,
+    ScheduleItem,
+    SiteRegistry,
+    SiteResponseHistory,
+)
 
 
 class ScheduleIntervalSerializer(serializers.Serializer):
@@ -20,6 +30,27 @@ class SiteRegistrySerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class ContentAssertionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ContentAssertion
+        fields = "__all__"
+
+    def validate(self, attrs):
+        kind = attrs.get("kind", getattr(self.instance, "kind", None))
+        value = attrs.get("value", getattr(self.instance, "value", None))
+        if kind == AssertionKind.REGEX:
+            try:
+                check_regex(value)
+            except ValueError as e:
+                raise serializers.ValidationError({"value": str(e)})
+        elif kind == AssertionKind.JSON_PATH:
+            try:
+                parse_json_path(value)
+            except ValueError as e:
+                raise serializers.ValidationError({"value": str(e)})
+        return attrs
+
+
 class ScheduleItemReadSerializer(serializers.ModelSerializer):
     check_registry = SiteRegistrySerializer()
     schedule = ScheduleIntervalSerializer()
@@ -37,6 +68,36 @@ class ScheduleItemWriteSerializer(serializers.ModelSerializer):
         model = ScheduleItem
         fields = "__all__"
 
+    def validate(self, attrs):
+        schedule = attrs.get("schedule")
+        if schedule is None and isinstance(self.instance, ScheduleItem):
+            schedule = {
+                "every": self.instance.schedule.every,
+                "period": self.instance.schedule.period,
+            }
+        if schedule is None:
+            schedule = ScheduleIntervalSerializer().to_internal_value({})
+        interval = datetime.timedelta(
+            **{schedule["period"]: schedule["every"]}
+        ).total_seconds()
+        recheck_interval = attrs.get(
+            "recheck_interval", getattr(self.instance, "recheck_interval", None)
+        )
+        max_interval = attrs.get(
+            "max_interval", getattr(self.instance, "max_interval", None)
+        )
+        if recheck_interval is not None and recheck_interval >= interval:
+            raise serializers.ValidationError(
+                {
+                    "recheck_interval": "recheck_interval must be shorter than the schedule."
+                }
+            )
+        if max_interval is not None and max_interval < interval:
+            raise serializers.ValidationError(
+                {"max_interval": "max_interval can't be shorter than the schedule."}
+            )
+        return attrs
+
     def update(self, instance, validated_data):
         schedule_data = validated_data.pop("schedule", None)
         if schedule_data:
@@ -49,6 +110,7 @@ class ScheduleItemWriteSerializer(serializers.ModelSerializer):
 
 class SiteResponseHistorySerializer(serializers.ModelSerializer):
     site = serializers.CharField(source="check_registry__url")
+
     class Meta:
         model = SiteResponseHistory
         read_only_fields = (
@@ -56,5 +118,33 @@ class SiteResponseHistorySerializer(serializers.ModelSerializer):
             "response_time",
             "response_text",
             "response_code",
+            "timings",
+            "run_count",
+            "last_seen_at",
+            "response_time_min",
+            "response_time_max",
         )
-        exclude = ("response_headers","check_registry")
\ No newline at end of file
+        exclude = ("response_body", "response_headers", "check_registry")
+
+
+class SiteResponseHistoryFilterSerializer(serializers.Serializer):
+    site = serializers.IntegerField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+
+class SiteResponseStatsFilterSerializer(serializers.Serializer):
+    granularity = serializers.ChoiceField(
+        choices=RollupGranularity.choices, default=RollupGranularity.HOUR
+    )
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if "since" in attrs and "until" in attrs and attrs["since"] >= attrs["until"]:
+            raise serializers.ValidationError({"since": "since must be before until."})
+        return attrs
+
+
+class SiteResponseHistoryExportSerializer(SiteResponseHistoryFilterSerializer):
+    file_format = serializers.ChoiceField(choices=["ndjson", "csv"], default="ndjson")
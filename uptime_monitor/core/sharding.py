@@ -0,0 +1,245 @@
+"""
+Consistent hash sharding of site checks over the check workers.
+
+With CHECK_SHARDING set, every worker node consuming the default queue is a
+shard: it also consumes its own queue, check_shard.<node name>, and heartbeats
+to the Redis sorted set check:shards every CHECK_SHARD_HEARTBEAT_INTERVAL
+seconds. Shards without a heartbeat for CHECK_SHARD_TTL seconds, or whose worker
+shut down, leave the ring.
+
+Sites are assigned to the live shards by consistent hashing of their host, or of
+their registry id when CHECK_SHARD_KEY is "registry", on a ring of
+CHECK_SHARD_VIRTUAL_NODES points per shard. A site sticks to its shard, which
+keeps the pooled connections, DNS entries and registry cache of the worker hot,
+and only the sites of a shard joining or leaving the ring move. Routers refresh
+the live shards every CHECK_SHARD_REFRESH_INTERVAL seconds.
+
+check_site tasks sent by beat are routed by route_check_task, and the wheel
+scheduler splits its check_sites batches by shard. Checks go to the default
+queue while no shard is live. Tasks left on the queue of a shard that left run
+when it is back, unless they expired.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import redis
+from celery.signals import celeryd_after_setup, worker_ready, worker_shutting_down
+from django.conf import settings
+
+from uptime_monitor.core.registry_cache import registry_cache
+from uptime_monitor.utils.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+SHARDS_KEY = "check:shards"
+SHARD_QUEUE_PREFIX = "check_shard."
+
+
+def shard_queue(shard: str) -> str:
+    return f"{SHARD_QUEUE_PREFIX}{shard}"
+
+
+def ring_hash(value: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """
+    Consistent hash ring of shards.
+
+    Attributes:
+        shards (FrozenSet[str]): The shards of the ring.
+    """
+
+    def __init__(self, shards: Iterable[str], virtual_nodes: int = None):
+        virtual_nodes = virtual_nodes or settings.CHECK_SHARD_VIRTUAL_NODES
+        self.shards = frozenset(shards)
+        points = sorted(
+            (ring_hash(f"{shard}#{i}"), shard)
+            for shard in self.shards
+            for i in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the shard owning the key, the first point of the ring after its hash.
+        """
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, ring_hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+def live_shards(now: Optional[float] = None) -> List[str]:
+    """
+    Returns the shards that sent a heartbeat in the last CHECK_SHARD_TTL seconds.
+    """
+    now = time.time() if now is None else now
+    members = get_redis_connection().zrangebyscore(
+        SHARDS_KEY, now - settings.CHECK_SHARD_TTL, "+inf"
+    )
+    return [member.decode() for member in members]
+
+
+class ShardRouter:
+    """
+    Assigns sites to the queues of the live shards.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._ring = HashRing([])
+        self._refresh_at = 0.0
+        self._lock = threading.Lock()
+
+    def ring(self) -> HashRing:
+        """
+        Returns the ring of the live shards, refreshed every CHECK_SHARD_REFRESH_INTERVAL
+        seconds. The last ring is kept when Redis is unavailable.
+        """
+        with self._lock:
+            now = self.clock()
+            if now >= self._refresh_at:
+                self._refresh_at = now + settings.CHECK_SHARD_REFRESH_INTERVAL
+                try:
+                    shards = live_shards()
+                except redis.RedisError:
+                    logger.exception("Failed to read the live check shards")
+                else:
+                    if set(shards) != self._ring.shards:
+                        logger.info("Check shards changed: %s", sorted(shards))
+                        self._ring = HashRing(shards)
+            return self._ring
+
+    def shard_keys(self, check_registry_ids: Iterable[int]) -> Dict[int, str]:
+        """
+        Returns the ring key of every site, its host or its id by CHECK_SHARD_KEY.
+        """
+        if settings.CHECK_SHARD_KEY == "registry":
+            return {pk: str(pk) for pk in check_registry_ids}
+        check_registry_ids = list(check_registry_ids)
+        registries = registry_cache.get_many(check_registry_ids)
+        keys = {}
+        for pk in check_registry_ids:
+            host = pk in registries and urlsplit(registries[pk].url).hostname
+            keys[pk] = host or str(pk)
+        return keys
+
+    def group(
+        self, check_registry_ids: Iterable[int]
+    ) -> Dict[Optional[str], List[int]]:
+        """
+        Returns the site ids by the queue of their shard, None for the default queue.
+        """
+        ring = self.ring()
+        if not ring.shards:
+            return {None: list(check_registry_ids)}
+        groups: Dict[Optional[str], List[int]] = defaultdict(list)
+        for pk, key in self.shard_keys(check_registry_ids).items():
+            shard = ring.get(key)
+            groups[None if shard is None else shard_queue(shard)].append(pk)
+        return dict(groups)
+
+
+shard_router = ShardRouter()
+
+
+def route_check_task(
+    name: str, args: List[Any], kwargs: Dict[str, Any], options: Dict[str, Any], **kw
+) -> Optional[Dict[str, str]]:
+    """
+    Celery router sending check_site tasks to the queue of the shard of their site.
+    """
+    if not settings.CHECK_SHARDING or name != "check_site":
+        return None
+    check_registry_id = kwargs.get("check_registry_id", args[0] if args else None)
+    if check_registry_id is None:
+        return None
+    (queue,) = shard_router.group([int(check_registry_id)])
+    return {"queue": queue} if queue else None
+
+
+class ShardHeartbeat:
+    """
+    Keeps the shard of this worker node in the ring.
+
+    Attributes:
+        shard (str): The node name of the worker.
+    """
+
+    def __init__(self, shard: str):
+        self.shard = shard
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self.run, name="check-shard-heartbeat", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def beat(self) -> None:
+        now = time.time()
+        with get_redis_connection().pipeline() as pipeline:
+            pipeline.zadd(SHARDS_KEY, {self.shard: now})
+            pipeline.zremrangebyscore(
+                SHARDS_KEY, "-inf", now - settings.CHECK_SHARD_TTL
+            )
+            pipeline.execute()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.beat()
+            except redis.RedisError:
+                logger.exception("Failed to send the heartbeat of shard %s", self.shard)
+            self._stopped.wait(settings.CHECK_SHARD_HEARTBEAT_INTERVAL)
+
+    def stop(self) -> None:
+        """
+        Leave the ring, so that the sites of the shard move right away.
+        """
+        self._stopped.set()
+        try:
+            get_redis_connection().zrem(SHARDS_KEY, self.shard)
+        except redis.RedisError:
+            logger.exception("Failed to remove shard %s", self.shard)
+
+
+_heartbeat: Optional[ShardHeartbeat] = None
+
+
+@celeryd_after_setup.connect
+def consume_shard_queue(sender: str, instance, **kwargs) -> None:
+    """
+    Make check workers consume the queue of their shard.
+    """
+    global _heartbeat
+    queues = instance.app.amqp.queues
+    if settings.CHECK_SHARDING and (
+        instance.app.conf.task_default_queue in queues.consume_from
+    ):
+        queues.select_add(shard_queue(sender))
+        _heartbeat = ShardHeartbeat(sender)
+        logger.info("Consuming the queue of check shard %s", sender)
+
+
+@worker_ready.connect
+def join_ring(**kwargs) -> None:
+    if _heartbeat is not None:
+        _heartbeat.start()
+
+
+@worker_shutting_down.connect
+def leave_ring(**kwargs) -> None:
+    if _heartbeat is not None:
+        _heartbeat.stop()
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django_celery_beat.models import IntervalSchedule
+
+from uptime_monitor.core.current_status import delete_status, forget_user_sites
+from uptime_monitor.core.models import ContentAssertion, ScheduleItem, SiteRegistry
+from uptime_monitor.core.registry_cache import publish_registry_changed
+from uptime_monitor.core.scheduler import mark_schedule_changed
+
+
+@receiver(post_save, sender=ScheduleItem)
+@receiver(post_delete, sender=ScheduleItem)
+def schedule_item_changed(sender, instance: ScheduleItem, **kwargs) -> None:
+    """
+    Queue the schedule item for the wheel scheduler once the transaction commits.
+    """
+    if settings.CHECK_SCHEDULER == "wheel":
+        schedule_item_id = instance.id
+        transaction.on_commit(lambda: mark_schedule_changed(schedule_item_id))
+
+
+@receiver(post_save, sender=IntervalSchedule)
+def interval_schedule_changed(sender, instance: IntervalSchedule, **kwargs) -> None:
+    """
+    Queue every schedule item using the interval for the wheel scheduler.
+    """
+    if settings.CHECK_SCHEDULER == "wheel":
+        schedule_item_ids = list(
+            ScheduleItem.objects.filter(schedule=instance).values_list("id", flat=True)
+        )
+        transaction.on_commit(lambda: mark_schedule_changed(*schedule_item_ids))
+
+
+@receiver(post_save, sender=SiteRegistry)
+@receiver(post_delete, sender=SiteRegistry)
+def site_registry_changed(sender, instance: SiteRegistry, **kwargs) -> None:
+    """
+    Drop the site registry from the worker caches once the transaction commits.
+    """
+    check_registry_id = instance.id
+    transaction.on_commit(lambda: publish_registry_changed(check_registry_id))
+
+
+@receiver(post_save, sender=SiteRegistry)
+def site_registry_created(
+    sender, instance: SiteRegistry, created: bool, **kwargs
+) -> None:
+    """
+    Drop the cached site ids of the user once the transaction commits.
+    """
+    if created:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: forget_user_sites(user_id))
+
+
+@receiver(post_delete, sender=SiteRegistry)
+def site_registry_deleted(sender, instance: SiteRegistry, **kwargs) -> None:
+    """
+    Drop the current status of the site and the cached site ids of the user once the
+    transaction commits.
+    """
+    check_registry_id, user_id = instance.id, instance.user_id
+
+    def forget() -> None:
+        forget_user_sites(user_id)
+        delete_status(check_registry_id)
+
+    transaction.on_commit(forget)
+
+
+@receiver(post_save, sender=ContentAssertion)
+@receiver(post_delete, sender=ContentAssertion)
+def content_assertion_changed(sender, instance: ContentAssertion, **kwargs) -> None:
+    """
+    Drop the site registry of the assertion from the worker caches once the transaction commits.
+    """
+    check_registry_id = instance.check_registry_id
+    transaction.on_commit(lambda: publish_registry_changed(check_registry_id))
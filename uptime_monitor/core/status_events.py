@@ -0,0 +1,172 @@
+"""
+Status change events, fanned out to websocket clients through Redis pub/sub.
+
+Once a batch of checks is committed, the consumer publishes the new current
+statuses that changed the status of their site, see core/current_status.py, as
+JSON on the Redis channel status:user:<user id> of the owner of the site.
+
+Every ASGI process runs one StatusHub, sharing one Redis pub/sub connection
+between its websocket connections: the hub subscribes to the channel of a user
+while one of their connections is open and puts the events in the queue of each
+of them. Queues hold STATUS_EVENTS_QUEUE_SIZE events, the oldest event is dropped
+for slow clients. Events published while the hub reconnects to Redis are lost,
+clients get a "resync" event to read the current statuses again.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+from uptime_monitor.utils.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+RESYNC_EVENT = {"type": "resync"}
+
+
+def status_channel(user_id: int) -> str:
+    return f"status:user:{user_id}"
+
+
+def publish_status_changes(
+    statuses: List[Dict[str, Any]], users: Dict[int, int]
+) -> None:
+    """
+    Publish the changed statuses to the channels of the owners of their sites.
+
+    Args:
+        statuses (List[Dict[str, Any]]): The changed statuses, see update_statuses.
+        users (Dict[int, int]): The user id of every site id.
+    """
+    if not statuses:
+        return
+    try:
+        with get_redis_connection().pipeline(transaction=False) as pipeline:
+            for status in statuses:
+                event = {"type": "status", **status}
+                pipeline.publish(
+                    status_channel(users[status["site"]]), json.dumps(event)
+                )
+            pipeline.execute()
+    except redis.RedisError:
+        logger.exception("Failed to publish %d status changes", len(statuses))
+
+
+def put_event(queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+    """
+    Put the event in the queue, dropping the oldest one if it is full.
+    """
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+class StatusHub:
+    """
+    Process wide subscriptions to the status channels of users.
+
+    Attributes:
+        connect (Callable[[], redis.asyncio.Redis]): Returns a new asyncio Redis client.
+    """
+
+    def __init__(self, connect: Optional[Callable[[], redis.asyncio.Redis]] = None):
+        self.connect = connect or (
+            lambda: redis.asyncio.Redis.from_url(settings.REDIS_URL)
+        )
+        self._queues: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self._client: Optional[redis.asyncio.Redis] = None
+        self._pubsub: Optional[redis.asyncio.client.PubSub] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    def new_pubsub(self) -> redis.asyncio.client.PubSub:
+        if self._client is None:
+            self._client = self.connect()
+        return self._client.pubsub(ignore_subscribe_messages=True)
+
+    async def subscribe(self, user_id: int) -> asyncio.Queue:
+        """
+        Returns a new queue receiving the status events of the user.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.STATUS_EVENTS_QUEUE_SIZE)
+        first = not self._queues[user_id]
+        self._queues[user_id].add(queue)
+        if self._pubsub is None:
+            self._pubsub = self.new_pubsub()
+        pubsub = self._pubsub
+        if first:
+            try:
+                await pubsub.subscribe(status_channel(user_id))
+            except (redis.RedisError, OSError):
+                # The reader resubscribes every user once Redis is back.
+                logger.warning("Failed to subscribe to user %s", user_id, exc_info=True)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self.read())
+        return queue
+
+    async def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._queues.get(user_id, set())
+        queues.discard(queue)
+        if not queues:
+            self._queues.pop(user_id, None)
+            if self._pubsub is not None:
+                try:
+                    await self._pubsub.unsubscribe(status_channel(user_id))
+                except redis.RedisError:
+                    logger.warning("Failed to unsubscribe from user %s", user_id)
+
+    def dispatch(self, message: Dict[str, Any]) -> None:
+        user_id = int(message["channel"].decode().rsplit(":", 1)[1])
+        event = json.loads(message["data"])
+        for queue in self._queues.get(user_id, ()):
+            put_event(queue, event)
+
+    async def read(self) -> None:
+        """
+        Dispatch the published events while users are subscribed, resubscribing after
+        Redis errors.
+        """
+        while self._queues:
+            try:
+                pubsub = self._pubsub
+                if pubsub is None or pubsub.connection is None:
+                    raise redis.ConnectionError("Not subscribed")
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message is not None and message["type"] == "message":
+                    self.dispatch(message)
+            except (redis.RedisError, OSError):
+                logger.warning("Status hub lost its Redis connection", exc_info=True)
+                await self.resubscribe()
+
+    async def resubscribe(self) -> None:
+        """
+        Subscribe a new connection to the channels of the subscribed users, retrying
+        every STATUS_EVENTS_RECONNECT_DELAY seconds, and tell their clients to resync.
+        """
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.reset()
+            except (redis.RedisError, OSError):
+                pass
+        while self._queues:
+            await asyncio.sleep(settings.STATUS_EVENTS_RECONNECT_DELAY)
+            pubsub = self._pubsub = self.new_pubsub()
+            user_ids = list(self._queues)
+            try:
+                await pubsub.subscribe(*map(status_channel, user_ids))
+            except (redis.RedisError, OSError):
+                logger.warning("Status hub failed to resubscribe", exc_info=True)
+                continue
+            for user_id in user_ids:
+                for queue in self._queues.get(user_id, ()):
+                    put_event(queue, RESYNC_EVENT)
+            return
+
+
+status_hub = StatusHub()
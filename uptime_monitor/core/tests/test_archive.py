@@ -0,0 +1,77 @@
+import datetime
+
+import pytest
+
+from uptime_monitor.core.archive import (
+    archive_closed_windows,
+    archive_dataset,
+    read_archives,
+)
+from uptime_monitor.core.models import (
+    ArchiveFormat,
+    HistoryArchive,
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseStatus,
+)
+from uptime_monitor.core.partitions import drop_expired_partitions
+from uptime_monitor.users.models import User
+
+NOW = datetime.datetime(2023, 6, 15, 12, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture
+def history(user: User):
+    site = SiteRegistry.objects.create(user=user, url="https://www.example.com")
+    for hours in range(0, 72, 6):
+        history = SiteResponseHistory.objects.create(
+            check_registry=site,
+            response_code=SiteResponseStatus.PASS,
+            response_time=hours / 100,
+            timings={"dns": 0.01, "total": hours / 100},
+        )
+        SiteResponseHistory.objects.filter(id=history.id).update(
+            created_at=NOW - datetime.timedelta(hours=hours)
+        )
+    return site
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("format", ArchiveFormat.values)
+def test_archive_closed_windows(history, settings, tmp_path, format: str) -> None:
+    """Test closed daily windows are archived once and read back from the files."""
+    settings.HISTORY_ARCHIVE_URI = str(tmp_path)
+    settings.HISTORY_ARCHIVE_FORMAT = format
+    settings.HISTORY_ARCHIVE_BATCH_SIZE = 2
+    settings.HISTORY_PARTITION_DAYS = 1
+
+    archives = archive_closed_windows(NOW)
+
+    assert [archive.start.day for archive in archives] == [12, 13, 14]
+    assert archive_closed_windows(NOW) == []
+    assert sum(archive.row_count for archive in archives) == 9
+    assert (tmp_path / "created_date=2023-06-14").is_dir()
+
+    since = datetime.datetime(2023, 6, 13, tzinfo=datetime.timezone.utc)
+    table = read_archives(since, columns=["response_time", "timing_dns"])
+    assert table.num_rows == 8
+    assert table.column_names == ["response_time", "timing_dns"]
+    assert set(table["timing_dns"].to_pylist()) == {0.01}
+    assert archive_dataset().count_rows() == 9
+
+
+@pytest.mark.django_db
+def test_partitions_are_dropped_once_archived(history, settings, tmp_path) -> None:
+    """Test expired partitions are kept until they are archived."""
+    settings.HISTORY_ARCHIVE_URI = str(tmp_path)
+    settings.HISTORY_RETENTION_DAYS = 1
+    settings.HISTORY_PARTITION_DAYS = 1
+
+    assert drop_expired_partitions(NOW) == []
+    assert SiteResponseHistory.objects.count() == 12
+
+    archive_closed_windows(NOW)
+    drop_expired_partitions(NOW)
+
+    assert HistoryArchive.objects.count() == 3
+    assert SiteResponseHistory.objects.count() == 5
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+from uptime_monitor.core.assertions import (
+    AhoCorasick,
+    CompiledAssertions,
+    SubstringMatcher,
+    check_regex,
+    parse_json_path,
+)
+from uptime_monitor.core.models import AssertionKind
+
+BODY = json.dumps(
+    {"status": "ok", "services": [{"name": "API", "healthy": True}], "version": 3}
+)
+
+
+def run(specs, body: str = BODY, chunk_size: int = 7):
+    assertion_run = CompiledAssertions(specs).start()
+    for start in range(0, len(body), chunk_size):
+        end = start + chunk_size
+        assertion_run.feed(body[start:end])
+    return assertion_run
+
+
+@pytest.mark.parametrize("matcher_class", [AhoCorasick, SubstringMatcher])
+def test_literal_matchers_match_across_chunks(matcher_class) -> None:
+    """Test both literal matchers find overlapping patterns split over chunks."""
+    patterns = ["he", "she", "his", "hers", "absent"]
+    cursor = matcher_class(patterns).start()
+
+    matched = set()
+    for chunk in ["us", "he", "rs a", "nd h", "is"]:
+        matched |= cursor.feed(chunk)
+
+    assert matched == {0, 1, 2, 3}
+
+
+@pytest.mark.parametrize(
+    "specs,failures",
+    [
+        ([(AssertionKind.CONTAINS, '"STATUS"', None, False)], []),
+        ([(AssertionKind.CONTAINS, '"STATUS"', None, True)], ['CONTAINS "STATUS"']),
+        ([(AssertionKind.NOT_CONTAINS, "error", None, False)], []),
+        (
+            [(AssertionKind.NOT_CONTAINS, "healthy", None, False)],
+            ["NOT_CONTAINS healthy"],
+        ),
+        ([(AssertionKind.REGEX, r'"version": \d+', None, False)], []),
+        ([(AssertionKind.JSON_PATH, "$.services[0].name", '"API"', False)], []),
+        ([(AssertionKind.JSON_PATH, "$.services[0].healthy", "true", False)], []),
+        (
+            [(AssertionKind.JSON_PATH, '$["version"]', "4", False)],
+            ['JSON_PATH $["version"] == 4'],
+        ),
+    ],
+)
+def test_compiled_assertions(specs, failures) -> None:
+    """Test every assertion kind against a JSON body."""
+    assert run(specs).failures() == failures
+
+
+def test_compiled_assertions_use_aho_corasick_for_many_literals(settings) -> None:
+    """Test sites with many literals share one automaton per case mode."""
+    settings.ASSERTION_AHO_CORASICK_MIN_PATTERNS = 3
+    specs = [
+        (AssertionKind.CONTAINS, word, None, False) for word in ("ok", "api", "name")
+    ]
+    specs.append((AssertionKind.CONTAINS, "missing", None, False))
+
+    compiled = CompiledAssertions(specs)
+
+    assert [type(matcher) for _, _, matcher in compiled.matchers] == [AhoCorasick]
+    assert run(specs).failures() == ["CONTAINS missing"]
+
+
+def test_assertion_run_decided_early() -> None:
+    """Test the run is decided once required literals match or a forbidden one does."""
+    required = CompiledAssertions(
+        [(AssertionKind.CONTAINS, "status", None, False)]
+    ).start()
+    forbidden = CompiledAssertions(
+        [(AssertionKind.NOT_CONTAINS, "status", None, False)]
+    ).start()
+
+    required.feed('{"status"')
+    forbidden.feed('{"status"')
+
+    assert required.decided
+    assert forbidden.decided
+    assert forbidden.failures() == ["NOT_CONTAINS status"]
+
+
+@pytest.mark.parametrize("path", ["services[0]", "$.", "$[x]"])
+def test_parse_json_path_rejects_invalid_paths(path: str) -> None:
+    with pytest.raises(ValueError):
+        parse_json_path(path)
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    ["(a+)+$", r"(\w+\s?)*$", "(?:a|b*)*c", r"(a)\1", "[", "a" * 300],
+)
+def test_check_regex_rejects_unsafe_patterns(pattern: str) -> None:
+    with pytest.raises(ValueError):
+        check_regex(pattern)
+
+
+def test_regex_assertions_are_bounded(settings) -> None:
+    """Test regexes only scan the start of the body, and rejected ones fail."""
+    settings.ASSERTION_REGEX_MAX_CHARS = 10
+    body = "x" * 20 + "version"
+    specs = [
+        (AssertionKind.REGEX, "x{5}", None, True),
+        (AssertionKind.REGEX, "version", None, True),
+        (AssertionKind.REGEX, "(x+)+y", None, True),
+    ]
+
+    assert check_regex(r"(ab){2,3}\d+").search("abab1")
+    assert run(specs, body).failures() == [
+        "REGEX (x+)+y (Nested unbounded quantifiers are not allowed)",
+        "REGEX version",
+    ]
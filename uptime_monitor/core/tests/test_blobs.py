@@ -0,0 +1,84 @@
+import pytest
+
+from uptime_monitor.core.blobs import delete_orphan_blobs, encode_headers, read_contents
+from uptime_monitor.core.consumer import write_response_history
+from uptime_monitor.core.models import (
+    ContentBlob,
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseStatus,
+)
+from uptime_monitor.users.models import User
+
+HEADERS = [["Content-Type", "text/html"], ["Date", "Thu, 15 Jun 2023 12:00:00 GMT"]]
+
+
+def result_data(site: SiteRegistry, response_code: str, response_text: str):
+    return {
+        "check_registry": site.id,
+        "response_code": response_code,
+        "response_text": response_text,
+        "response_time": 0.1,
+        "response_headers": HEADERS,
+    }
+
+
+def test_encode_headers_is_canonical(settings) -> None:
+    """Test header sets are sorted, lowercased and stripped of volatile headers."""
+    settings.HISTORY_VOLATILE_HEADERS = ["date"]
+    headers = [("X-Cache", "HIT"), ("Date", "now"), ("content-type", "text/html")]
+
+    assert encode_headers(headers) == "content-type: text/html\nx-cache: HIT"
+    assert encode_headers(reversed(headers)) == encode_headers(headers)
+    assert encode_headers("Headers({})") == "Headers({})"
+    assert encode_headers(None) is None
+
+
+@pytest.mark.django_db
+def test_write_response_history_deduplicates_contents(user: User, settings) -> None:
+    """Test bodies are kept for non-PASS checks only and every content is stored once."""
+    settings.HISTORY_BODY_POLICY = "non_pass"
+    site = SiteRegistry.objects.create(user=user, url="https://www.example.com")
+
+    histories = write_response_history(
+        [
+            result_data(site, SiteResponseStatus.PASS, "<html>ok</html>"),
+            result_data(site, SiteResponseStatus.FAIL, "<html>down</html>"),
+            result_data(site, SiteResponseStatus.MISMATCH, "<html>down</html>"),
+            result_data(site, SiteResponseStatus.ERROR, "x" * 1000),
+        ]
+    )
+    write_response_history(
+        [result_data(site, SiteResponseStatus.FAIL, "<html>down</html>")]
+    )
+
+    passed, failed, mismatched, errored = histories
+    assert passed.response_body_id is None
+    assert failed.response_body_id == mismatched.response_body_id
+    assert errored.response_body_id is None
+    assert errored.response_text is not None
+    assert len(errored.response_text) == 256
+    assert len({h.response_headers_id for h in SiteResponseHistory.objects.all()}) == 1
+    assert ContentBlob.objects.count() == 2
+    assert read_contents([failed.response_body_id, failed.response_headers_id]) == {
+        failed.response_body_id: "<html>down</html>",
+        failed.response_headers_id: "content-type: text/html",
+    }
+
+
+@pytest.mark.django_db
+def test_delete_orphan_blobs(user: User, settings) -> None:
+    """Test only the blobs no history references are deleted."""
+    settings.HISTORY_BLOB_GC_BATCH_SIZE = 1
+    site = SiteRegistry.objects.create(user=user, url="https://www.example.com")
+    histories = write_response_history(
+        [result_data(site, SiteResponseStatus.FAIL, text) for text in "abc"]
+    )
+    kept = histories[-1]
+    SiteResponseHistory.objects.exclude(id=kept.id).delete()
+
+    assert delete_orphan_blobs() == 2
+    assert set(ContentBlob.objects.values_list("digest", flat=True)) == {
+        kept.response_body_id,
+        kept.response_headers_id,
+    }
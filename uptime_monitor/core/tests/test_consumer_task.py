@@ -0,0 +1,112 @@
+from typing import List
+from unittest.mock import MagicMock
+
+import pytest
+from celery_batches import SimpleRequest
+from django.db import IntegrityError, OperationalError
+
+from uptime_monitor.core.consumer import (
+    DEAD_LETTER_QUEUE,
+    save_response_history_batch,
+    write_response_history,
+)
+from uptime_monitor.core.models import (
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseStatus,
+)
+from uptime_monitor.users.models import User
+
+
+def make_request(data, **kwargs) -> SimpleRequest:
+    request = MagicMock(spec=SimpleRequest)
+    request.kwargs = {"data": data, **kwargs}
+    return request
+
+
+def result_data(check_registry_id: int, response_code=SiteResponseStatus.PASS):
+    return {
+        "check_registry": check_registry_id,
+        "response_code": response_code,
+        "response_text": "x" * 1000,
+        "response_time": 0.1,
+        "response_headers": None,
+    }
+
+
+@pytest.mark.django_db
+def test_write_response_history(user: User) -> None:
+    """Test write_response_history saves the batch and updates last_checked_at."""
+    sites = [
+        SiteRegistry.objects.create(user=user, url=f"https://site{i}.example.com")
+        for i in range(3)
+    ]
+    items = [result_data(site.id) for site in sites for _ in range(2)]
+    items.append(result_data(sites[0].id, response_code="UNKNOWN"))
+    items.append(result_data(0))
+
+    histories = write_response_history(items)
+
+    assert len(histories) == 6
+    assert SiteResponseHistory.objects.count() == 6
+    for site in sites:
+        site.refresh_from_db()
+        assert site.last_checked_at == max(
+            h.created_at for h in histories if h.check_registry_id == site.id
+        )
+    # PASS bodies aren't kept by the default HISTORY_BODY_POLICY.
+    assert all(
+        h.response_text is None and h.response_body_id is None for h in histories
+    )
+
+
+def test_save_response_history_batch_requeues_on_database_error(
+    mocker, settings
+) -> None:
+    """Test the batch is published again with its attempts on connection errors, and results
+    that failed HISTORY_BATCH_MAX_ATTEMPTS writes are dead lettered."""
+    settings.HISTORY_BATCH_MAX_ATTEMPTS = 3
+    mocker.patch(
+        "uptime_monitor.core.consumer.write_response_history",
+        side_effect=OperationalError,
+    )
+    apply_async_mock = mocker.patch.object(save_response_history_batch, "apply_async")
+    requests = [
+        make_request(result_data(0)),
+        make_request(result_data(1), attempt=1),
+        make_request(result_data(2), attempt=2),
+    ]
+
+    save_response_history_batch(requests)
+
+    calls = apply_async_mock.call_args_list
+    assert [call.kwargs["kwargs"]["attempt"] for call in calls] == [1, 2, 3]
+    assert [call.kwargs["queue"] for call in calls] == [
+        "response_history",
+        "response_history",
+        DEAD_LETTER_QUEUE,
+    ]
+    assert "countdown" not in calls[2].kwargs
+
+
+def test_save_response_history_batch_dead_letters_failing_results(mocker) -> None:
+    """Test batches failing on errors a retry wouldn't fix are bisected, and only the failing
+    results are dead lettered."""
+    written: List[int] = []
+
+    def write(items):
+        if any(data["check_registry"] == 5 for data in items):
+            raise IntegrityError
+        written.extend(data["check_registry"] for data in items)
+
+    mocker.patch(
+        "uptime_monitor.core.consumer.write_response_history", side_effect=write
+    )
+    apply_async_mock = mocker.patch.object(save_response_history_batch, "apply_async")
+
+    save_response_history_batch([make_request(result_data(i)) for i in range(8)])
+
+    assert sorted(written) == [0, 1, 2, 3, 4, 6, 7]
+    [call] = apply_async_mock.call_args_list
+    assert call.kwargs["queue"] == DEAD_LETTER_QUEUE
+    assert call.kwargs["kwargs"]["data"]["check_registry"] == 5
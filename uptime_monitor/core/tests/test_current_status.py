@@ -0,0 +1,174 @@
+import datetime
+
+import fakeredis
+import pytest
+import redis
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from uptime_monitor.core.consumer import write_response_history
+from uptime_monitor.core.current_status import (
+    FAILING_SITES_KEY,
+    get_user_statuses,
+    user_sites_key,
+)
+from uptime_monitor.core.models import (
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseRollup,
+    SiteResponseStatus,
+)
+from uptime_monitor.users.models import User
+
+NOW = datetime.datetime(2023, 6, 15, 12, tzinfo=datetime.timezone.utc)
+
+
+def result_data(site: SiteRegistry, response_code: str, response_time: float):
+    return {
+        "check_registry": site.id,
+        "response_code": response_code,
+        "response_text": None,
+        "response_time": response_time,
+        "response_headers": None,
+    }
+
+
+@pytest.fixture
+def redis_connection(mocker) -> fakeredis.FakeRedis:
+    connection = fakeredis.FakeRedis()
+    mocker.patch(
+        "uptime_monitor.core.current_status.get_redis_connection",
+        return_value=connection,
+    )
+    return connection
+
+
+@pytest.fixture
+def sites(user: User):
+    return [
+        SiteRegistry.objects.create(user=user, url=f"https://site{i}.example.com")
+        for i in range(2)
+    ]
+
+
+def write_at(minutes: int, *items) -> None:
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(
+            "django.utils.timezone.now",
+            lambda: NOW + datetime.timedelta(minutes=minutes),
+        )
+        write_response_history(list(items))
+
+
+@pytest.mark.django_db
+def test_consumer_updates_current_status(
+    redis_connection, user: User, sites, settings
+) -> None:
+    """Test the status counts consecutive failures and keeps when it last changed, and sites
+    that start failing are queued for the wheel scheduler whatever CHECK_SCHEDULER."""
+    settings.CHECK_SCHEDULER = "beat"
+    site = sites[0]
+    write_at(0, result_data(site, SiteResponseStatus.PASS, 0.1))
+    assert not redis_connection.exists(FAILING_SITES_KEY)
+    write_at(
+        1,
+        result_data(site, SiteResponseStatus.TIMEOUT, 5.0),
+        result_data(site, SiteResponseStatus.FAIL, 0.2),
+    )
+    write_at(2, result_data(site, SiteResponseStatus.FAIL, 0.3))
+
+    statuses = get_user_statuses(user.id)
+
+    assert statuses[0] == {
+        "site": site.id,
+        "status": SiteResponseStatus.FAIL,
+        "response_time": 0.3,
+        "checked_at": (NOW + datetime.timedelta(minutes=2)).isoformat(),
+        "consecutive_failures": 3,
+        "changed_at": (NOW + datetime.timedelta(minutes=1)).isoformat(),
+    }
+    assert statuses[1]["site"] == sites[1].id
+    assert statuses[1]["status"] is None
+    assert redis_connection.smembers(FAILING_SITES_KEY) == {str(site.id).encode()}
+
+    write_at(3, result_data(site, SiteResponseStatus.PASS, 0.1))
+
+    assert get_user_statuses(user.id)[0]["consecutive_failures"] == 0
+
+
+@pytest.mark.django_db
+def test_site_status_api_reads_redis_only(redis_connection, user: User, sites) -> None:
+    """Test the status endpoint loads the site ids of the user once, then only reads Redis."""
+    write_at(0, result_data(sites[1], SiteResponseStatus.ERROR, 0.0))
+    SiteRegistry.objects.create(
+        user=User.objects.create(username="other"), url="https://other.example.com"
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.get("/api/sites-registry/status/")
+    assert response.status_code == 200
+    assert [entry["site"] for entry in response.data] == [site.id for site in sites]
+    assert redis_connection.ttl(user_sites_key(user.id)) > 0
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get("/api/sites-registry/status/")
+
+    # Only the savepoint of ATOMIC_REQUESTS inside the test transaction.
+    assert all("SAVEPOINT" in query["sql"] for query in queries.captured_queries)
+
+    assert response.status_code == 200
+    assert response.data[1]["status"] == SiteResponseStatus.ERROR
+    assert response.data[1]["consecutive_failures"] == 1
+
+
+@pytest.mark.django_db
+def test_site_status_api_without_redis(user: User, mocker) -> None:
+    """Test the status endpoint answers 503 when Redis is unavailable."""
+    mocker.patch(
+        "uptime_monitor.core.current_status.get_redis_connection",
+        side_effect=redis.ConnectionError,
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.get("/api/sites-registry/status/")
+
+    assert response.status_code == 503
+
+
+@pytest.mark.django_db
+def test_consumer_uses_the_time_of_the_checks(
+    redis_connection, user: User, sites
+) -> None:
+    """Test histories, rollups and statuses get the checked_at of the producer, in order,
+    and checks delivered late don't change the status."""
+    site = sites[0]
+
+    def checked(minutes: int, response_code: str) -> dict:
+        checked_at = (NOW + datetime.timedelta(minutes=minutes)).timestamp()
+        return {**result_data(site, response_code, 0.1), "checked_at": checked_at}
+
+    write_at(
+        10,
+        checked(2, SiteResponseStatus.FAIL),
+        checked(1, SiteResponseStatus.PASS),
+    )
+    write_at(11, checked(0, SiteResponseStatus.PASS))
+
+    assert list(
+        SiteResponseHistory.objects.order_by("created_at").values_list(
+            "created_at", "response_code"
+        )
+    ) == [
+        (NOW, SiteResponseStatus.PASS),
+        (NOW + datetime.timedelta(minutes=1), SiteResponseStatus.PASS),
+        (NOW + datetime.timedelta(minutes=2), SiteResponseStatus.FAIL),
+    ]
+    assert SiteResponseRollup.objects.filter(granularity="MINUTE").count() == 3
+    status = get_user_statuses(user.id)[0]
+    assert status["status"] == SiteResponseStatus.FAIL
+    assert status["changed_at"] == (NOW + datetime.timedelta(minutes=2)).isoformat()
+    site.refresh_from_db()
+    assert site.last_checked_at == NOW + datetime.timedelta(minutes=2)
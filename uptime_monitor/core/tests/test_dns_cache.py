@@ -0,0 +1,168 @@
+import asyncio
+from types import SimpleNamespace
+
+import dns.asyncresolver
+import dns.resolver
+import httpcore
+import pytest
+
+from uptime_monitor.core.dns_cache import DNSCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RRset(list):
+    def __init__(self, addresses, ttl):
+        super().__init__(SimpleNamespace(address=address) for address in addresses)
+        self.ttl = ttl
+
+
+RECORDS = {
+    "example.com": (["93.184.216.34"], 60),
+    "short.example.com": (["10.0.0.1"], 1),
+    "empty.example.com": ([], 60),
+}
+
+
+class FakeAnswers:
+    """Answers A records from RECORDS and counts queries."""
+
+    def __init__(self) -> None:
+        self.queries = 0
+
+    def answer(self, host, rdtype):
+        if host not in RECORDS:
+            raise dns.resolver.NXDOMAIN()
+        addresses, ttl = RECORDS[host]
+        if rdtype != "A" or not addresses:
+            return SimpleNamespace(rrset=None)
+        return SimpleNamespace(rrset=RRset(addresses, ttl))
+
+
+class FakeResolver(FakeAnswers, dns.resolver.Resolver):
+    def __init__(self) -> None:
+        FakeAnswers.__init__(self)
+        dns.resolver.Resolver.__init__(self, configure=False)
+
+    def resolve(self, host, rdtype, **kwargs):
+        self.queries += 1
+        return self.answer(host, rdtype)
+
+
+class FakeAsyncResolver(FakeAnswers, dns.asyncresolver.Resolver):
+    def __init__(self) -> None:
+        FakeAnswers.__init__(self)
+        dns.asyncresolver.Resolver.__init__(self, configure=False)
+
+    async def resolve(self, host, rdtype, **kwargs):
+        self.queries += 1
+        await asyncio.sleep(0.01)
+        return self.answer(host, rdtype)
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+@pytest.fixture
+def resolver() -> FakeResolver:
+    return FakeResolver()
+
+
+@pytest.fixture
+def async_resolver() -> FakeAsyncResolver:
+    return FakeAsyncResolver()
+
+
+@pytest.fixture
+def cache(
+    clock: Clock, resolver: FakeResolver, async_resolver: FakeAsyncResolver
+) -> DNSCache:
+    cache = DNSCache(max_size=10, min_ttl=5, max_ttl=600, negative_ttl=30, clock=clock)
+    cache._resolver = resolver
+    cache._async_resolver = async_resolver
+    return cache
+
+
+def test_dns_cache_honors_record_ttl(
+    cache: DNSCache, clock: Clock, resolver: FakeResolver
+) -> None:
+    """Test answers are cached for their TTL, clamped to the minimum TTL."""
+    assert cache.resolve("Example.com") == ["93.184.216.34"]
+    assert cache.resolve("short.example.com") == ["10.0.0.1"]
+    queries = resolver.queries
+
+    clock.now = 4
+    cache.resolve("example.com")
+    cache.resolve("short.example.com")
+    assert resolver.queries == queries
+
+    clock.now = 5
+    cache.resolve("example.com")
+    assert resolver.queries == queries
+    cache.resolve("short.example.com")
+    assert resolver.queries == queries + 2
+
+    clock.now = 60
+    cache.resolve("example.com")
+    assert resolver.queries == queries + 4
+
+
+def test_dns_cache_negative_entries(
+    cache: DNSCache, clock: Clock, resolver: FakeResolver
+) -> None:
+    """Test names without addresses fail from the cache until the negative TTL."""
+    with pytest.raises(httpcore.ConnectError):
+        cache.resolve("empty.example.com")
+    queries = resolver.queries
+    with pytest.raises(httpcore.ConnectError):
+        cache.resolve("empty.example.com")
+    assert resolver.queries == queries
+
+    clock.now = 30
+    with pytest.raises(httpcore.ConnectError):
+        cache.resolve("empty.example.com")
+    assert resolver.queries == queries + 2
+
+
+def test_dns_cache_falls_back_to_system_resolver(cache: DNSCache, mocker) -> None:
+    """Test names unknown to DNS are resolved by getaddrinfo."""
+    getaddrinfo = mocker.patch(
+        "socket.getaddrinfo",
+        return_value=[(2, 1, 6, "", ("127.0.0.1", 0))],
+    )
+
+    assert cache.resolve("localhost") == ["127.0.0.1"]
+    assert cache.resolve("localhost") == ["127.0.0.1"]
+    getaddrinfo.assert_called_once()
+
+
+def test_dns_cache_bypass(cache: DNSCache, resolver: FakeResolver) -> None:
+    """Test bypassing lookups always query DNS."""
+    cache.resolve("example.com")
+    queries = resolver.queries
+
+    cache.resolve("example.com", bypass=True)
+
+    assert resolver.queries == queries + 2
+
+
+def test_dns_cache_deduplicates_concurrent_lookups(
+    cache: DNSCache, async_resolver: FakeAsyncResolver
+) -> None:
+    """Test concurrent tasks resolving the same host share one lookup."""
+
+    async def run():
+        return await asyncio.gather(*(cache.aresolve("example.com") for _ in range(10)))
+
+    results = asyncio.run(run())
+
+    assert results == [["93.184.216.34"]] * 10
+    assert async_resolver.queries == 2
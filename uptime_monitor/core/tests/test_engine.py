@@ -0,0 +1,135 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+from uptime_monitor.core.engine import run_checks
+from uptime_monitor.core.models import SiteRegistry, SiteResponseStatus
+
+
+def make_site_registry(id: int, url: str, text: str = None) -> SiteRegistry:
+    site_registry = MagicMock(spec=SiteRegistry)
+    site_registry.id = id
+    site_registry.url = url
+    site_registry.http_method = "GET"
+    site_registry.timeout = 5
+    site_registry.text = text
+    site_registry.status_code = 200
+    site_registry.bypass_dns_cache = False
+    site_registry.hosted_at = None
+    return site_registry
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/timeout":
+        raise httpx.ConnectTimeout("timed out", request=request)
+    if request.url.path == "/error":
+        raise httpx.ConnectError("refused", request=request)
+    if request.url.path == "/crash":
+        raise RuntimeError("unexpected")
+    if request.url.path == "/missing":
+        return httpx.Response(404, text="Not Found")
+    return httpx.Response(200, text="This is the Example Domain")
+
+
+@pytest.mark.parametrize(
+    "path,text,expected",
+    [
+        ("/", "example domain", SiteResponseStatus.PASS),
+        ("/", "Other text", SiteResponseStatus.MISMATCH),
+        ("/missing", None, SiteResponseStatus.FAIL),
+        ("/timeout", None, SiteResponseStatus.TIMEOUT),
+        ("/error", None, SiteResponseStatus.ERROR),
+    ],
+)
+def test_run_checks_outcomes(
+    path: str, text: str, expected: SiteResponseStatus
+) -> None:
+    """Test run_checks maps responses and errors to SiteResponseStatus."""
+    site_registry = make_site_registry(1, f"https://www.example.com{path}", text)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await run_checks([site_registry], concurrency=1, client=client)
+
+    [result] = asyncio.run(run())
+
+    assert result.check_registry_id == 1
+    assert result.response_code == expected
+    assert result.response_time >= 0
+    assert result.timings["total"] == round(result.response_time, 6)
+
+
+def test_run_checks_bounds_concurrency() -> None:
+    """Test run_checks never exceeds the concurrency limit."""
+    in_flight = 0
+    peak = 0
+
+    async def slow_handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, text="OK")
+
+    site_registries = [
+        make_site_registry(i, f"https://site{i}.example.com") for i in range(20)
+    ]
+
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(slow_handler)
+        ) as client:
+            return await run_checks(site_registries, concurrency=4, client=client)
+
+    results = asyncio.run(run())
+
+    assert [r.check_registry_id for r in results] == list(range(20))
+    assert peak == 4
+
+
+def test_run_checks_isolates_failing_probes(mocker) -> None:
+    """Test an unexpected error of a probe is an ERROR of its site only."""
+    site_registries = [
+        make_site_registry(1, "https://www.example.com/"),
+        make_site_registry(2, "https://www.example.com/crash"),
+        make_site_registry(3, "https://www.example.com/"),
+    ]
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await run_checks(site_registries, concurrency=3, client=client)
+
+    results = asyncio.run(run())
+
+    assert [r.response_code for r in results] == [
+        SiteResponseStatus.PASS,
+        SiteResponseStatus.ERROR,
+        SiteResponseStatus.PASS,
+    ]
+    assert "unexpected" in results[1].response_text
+
+    limiters = mocker.Mock()
+    limiters.slot.side_effect = [
+        mocker.MagicMock(),
+        RuntimeError("limiter"),
+        mocker.MagicMock(),
+    ]
+    site_registries[1].url = "https://www.example.com/"
+
+    async def run_limited():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await run_checks(
+                site_registries, concurrency=3, client=client, limiters=limiters
+            )
+
+    results = asyncio.run(run_limited())
+
+    assert [r.check_registry_id for r in results] == [1, 2, 3]
+    assert [r.response_code for r in results] == [
+        SiteResponseStatus.PASS,
+        SiteResponseStatus.ERROR,
+        SiteResponseStatus.PASS,
+    ]
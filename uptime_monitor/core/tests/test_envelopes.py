@@ -0,0 +1,102 @@
+import msgpack
+import pytest
+from kombu.serialization import dumps, loads
+
+from uptime_monitor.core.consumer import (
+    publish_response_history,
+    write_response_history,
+)
+from uptime_monitor.core.envelopes import (
+    RAW,
+    RESULT_FIELDS,
+    ZLIB,
+    decode_result,
+    encode_result,
+)
+from uptime_monitor.core.models import (
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseStatus,
+)
+from uptime_monitor.users.models import User
+
+HEADERS = [["Content-Type", "text/html"], ["Server", "nginx"]]
+
+
+def result_data(check_registry_id: int, response_code: str, text: str) -> dict:
+    return {
+        "check_registry": check_registry_id,
+        "response_code": response_code,
+        "response_text": text,
+        "response_time": 0.25,
+        "response_headers": HEADERS,
+        "timings": {"dns": 0.01, "connect": 0.02},
+        "checked_at": 1686830400.5,
+    }
+
+
+@pytest.mark.parametrize(
+    "text,flag", [("short", RAW), ("body " * 1000, ZLIB)], ids=["raw", "zlib"]
+)
+def test_result_envelope_round_trip(text: str, flag: bytes) -> None:
+    """Test envelopes decode to the result, compressed from the size threshold only."""
+    data = result_data(1, SiteResponseStatus.FAIL, text)
+
+    envelope = encode_result(data)
+
+    assert envelope[:1] == flag
+    assert decode_result(envelope) == data
+    if flag == ZLIB:
+        assert len(envelope) < len(text)
+    # msgpack task messages carry the envelope as it is.
+    content_type, content_encoding, body = dumps({"data": envelope}, "msgpack")
+    assert loads(body, content_type, content_encoding, accept=[content_type]) == {
+        "data": envelope
+    }
+
+
+def test_decode_result_reads_version_1_envelopes() -> None:
+    """Test envelopes sent before checked_at was added still decode."""
+    data = result_data(1, SiteResponseStatus.FAIL, "short")
+    payload = [1, *(data[field] for field in RESULT_FIELDS[:-1])]
+
+    assert decode_result(RAW + msgpack.packb(payload, use_bin_type=True)) == {
+        **data,
+        "checked_at": None,
+    }
+
+
+@pytest.mark.parametrize("envelope", [b"", b"\x02abc", ZLIB + b"abc", RAW + b"\x01"])
+def test_decode_result_rejects_invalid_envelopes(envelope: bytes) -> None:
+    with pytest.raises(ValueError):
+        decode_result(envelope)
+
+
+def test_publish_response_history_compacts_results(mocker, settings) -> None:
+    """Test PASS results are sent without body and headers, in msgpack messages."""
+    settings.HISTORY_BODY_POLICY = "non_pass"
+    apply_async_mock = mocker.patch(
+        "uptime_monitor.core.consumer.save_response_history_batch.apply_async"
+    )
+
+    publish_response_history(result_data(1, SiteResponseStatus.PASS, "OK"))
+    publish_response_history(result_data(1, SiteResponseStatus.FAIL, "Not Found"))
+
+    sent = [call.kwargs for call in apply_async_mock.call_args_list]
+    assert all(kwargs["serializer"] == "msgpack" for kwargs in sent)
+    passed, failed = (decode_result(kwargs["kwargs"]["data"]) for kwargs in sent)
+    assert (passed["response_text"], passed["response_headers"]) == (None, None)
+    assert failed == result_data(1, SiteResponseStatus.FAIL, "Not Found")
+
+
+@pytest.mark.django_db
+def test_write_response_history_accepts_envelopes(user: User) -> None:
+    """Test envelopes and dicts are saved alike, corrupt envelopes dropped."""
+    site = SiteRegistry.objects.create(user=user, url="https://example.com")
+    data = result_data(site.id, SiteResponseStatus.FAIL, "Not Found")
+
+    histories = write_response_history([encode_result(data), data, b"\x02corrupt"])
+
+    assert len(histories) == 2
+    assert SiteResponseHistory.objects.filter(response_code="FAIL").count() == 2
+    assert histories[0].response_body_id == histories[1].response_body_id is not None
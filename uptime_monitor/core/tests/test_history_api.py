@@ -0,0 +1,203 @@
+import asyncio
+import csv
+import datetime
+import io
+import json
+
+import pytest
+from django.http import StreamingHttpResponse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from uptime_monitor.core.models import (
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseStatus,
+)
+from uptime_monitor.users.models import User
+from uptime_monitor.utils.asgi import StreamingASGIHandler
+
+NOW = datetime.datetime(2023, 6, 15, 12, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture
+def api_client(user: User) -> APIClient:
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def sites(user: User):
+    sites = [
+        SiteRegistry.objects.create(user=user, url=f"https://site{i}.example.com")
+        for i in range(2)
+    ]
+    histories = SiteResponseHistory.objects.bulk_create(
+        SiteResponseHistory(
+            check_registry=site,
+            response_code=SiteResponseStatus.PASS,
+            response_time=0.1,
+        )
+        for site in sites
+        for _ in range(5)
+    )
+    # Pairs of rows share created_at so pages have to break ties by id.
+    for i, history in enumerate(histories):
+        SiteResponseHistory.objects.filter(id=history.id).update(
+            created_at=NOW - datetime.timedelta(minutes=i // 2)
+        )
+    return sites
+
+
+@pytest.mark.django_db
+def test_history_keyset_pagination(api_client: APIClient, sites) -> None:
+    """Test the pages cover every row once, newest first."""
+    ids = []
+    url = "/api/sites-history/?page_size=3"
+    while url:
+        response = api_client.get(url)
+        assert response.status_code == 200
+        assert len(response.data["results"]) <= 3
+        ids += [row["id"] for row in response.data["results"]]
+        url = response.data["next"]
+
+    expected = SiteResponseHistory.objects.order_by("-created_at", "-id")
+    assert ids == list(expected.values_list("id", flat=True))
+
+
+@pytest.mark.django_db
+def test_history_filters(api_client: APIClient, sites) -> None:
+    """Test the history is filtered by site and created_at range."""
+    since = (NOW - datetime.timedelta(minutes=3)).isoformat()
+    until = NOW.isoformat()
+    response = api_client.get(
+        "/api/sites-history/",
+        {"site": sites[1].id, "since": since, "until": until},
+    )
+
+    assert response.status_code == 200
+    assert {row["site"] for row in response.data["results"]} == {sites[1].url}
+    assert len(response.data["results"]) == 3
+
+
+@pytest.mark.django_db
+def test_history_invalid_filters(api_client: APIClient) -> None:
+    """Test invalid filters and cursors are rejected."""
+    assert api_client.get("/api/sites-history/", {"since": "x"}).status_code == 400
+    assert api_client.get("/api/sites-history/", {"cursor": "x"}).status_code == 404
+
+
+@pytest.mark.django_db
+def test_history_export_ndjson(api_client: APIClient, sites, settings) -> None:
+    """Test the export streams the rows of the user oldest first, in chunks."""
+    settings.HISTORY_EXPORT_CHUNK_SIZE = 3
+    other_user = User.objects.create(username="other", email="other@example.com")
+    other_site = SiteRegistry.objects.create(
+        user=other_user, url="https://other.example.com"
+    )
+    SiteResponseHistory.objects.create(
+        check_registry=other_site,
+        response_code=SiteResponseStatus.PASS,
+        response_time=0.1,
+    )
+
+    response = api_client.get("/api/sites-history/export/")
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+    chunks = list(response.streaming_content)
+    assert len(chunks) == 4
+    rows = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    expected = SiteResponseHistory.objects.filter(check_registry__in=sites)
+    assert [row["id"] for row in rows] == list(
+        expected.order_by("created_at", "id").values_list("id", flat=True)
+    )
+    assert {row["site"] for row in rows} == {site.url for site in sites}
+
+
+@pytest.mark.django_db
+def test_history_export_csv(api_client: APIClient, sites) -> None:
+    """Test the export writes CSV with the list filters applied."""
+    response = api_client.get(
+        "/api/sites-history/export/", {"file_format": "csv", "site": sites[0].id}
+    )
+
+    assert response.status_code == 200
+    rows = list(
+        csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode()))
+    )
+    assert len(rows) == 5
+    assert {row["site"] for row in rows} == {sites[0].url}
+    assert (
+        api_client.get("/api/sites-history/export/", {"file_format": "xml"}).status_code
+        == 400
+    )
+
+
+async def asgi_get(path: str, query_string: bytes, headers) -> tuple:
+    """
+    Returns the status and body of a GET request through the ASGI handler.
+    """
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query_string,
+        "headers": headers,
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await StreamingASGIHandler()(scope, receive, send)
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return messages[0]["status"], body
+
+
+@pytest.mark.django_db(transaction=True)
+def test_history_export_through_asgi(user: User, sites, settings) -> None:
+    """Test the export streams under ASGI, where the database can't be read in the event loop."""
+    settings.HISTORY_EXPORT_CHUNK_SIZE = 3
+    token = Token.objects.create(user=user)
+
+    status, body = asyncio.run(
+        asgi_get(
+            "/api/sites-history/export/",
+            b"file_format=ndjson",
+            [
+                (b"host", b"testserver"),
+                (b"authorization", f"Token {token.key}".encode()),
+            ],
+        )
+    )
+
+    assert status == 200
+    assert len(body.splitlines()) == 10
+
+
+def test_streaming_response_closed_when_send_fails() -> None:
+    """Test the streaming response is closed when the client goes away mid-stream."""
+    closed = []
+
+    def parts():
+        try:
+            yield b"a"
+            yield b"b"
+        finally:
+            closed.append(True)
+
+    response = StreamingHttpResponse(parts())
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            raise OSError("Client disconnected")
+
+    with pytest.raises(OSError):
+        asyncio.run(StreamingASGIHandler().send_response(response, send))
+
+    assert closed == [True]
@@ -0,0 +1,90 @@
+import datetime
+
+import pytest
+from django.db import connection
+
+from uptime_monitor.core.models import (
+    RetentionPolicy,
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseStatus,
+)
+from uptime_monitor.core.partitions import (
+    DEFAULT_PARTITION,
+    align,
+    list_partitions,
+    maintain_partitions,
+)
+from uptime_monitor.users.models import User
+
+NOW = datetime.datetime(2023, 6, 15, 12, tzinfo=datetime.timezone.utc)
+
+
+def add_history(site: SiteRegistry, created_at: datetime.datetime) -> None:
+    history = SiteResponseHistory.objects.create(
+        check_registry=site, response_code=SiteResponseStatus.PASS, response_time=0.1
+    )
+    SiteResponseHistory.objects.filter(id=history.id).update(created_at=created_at)
+
+
+def default_partition_count() -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {DEFAULT_PARTITION}")
+        return cursor.fetchone()[0]
+
+
+def test_align_partition_spans() -> None:
+    """Test daily spans start at midnight and weekly spans on Monday."""
+    assert align(NOW, 1) == datetime.datetime(2023, 6, 15, tzinfo=datetime.timezone.utc)
+    assert align(NOW, 7) == datetime.datetime(2023, 6, 12, tzinfo=datetime.timezone.utc)
+
+
+@pytest.mark.django_db
+def test_maintain_partitions(user: User, settings) -> None:
+    """Test partitions are created ahead, rows leave the default partition and expire."""
+    settings.HISTORY_PARTITION_DAYS = 1
+    settings.HISTORY_PARTITIONS_AHEAD_DAYS = 3
+    settings.HISTORY_RETENTION_DAYS = 10
+    settings.HISTORY_ARCHIVE_EXPIRED_PARTITIONS = False
+    site = SiteRegistry.objects.create(user=user, url="https://www.example.com")
+    for days in (0, 2, 5, 30):
+        add_history(site, NOW - datetime.timedelta(days=days))
+
+    maintain_partitions(NOW)
+
+    partitions = list_partitions()
+    assert partitions[0].start == datetime.datetime(
+        2023, 6, 5, tzinfo=datetime.timezone.utc
+    )
+    assert partitions[-1].end == datetime.datetime(
+        2023, 6, 19, tzinfo=datetime.timezone.utc
+    )
+    assert default_partition_count() == 0
+    assert SiteResponseHistory.objects.count() == 3
+
+    maintain_partitions(NOW + datetime.timedelta(days=7))
+
+    assert list_partitions()[0].start == datetime.datetime(
+        2023, 6, 12, tzinfo=datetime.timezone.utc
+    )
+    assert SiteResponseHistory.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_maintain_partitions_applies_retention_policies(user: User, settings) -> None:
+    """Test users with a shorter retention lose their history before the partitions expire."""
+    settings.HISTORY_RETENTION_DAYS = 3
+    other_user = User.objects.create(username="other", email="other@example.com")
+    RetentionPolicy.objects.create(user=other_user, history_days=30)
+    site = SiteRegistry.objects.create(user=user, url="https://www.example.com")
+    other_site = SiteRegistry.objects.create(
+        user=other_user, url="https://other.example.com"
+    )
+    for days in (1, 5):
+        add_history(site, NOW - datetime.timedelta(days=days))
+        add_history(other_site, NOW - datetime.timedelta(days=days))
+
+    maintain_partitions(NOW)
+
+    assert SiteResponseHistory.objects.filter(check_registry=site).count() == 1
+    assert SiteResponseHistory.objects.filter(check_registry=other_site).count() == 2
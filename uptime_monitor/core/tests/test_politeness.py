@@ -0,0 +1,80 @@
+import asyncio
+import time
+from collections import Counter
+
+import fakeredis
+import httpx
+
+from uptime_monitor.core.engine import run_checks
+from uptime_monitor.core.politeness import HOST_WAIT_KEY, HostLimiters, limits_for
+from uptime_monitor.core.tests.test_engine import make_site_registry
+
+
+def run(site_registries, handler, limiters: HostLimiters):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await run_checks(
+                site_registries, concurrency=100, client=client, limiters=limiters
+            )
+
+    return asyncio.run(main())
+
+
+def test_host_limiters_bound_in_flight_probes_per_host(settings) -> None:
+    """Test probes of an origin never exceed its concurrency, other origins are not held back."""
+    settings.CHECK_HOST_CONCURRENCY = 2
+    settings.CHECK_HOST_RATE = 0
+    in_flight: Counter = Counter()
+    peak: Counter = Counter()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        in_flight[request.url.host] += 1
+        peak[request.url.host] = max(
+            peak[request.url.host], in_flight[request.url.host]
+        )
+        await asyncio.sleep(0.01)
+        in_flight[request.url.host] -= 1
+        return httpx.Response(200, text="OK")
+
+    site_registries = [
+        make_site_registry(
+            i, f"https://{'shared' if i < 10 else f'site{i}'}.example.com"
+        )
+        for i in range(20)
+    ]
+    limiters = HostLimiters()
+
+    results = run(site_registries, handler, limiters)
+
+    assert [r.response_code for r in results] == ["PASS"] * 20
+    assert peak["shared.example.com"] == 2
+    assert all(peak[f"site{i}.example.com"] == 1 for i in range(10, 20))
+    assert limiters.stats["default"].probes == 20
+    assert limiters.stats["default"].delayed >= 8
+
+
+def test_host_limiters_rate_limit_by_hosted_at_group(settings, mocker) -> None:
+    """Test the token bucket of a group spaces out the probes of an origin."""
+    settings.CHECK_HOST_LIMITS = {"slow": {"rate": 50, "burst": 1}}
+    connection = fakeredis.FakeRedis()
+    mocker.patch(
+        "uptime_monitor.core.politeness.get_redis_connection", return_value=connection
+    )
+    site_registries = [
+        make_site_registry(i, "https://www.example.com") for i in range(5)
+    ]
+    for site_registry in site_registries:
+        site_registry.hosted_at = "slow"
+    limiters = HostLimiters()
+
+    started = time.monotonic()
+    run(site_registries, lambda request: httpx.Response(200, text="OK"), limiters)
+
+    assert time.monotonic() - started >= 4 / 50
+    assert limits_for("slow").rate == 50
+    assert limits_for("other").rate == settings.CHECK_HOST_RATE
+    limiters.publish_stats()
+    stats = connection.hgetall(HOST_WAIT_KEY)
+    assert int(stats[b"slow:probes"]) == 5
+    assert int(stats[b"slow:delayed"]) >= 4
+    assert float(stats[b"slow:wait_seconds"]) > 0
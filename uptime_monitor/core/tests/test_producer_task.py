@@ -3,8 +3,19 @@ from unittest.mock import MagicMock
 import httpx
 import pytest
 
-from uptime_monitor.core.models import SiteRegistry, SiteResponseStatus
-from uptime_monitor.core.producer import check_site, evaluate_response
+from uptime_monitor.core import clients
+from uptime_monitor.core.envelopes import decode_result
+from uptime_monitor.core.evaluation import StreamingEvaluator
+from uptime_monitor.core.models import ConnectionMode, SiteRegistry, SiteResponseStatus
+from uptime_monitor.core.producer import check_site
+from uptime_monitor.core.registry_cache import registry_cache
+
+
+@pytest.fixture(autouse=True)
+def pooled_clients():
+    """Forget the pooled clients created with mocked httpx clients."""
+    yield
+    clients.discard()
 
 
 @pytest.fixture
@@ -17,48 +28,11 @@ def site_registry_mock() -> SiteRegistry:
     site_registry.timeout = 5
     site_registry.text = "This is the Example Domain"
     site_registry.status_code = 200
+    site_registry.connection_mode = ConnectionMode.WARM
+    site_registry.bypass_dns_cache = False
     return site_registry
 
 
-def test_evaluate_response_with_match_text_and_status_code(site_registry_mock) -> None:
-    """Test evaluate_response function when response matches text and status code."""
-    response = MagicMock(spec=httpx.Response)
-    response.text = "This is the Example Domain"
-    response.status_code = 200
-
-    expected = (SiteResponseStatus.PASS, response.text)
-
-    result = evaluate_response(response, site_registry_mock)
-
-    assert result == expected
-
-
-def test_evaluate_response_with_mismatched_text(site_registry_mock) -> None:
-    """Test evaluate_response function when response has mismatched text."""
-    response = MagicMock(spec=httpx.Response)
-    response.text = "Random text."
-    response.status_code = 200
-
-    expected = (SiteResponseStatus.MISMATCH, response.text)
-
-    result = evaluate_response(response, site_registry_mock)
-
-    assert result == expected
-
-
-def test_evaluate_response_with_mismatched_status_code(site_registry_mock) -> None:
-    """Test evaluate_response function when response has mismatched status code."""
-    response = MagicMock(spec=httpx.Response)
-    response.text = "This is the Example Domain"
-    response.status_code = 404
-
-    expected = (SiteResponseStatus.FAIL, response.text)
-
-    result = evaluate_response(response, site_registry_mock)
-
-    assert result == expected
-
-
 @pytest.mark.parametrize(
     "status_code,text",
     [
@@ -75,19 +49,88 @@ def test_check_site(
     text: str,
 ) -> None:
     """Test check_site function with different response parameters."""
-    mocker.patch.object(SiteRegistry.objects, "get", return_value=site_registry_mock)
+    mocker.patch.object(registry_cache, "get", return_value=site_registry_mock)
     httpx_client_mock = mocker.patch("httpx.Client")
     save_response_history_async_mock = mocker.patch(
-        "uptime_monitor.core.consumer.save_response_history.apply_async"
+        "uptime_monitor.core.consumer.save_response_history_batch.apply_async"
     )
 
-    httpx_response_mock = MagicMock(spec=httpx.Response)
-    httpx_response_mock.status_code = status_code
-    httpx_response_mock.text = text
-    httpx_response_mock.headers = {"Content-Type": "text/html"}
-
-    httpx_client_mock().__getitem__().get.return_value = httpx_response_mock
+    httpx_response = httpx.Response(
+        status_code, text=text, headers={"Content-Type": "text/html"}
+    )
+    httpx_client_mock().stream().__enter__.return_value = httpx_response
 
     check_site(site_registry_mock.id)
 
     save_response_history_async_mock.assert_called_once()
+    data = save_response_history_async_mock.call_args.kwargs["kwargs"]["data"]
+    assert decode_result(data)["response_text"] == text
+
+
+@pytest.mark.parametrize("connection_mode", ConnectionMode.values)
+def test_check_site_connection_mode(
+    site_registry_mock: SiteRegistry,
+    mocker: MagicMock,
+    connection_mode: str,
+) -> None:
+    """Test check_site reuses the pooled client for warm checks only."""
+    site_registry_mock.connection_mode = connection_mode
+    mocker.patch.object(registry_cache, "get", return_value=site_registry_mock)
+    httpx_client_mock = mocker.patch("httpx.Client")
+    httpx_client_mock.return_value.is_closed = False
+    mocker.patch("uptime_monitor.core.consumer.save_response_history_batch.apply_async")
+
+    httpx_response = httpx.Response(200, text="This is the Example Domain")
+    httpx_client_mock().stream().__enter__.return_value = httpx_response
+    httpx_client_mock.reset_mock()
+
+    check_site(site_registry_mock.id)
+    check_site(site_registry_mock.id)
+
+    if connection_mode == ConnectionMode.WARM:
+        assert httpx_client_mock.call_count == 1
+        httpx_client_mock.return_value.close.assert_not_called()
+    else:
+        assert httpx_client_mock.call_count == 2
+        assert httpx_client_mock.return_value.close.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "text,chunk_size,expected",
+    [
+        ("example domain", 3, SiteResponseStatus.PASS),
+        ("EXAMPLE", 1, SiteResponseStatus.PASS),
+        ("missing", 4, SiteResponseStatus.MISMATCH),
+        (None, 5, SiteResponseStatus.PASS),
+    ],
+)
+def test_streaming_evaluator_matches_across_chunks(
+    site_registry_mock: SiteRegistry, text: str, chunk_size: int, expected: str
+) -> None:
+    """Test the text is found case-insensitively when split over chunks."""
+    site_registry_mock.text = text
+    body = ("This is the Example Domain. " * 20).encode()
+    evaluator = StreamingEvaluator(
+        site_registry_mock, max_bytes=1000, snippet_length=10
+    )
+
+    for start in range(0, len(body), chunk_size):
+        end = start + chunk_size
+        if evaluator.feed(body[start:end]):
+            break
+
+    assert evaluator.result(200) == (expected, "This is th")
+
+
+def test_streaming_evaluator_stops_early(site_registry_mock: SiteRegistry) -> None:
+    """Test the body is not read past the text or past the byte cap."""
+    site_registry_mock.text = "needle"
+    found = StreamingEvaluator(site_registry_mock, max_bytes=10_000, snippet_length=4)
+    capped = StreamingEvaluator(site_registry_mock, max_bytes=100, snippet_length=4)
+
+    assert found.feed(b"a nee") is False
+    assert found.feed(b"dle in a haystack") is True
+    assert capped.feed(b"x" * 60) is False
+    assert capped.feed(b"x" * 60) is True
+    assert capped.bytes_read == 100
+    assert capped.result(200)[0] == SiteResponseStatus.MISMATCH
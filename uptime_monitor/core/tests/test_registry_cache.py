@@ -0,0 +1,112 @@
+from typing import cast
+from unittest.mock import MagicMock
+
+import pytest
+
+from uptime_monitor.core.models import SiteRegistry
+from uptime_monitor.core.registry_cache import RegistryCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_registry(check_registry_id: int) -> SiteRegistry:
+    site_registry = MagicMock(spec=SiteRegistry)
+    site_registry.id = check_registry_id
+    return site_registry
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+@pytest.fixture
+def cache(mocker, clock: Clock) -> RegistryCache:
+    cache = RegistryCache(max_size=3, ttl=60, clock=clock)
+    mocker.patch.object(cache, "ensure_listener")
+    mocker.patch.object(
+        cache, "load", side_effect=lambda ids: [make_registry(pk) for pk in ids]
+    )
+    return cache
+
+
+@pytest.fixture
+def load(cache: RegistryCache) -> MagicMock:
+    """The mocked load of the cache."""
+    return cast(MagicMock, cache.load)
+
+
+def test_registry_cache_loads_misses_once(
+    cache: RegistryCache, load: MagicMock
+) -> None:
+    """Test cached registries are served without loading them again."""
+    first = cache.get_many([1, 2])
+    second = cache.get_many([1, 2, 3])
+
+    assert second[1] is first[1]
+    assert [call.args[0] for call in load.call_args_list] == [[1, 2], [3]]
+
+
+def test_registry_cache_expires_entries(cache: RegistryCache, clock: Clock) -> None:
+    """Test registries are loaded again after the TTL."""
+    first = cache.get(1)
+    clock.now = 59
+    assert cache.get(1) is first
+    clock.now = 60
+    assert cache.get(1) is not first
+
+
+def test_registry_cache_evicts_least_recently_used(
+    cache: RegistryCache, load: MagicMock
+) -> None:
+    """Test the least recently used registry is evicted beyond max_size."""
+    cache.get_many([1, 2, 3])
+    cache.get(1)
+    cache.get(4)
+
+    assert len(cache) == 3
+    load.reset_mock()
+    cache.get_many([1, 3, 4])
+    load.assert_not_called()
+    cache.get(2)
+    load.assert_called_once_with([2])
+
+
+def test_registry_cache_invalidate(cache: RegistryCache) -> None:
+    """Test invalidated registries are loaded again."""
+    first = cache.get_many([1, 2])
+    cache.invalidate(1)
+    second = cache.get_many([1, 2])
+
+    assert second[1] is not first[1]
+    assert second[2] is first[2]
+
+
+def test_registry_cache_skips_registries_invalidated_while_loading(
+    cache: RegistryCache, load: MagicMock
+) -> None:
+    """Test a registry loaded during an invalidation is returned but not cached."""
+
+    def invalidating_load(ids):
+        cache.invalidate(*ids)
+        return [make_registry(pk) for pk in ids]
+
+    load.side_effect = invalidating_load
+    cache.get(1)
+
+    assert len(cache) == 0
+
+
+def test_registry_cache_missing_registry(cache: RegistryCache, load: MagicMock) -> None:
+    """Test a registry that does not exist raises DoesNotExist."""
+    load.side_effect = lambda ids: []
+
+    assert cache.get_many([1]) == {}
+    with pytest.raises(SiteRegistry.DoesNotExist):
+        cache.get(1)
@@ -0,0 +1,150 @@
+import fakeredis
+import pytest
+from django.db import DatabaseError
+
+from uptime_monitor.core.consumer import (
+    publish_response_histories,
+    write_response_history,
+)
+from uptime_monitor.core.models import (
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseStatus,
+)
+from uptime_monitor.core.result_stream import (
+    DEAD_LETTER_KEY,
+    ENVELOPE_FIELD,
+    RESULTS_STREAM_KEY,
+    WRITERS_GROUP,
+    ResultStreamWriter,
+)
+from uptime_monitor.users.models import User
+
+
+@pytest.fixture
+def redis_connection(mocker, settings) -> fakeredis.FakeRedis:
+    settings.HISTORY_TRANSPORT = "stream"
+    connection = fakeredis.FakeRedis()
+    for module in ("result_stream", "current_status"):
+        mocker.patch(
+            f"uptime_monitor.core.{module}.get_redis_connection",
+            return_value=connection,
+        )
+    return connection
+
+
+def result_data(check_registry_id: int) -> dict:
+    return {
+        "check_registry": check_registry_id,
+        "response_code": SiteResponseStatus.FAIL,
+        "response_text": "Not Found",
+        "response_time": 0.1,
+        "response_headers": [["Server", "nginx"]],
+        "timings": None,
+    }
+
+
+@pytest.mark.django_db
+def test_result_stream_writer_saves_batches(
+    redis_connection, mocker, user: User
+) -> None:
+    """Test results published to the stream are written in batches, then acknowledged and deleted."""
+    site = SiteRegistry.objects.create(user=user, url="https://example.com")
+    apply_async_mock = mocker.patch(
+        "uptime_monitor.core.consumer.save_response_history_batch.apply_async"
+    )
+
+    publish_response_histories(result_data(site.id) for _ in range(5))
+
+    apply_async_mock.assert_not_called()
+    assert redis_connection.xlen(RESULTS_STREAM_KEY) == 5
+
+    writer = ResultStreamWriter(write_response_history, name="writer", batch_size=3)
+    writer.ensure_group()
+    writer.ensure_group()
+
+    assert writer.process(writer.read()) == 3
+    assert writer.process(writer.read()) == 2
+    assert writer.read() == []
+    assert SiteResponseHistory.objects.filter(check_registry=site).count() == 5
+    assert redis_connection.xlen(RESULTS_STREAM_KEY) == 0
+    assert redis_connection.xpending(RESULTS_STREAM_KEY, WRITERS_GROUP)["pending"] == 0
+
+
+def test_result_stream_writer_recovers_pending_entries(
+    redis_connection, mocker, settings
+) -> None:
+    """Test entries of failed writes and crashed writers are claimed and written again."""
+    settings.HISTORY_STREAM_CLAIM_IDLE = 0
+    publish_response_histories(result_data(i) for i in range(5))
+    failing = ResultStreamWriter(
+        mocker.Mock(side_effect=DatabaseError), name="failing", batch_size=2
+    )
+    failing.ensure_group()
+    assert failing.process(failing.read()) == 0
+    crashed = ResultStreamWriter(mocker.Mock(), name="crashed", batch_size=2)
+    crashed.read()
+
+    write = mocker.Mock()
+    writer = ResultStreamWriter(write, name="writer", batch_size=3)
+
+    assert writer.recover() == 4
+    assert sum(len(call.args[0]) for call in write.call_args_list) == 4
+    assert writer.process(writer.read()) == 1
+    assert redis_connection.xpending(RESULTS_STREAM_KEY, WRITERS_GROUP)["pending"] == 0
+    assert redis_connection.xlen(RESULTS_STREAM_KEY) == 0
+
+
+def test_result_stream_keeps_the_backlog(redis_connection, settings, caplog) -> None:
+    """Test unwritten results are never trimmed, a large backlog is logged instead."""
+    settings.HISTORY_STREAM_BACKLOG_WARNING = 3
+    for _ in range(3):
+        publish_response_histories(result_data(i) for i in range(2))
+    writer = ResultStreamWriter(lambda items: None, name="writer")
+
+    assert writer.check_backlog() == 6
+    assert "6 unwritten results" in caplog.text
+
+
+def test_result_stream_dead_letters_failing_entries(
+    redis_connection, mocker, settings
+) -> None:
+    """Test entries that keep failing are moved to the dead letter stream, and any error of
+    the write leaves the entries pending."""
+    settings.HISTORY_STREAM_CLAIM_IDLE = 0
+    settings.HISTORY_STREAM_MAX_DELIVERIES = 2
+    publish_response_histories([result_data(1)])
+    write = mocker.Mock(side_effect=ValueError("Invalid result envelope"))
+    writer = ResultStreamWriter(write, name="writer")
+    writer.ensure_group()
+    (entry_id, fields), *_ = writer.read()
+
+    assert writer.process([(entry_id, fields)]) == 0
+    assert writer.recover() == 0
+    assert write.call_count == 2
+    assert redis_connection.xlen(DEAD_LETTER_KEY) == 0
+
+    assert writer.recover() == 0
+    assert write.call_count == 2
+    assert redis_connection.xlen(RESULTS_STREAM_KEY) == 0
+    assert redis_connection.xpending(RESULTS_STREAM_KEY, WRITERS_GROUP)["pending"] == 0
+    ((_, dead),) = redis_connection.xrange(DEAD_LETTER_KEY)
+    assert dead == {ENVELOPE_FIELD: fields[ENVELOPE_FIELD], b"id": entry_id}
+
+
+def test_result_stream_dead_letters_scattered_entries(
+    redis_connection, settings
+) -> None:
+    """Test delivery counts are read for every claimed entry, even when other pending
+    entries of the writer sit between them."""
+    settings.HISTORY_STREAM_MAX_DELIVERIES = 0
+    publish_response_histories(result_data(i) for i in range(3))
+    writer = ResultStreamWriter(lambda items: None, name="writer")
+    writer.ensure_group()
+    first, second, third = writer.read()
+
+    assert writer.dead_letter([first, third]) == []
+    assert [
+        fields[b"id"] for _, fields in redis_connection.xrange(DEAD_LETTER_KEY)
+    ] == [first[0], third[0]]
+    assert redis_connection.xpending(RESULTS_STREAM_KEY, WRITERS_GROUP)["pending"] == 1
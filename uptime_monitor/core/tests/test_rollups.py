@@ -0,0 +1,140 @@
+import datetime
+
+import pytest
+from rest_framework.test import APIClient
+
+from uptime_monitor.core.consumer import write_response_history
+from uptime_monitor.core.models import (
+    RollupGranularity,
+    SiteRegistry,
+    SiteResponseRollup,
+    SiteResponseStatus,
+)
+from uptime_monitor.core.rollups import bucket_start, delete_expired_rollups
+from uptime_monitor.core.sketches import DDSketch
+from uptime_monitor.users.models import User
+
+NOW = datetime.datetime(2023, 6, 15, 12, 30, 45, tzinfo=datetime.timezone.utc)
+
+
+def result_data(site: SiteRegistry, response_code: str, response_time: float):
+    return {
+        "check_registry": site.id,
+        "response_code": response_code,
+        "response_text": None,
+        "response_time": response_time,
+        "response_headers": None,
+    }
+
+
+def test_bucket_start() -> None:
+    """Test buckets start on the minute, hour and day in UTC."""
+    assert bucket_start(NOW, RollupGranularity.MINUTE) == NOW.replace(
+        second=0, microsecond=0
+    )
+    assert bucket_start(NOW, RollupGranularity.HOUR) == NOW.replace(minute=0, second=0)
+    assert bucket_start(NOW, RollupGranularity.DAY) == NOW.replace(
+        hour=0, minute=0, second=0
+    )
+
+
+@pytest.mark.django_db
+def test_write_response_history_updates_rollups(user: User, mocker) -> None:
+    """Test every batch is merged into the minute, hour and day rollups."""
+    mocker.patch("django.utils.timezone.now", return_value=NOW)
+    site = SiteRegistry.objects.create(user=user, url="https://www.example.com")
+
+    write_response_history(
+        [
+            result_data(site, SiteResponseStatus.PASS, 0.2),
+            result_data(site, SiteResponseStatus.FAIL, 0.4),
+        ]
+    )
+    write_response_history(
+        [
+            result_data(site, SiteResponseStatus.PASS, 0.1),
+            result_data(site, SiteResponseStatus.TIMEOUT, 30.0),
+        ]
+    )
+
+    rollups = SiteResponseRollup.objects.filter(check_registry=site)
+    assert rollups.count() == 3
+    for rollup in rollups:
+        assert rollup.bucket == bucket_start(NOW, rollup.granularity)
+        assert (rollup.pass_count, rollup.fail_count, rollup.timeout_count) == (2, 1, 1)
+        assert rollup.response_time_min == 0.1
+        assert rollup.response_time_max == 0.4
+        assert rollup.response_time_sum == pytest.approx(0.7)
+        assert len(DDSketch.from_bytes(rollup.response_time_sketch)) == 3
+
+
+@pytest.mark.django_db
+def test_site_stats_api(user: User, mocker) -> None:
+    """Test the stats endpoint summarizes the rollups of the site."""
+    site = SiteRegistry.objects.create(user=user, url="https://www.example.com")
+    for minutes, response_time in ((0, 0.1), (1, 0.3), (2, 0.2)):
+        mocker.patch(
+            "django.utils.timezone.now",
+            return_value=NOW + datetime.timedelta(minutes=minutes),
+        )
+        write_response_history(
+            [
+                result_data(site, SiteResponseStatus.PASS, response_time),
+                result_data(site, SiteResponseStatus.ERROR, 0.0),
+            ]
+        )
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.get(
+        f"/api/sites-registry/{site.id}/stats/",
+        {
+            "granularity": RollupGranularity.MINUTE,
+            "since": NOW.isoformat(),
+            # Buckets overlapping the range are included, the third starts at until.
+            "until": (
+                bucket_start(NOW, RollupGranularity.MINUTE)
+                + datetime.timedelta(minutes=2)
+            ).isoformat(),
+        },
+    )
+
+    assert response.status_code == 200
+    assert len(response.data["buckets"]) == 2
+    summary = response.data["summary"]
+    assert (summary["total"], summary["pass_count"], summary["error_count"]) == (
+        4,
+        2,
+        2,
+    )
+    assert summary["uptime"] == 0.5
+    assert summary["response_time_min"] == 0.1
+    assert summary["response_time_max"] == 0.3
+    assert summary["response_time_avg"] == pytest.approx(0.2)
+    assert summary["response_time_p50"] == pytest.approx(0.1, rel=0.01)
+    assert summary["response_time_p99"] == pytest.approx(0.3, rel=0.01)
+
+    other_user = User.objects.create(username="other", email="other@example.com")
+    client.force_authenticate(other_user)
+    assert client.get(f"/api/sites-registry/{site.id}/stats/").status_code == 404
+
+
+@pytest.mark.django_db
+def test_delete_expired_rollups(user: User, settings) -> None:
+    """Test minute and hour rollups expire and day rollups are kept."""
+    settings.ROLLUP_MINUTE_RETENTION_DAYS = 1
+    settings.ROLLUP_HOUR_RETENTION_DAYS = 10
+    site = SiteRegistry.objects.create(user=user, url="https://www.example.com")
+    bucket = NOW - datetime.timedelta(days=5)
+    for granularity in RollupGranularity.values:
+        SiteResponseRollup.objects.create(
+            check_registry=site,
+            granularity=granularity,
+            bucket=bucket_start(bucket, granularity),
+        )
+
+    assert delete_expired_rollups(NOW) == 1
+    assert set(SiteResponseRollup.objects.values_list("granularity", flat=True)) == {
+        RollupGranularity.HOUR,
+        RollupGranularity.DAY,
+    }
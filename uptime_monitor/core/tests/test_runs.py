@@ -0,0 +1,146 @@
+import datetime
+import json
+
+import pytest
+from rest_framework.test import APIClient
+
+from uptime_monitor.core.consumer import write_response_history
+from uptime_monitor.core.models import (
+    SiteRegistry,
+    SiteResponseHistory,
+    SiteResponseRollup,
+    SiteResponseStatus,
+)
+from uptime_monitor.users.models import User
+
+NOW = datetime.datetime(2023, 6, 15, 12, tzinfo=datetime.timezone.utc)
+
+
+def result_data(site: SiteRegistry, response_code: str, response_time: float):
+    return {
+        "check_registry": site.id,
+        "response_code": response_code,
+        "response_text": None,
+        "response_time": response_time,
+        "response_headers": None,
+    }
+
+
+@pytest.fixture
+def site(user: User) -> SiteRegistry:
+    return SiteRegistry.objects.create(
+        user=user, url="https://www.example.com", record_changes_only=True
+    )
+
+
+def write_checks(mocker, site: SiteRegistry, checks) -> None:
+    """Write one batch per check, 30 seconds apart."""
+    for i, (response_code, response_time) in enumerate(checks):
+        mocker.patch(
+            "django.utils.timezone.now",
+            return_value=NOW + datetime.timedelta(seconds=30 * i),
+        )
+        write_response_history([result_data(site, response_code, response_time)])
+
+
+@pytest.mark.django_db
+def test_identical_checks_are_collapsed_into_runs(
+    site: SiteRegistry, mocker, settings
+) -> None:
+    """Test a new row is written only when the status changes or latency leaves the band."""
+    settings.HISTORY_RUN_LATENCY_BAND = 0.5
+    settings.HISTORY_RUN_LATENCY_MIN_BAND = 0.1
+    write_checks(
+        mocker,
+        site,
+        [
+            (SiteResponseStatus.PASS, 0.2),
+            (SiteResponseStatus.PASS, 0.25),
+            (SiteResponseStatus.PASS, 0.15),
+            (SiteResponseStatus.FAIL, 0.2),
+            (SiteResponseStatus.PASS, 0.2),
+            (SiteResponseStatus.PASS, 2.0),
+        ],
+    )
+
+    runs = list(SiteResponseHistory.objects.order_by("created_at", "id"))
+    assert [(run.response_code, run.run_count) for run in runs] == [
+        (SiteResponseStatus.PASS, 3),
+        (SiteResponseStatus.FAIL, 1),
+        (SiteResponseStatus.PASS, 1),
+        (SiteResponseStatus.PASS, 1),
+    ]
+    first = runs[0]
+    assert first.last_seen_at == NOW + datetime.timedelta(seconds=60)
+    assert first.response_time == pytest.approx(0.2)
+    assert (first.response_time_min, first.response_time_max) == (0.15, 0.25)
+    minute = SiteResponseRollup.objects.get(granularity="MINUTE", bucket=NOW)
+    assert minute.pass_count == 2
+
+
+@pytest.mark.django_db
+def test_runs_opened_in_a_batch_keep_check_latencies(
+    site: SiteRegistry, mocker, settings
+) -> None:
+    """Test rollups get the response time of every check of a run opened in the batch."""
+    settings.HISTORY_RUN_LATENCY_BAND = 0.5
+    mocker.patch("django.utils.timezone.now", return_value=NOW)
+
+    write_response_history(
+        [
+            result_data(site, SiteResponseStatus.PASS, 0.2),
+            result_data(site, SiteResponseStatus.PASS, 0.25),
+        ]
+    )
+
+    run = SiteResponseHistory.objects.get()
+    assert (run.run_count, run.response_time) == (2, pytest.approx(0.225))
+    minute = SiteResponseRollup.objects.get(granularity="MINUTE", bucket=NOW)
+    assert (minute.response_time_min, minute.response_time_max) == (0.2, 0.25)
+    assert minute.response_time_sum == pytest.approx(0.45)
+
+
+@pytest.mark.django_db
+def test_runs_end_after_max_seconds(site: SiteRegistry, mocker, settings) -> None:
+    """Test runs are split once they are HISTORY_RUN_MAX_SECONDS old."""
+    settings.HISTORY_RUN_MAX_SECONDS = 60
+    write_checks(mocker, site, [(SiteResponseStatus.PASS, 0.2)] * 5)
+
+    assert list(
+        SiteResponseHistory.objects.order_by("created_at").values_list(
+            "run_count", flat=True
+        )
+    ) == [2, 2, 1]
+
+
+@pytest.mark.django_db
+def test_history_api_returns_runs(user: User, site: SiteRegistry, mocker) -> None:
+    """Test the history API and the export return runs as they are, and the time range
+    filters the runs overlapping it."""
+    write_checks(mocker, site, [(SiteResponseStatus.PASS, 0.2)] * 5)
+    client = APIClient()
+    client.force_authenticate(user)
+    first_seen = NOW.isoformat().replace("+00:00", "Z")
+    last_seen = (NOW + datetime.timedelta(seconds=120)).isoformat()
+
+    response = client.get(
+        "/api/sites-history/",
+        {"since": (NOW + datetime.timedelta(seconds=60)).isoformat()},
+    )
+    assert response.status_code == 200
+    [entry] = response.data["results"]
+    assert entry["created_at"] == first_seen
+    assert entry["last_seen_at"] == last_seen.replace("+00:00", "Z")
+    assert entry["run_count"] == 5
+    assert (entry["response_time_min"], entry["response_time_max"]) == (0.2, 0.2)
+
+    response = client.get(
+        "/api/sites-history/",
+        {"since": (NOW + datetime.timedelta(seconds=121)).isoformat()},
+    )
+    assert response.data["results"] == []
+
+    response = client.get("/api/sites-history/export/")
+    [line] = b"".join(response.streaming_content).decode().splitlines()
+    assert json.loads(line)["run_count"] == 5
+    assert json.loads(line)["last_seen_at"] == last_seen
@@ -0,0 +1,208 @@
+import datetime
+import json
+import random
+
+import fakeredis
+import pytest
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
+
+from uptime_monitor.core.current_status import FAILING_SITES_KEY, status_key
+from uptime_monitor.core.models import ScheduleItem, SiteRegistry, SiteResponseStatus
+from uptime_monitor.core.scheduler import WheelScheduler, phase_offset
+from uptime_monitor.core.timing_wheel import TimingWheel
+
+
+def test_timing_wheel_expires_timers_on_their_tick() -> None:
+    """Test timers across all levels and the overflow expire exactly when due."""
+    wheel: TimingWheel[int] = TimingWheel(current_tick=1000, wheel_size=8, levels=3)
+    due = {key: 1000 + random.randint(1, 3000) for key in range(2000)}
+    for key, tick in due.items():
+        wheel.add(key, tick)
+    for key in range(0, 2000, 3):
+        wheel.remove(key)
+        del due[key]
+
+    expired = {}
+    for tick in range(1001, 4001):
+        for key in wheel.advance(tick):
+            expired[key] = tick
+
+    assert expired == due
+    assert len(wheel) == 0
+
+
+def test_timing_wheel_reschedule_replaces_timer() -> None:
+    """Test adding a key again moves its timer instead of adding a second one."""
+    wheel: TimingWheel[str] = TimingWheel(current_tick=0)
+    wheel.add("site", 10)
+    wheel.add("site", 100)
+
+    assert wheel.advance(50) == []
+    assert wheel.advance(100) == ["site"]
+
+
+@pytest.fixture
+def scheduler(mocker) -> WheelScheduler:
+    scheduler = WheelScheduler(batch_size=2, jitter=0, clock=lambda: 0)
+    mocker.patch.object(scheduler, "dispatch")
+    return scheduler
+
+
+def test_wheel_scheduler_dispatches_due_sites_in_batches(scheduler) -> None:
+    """Test due sites are deduplicated, batched and rescheduled on their phase."""
+    for schedule_item_id in range(1, 5):
+        scheduler.schedule(schedule_item_id, check_registry_id=10, interval=30)
+    scheduler.schedule(5, check_registry_id=11, interval=30)
+    scheduler.schedule(6, check_registry_id=12, interval=30)
+    phases = {i: phase_offset(i, 30) for i in range(1, 7)}
+
+    dispatched = [scheduler.tick(tick) for tick in range(1, 31)]
+
+    for schedule_item_id, phase in phases.items():
+        assert scheduler.entries[schedule_item_id].due_tick == (phase or 30) + 30
+    assert sorted(sum(dispatched, [])) == [10] * len(
+        set(phases[i] for i in range(1, 5))
+    ) + [11, 12]
+    assert all(len(call.args[0]) <= 2 for call in scheduler.dispatch.call_args_list)
+
+
+def test_wheel_scheduler_spreads_checks_over_the_interval(scheduler) -> None:
+    """Test items sharing an interval are spread evenly over its seconds."""
+    for schedule_item_id in range(1, 3001):
+        scheduler.schedule(
+            schedule_item_id, check_registry_id=schedule_item_id, interval=30
+        )
+
+    counts = [len(scheduler.tick(tick)) for tick in range(1, 61)]
+
+    assert sum(counts) == 6000
+    assert max(counts) < 1.5 * 100
+    summary = scheduler.stats.summary()
+    assert summary["total"] == 6000
+    assert summary["max"] == max(counts)
+
+
+def test_wheel_scheduler_jitter_stays_within_interval(mocker) -> None:
+    """Test jitter delays checks without moving them past the next interval."""
+    scheduler = WheelScheduler(batch_size=10, jitter=5, clock=lambda: 0)
+    mocker.patch.object(scheduler, "dispatch")
+    scheduler.schedule(1, check_registry_id=10, interval=30)
+    phase = phase_offset(1, 30) or 30
+
+    dispatched_at = [tick for tick in range(1, 91) if scheduler.tick(tick)]
+
+    assert len(dispatched_at) == 3
+    for n, tick in enumerate(dispatched_at):
+        assert phase + 30 * n <= tick <= phase + 30 * n + 5
+
+
+def test_wheel_scheduler_unschedule(scheduler) -> None:
+    """Test removed schedule items are not dispatched anymore."""
+    scheduler.schedule(1, check_registry_id=10, interval=30)
+    scheduler.unschedule(1)
+
+    assert sum((scheduler.tick(tick) for tick in range(1, 61)), []) == []
+    scheduler.dispatch.assert_not_called()
+
+
+@pytest.fixture
+def redis_connection(mocker) -> fakeredis.FakeRedis:
+    connection = fakeredis.FakeRedis()
+    for module in ("current_status", "scheduler"):
+        mocker.patch(
+            f"uptime_monitor.core.{module}.get_redis_connection",
+            return_value=connection,
+        )
+    return connection
+
+
+def set_status(
+    connection, check_registry_id: int, status: str, failures: int, since: float
+) -> None:
+    changed_at = datetime.datetime.fromtimestamp(since, datetime.timezone.utc)
+    connection.set(
+        status_key(check_registry_id),
+        json.dumps(
+            {
+                "site": check_registry_id,
+                "status": status,
+                "response_time": 0.1,
+                "checked_at": changed_at.isoformat(),
+                "consecutive_failures": failures,
+                "changed_at": changed_at.isoformat(),
+            }
+        ),
+    )
+
+
+def test_wheel_scheduler_rechecks_failing_sites(scheduler, redis_connection) -> None:
+    """Test failing sites are checked at the recheck interval, for a bounded number of failures."""
+    scheduler.schedule(1, check_registry_id=10, interval=300, recheck_interval=10)
+    first_tick = scheduler.entries[1].due_tick
+    set_status(redis_connection, 10, SiteResponseStatus.FAIL, 1, 0)
+
+    assert scheduler.tick(first_tick) == [10]
+    assert scheduler.entries[1].due_tick == first_tick + 10
+    scheduler.dispatch.assert_called_with([10], expires=10, queue=None)
+
+    set_status(redis_connection, 10, SiteResponseStatus.FAIL, 6, 0)
+    assert scheduler.tick(first_tick + 10) == [10]
+    assert scheduler.entries[1].due_tick == first_tick + 300
+
+
+def test_wheel_scheduler_backs_off_stable_sites(
+    scheduler, redis_connection, settings
+) -> None:
+    """Test the interval of passing sites doubles over time, up to the max interval."""
+    settings.SCHEDULER_BACKOFF_AFTER = 3600
+    scheduler.schedule(1, check_registry_id=10, interval=60, max_interval=200)
+    due_tick = scheduler.entries[1].due_tick
+    set_status(redis_connection, 10, SiteResponseStatus.PASS, 0, due_tick - 3600)
+
+    scheduler.tick(due_tick)
+    assert scheduler.entries[1].due_tick == due_tick + 120
+
+    set_status(redis_connection, 10, SiteResponseStatus.PASS, 0, due_tick - 36000)
+    scheduler.tick(due_tick + 120)
+    assert scheduler.entries[1].due_tick == due_tick + 320
+
+
+def test_wheel_scheduler_pulls_forward_failing_sites(
+    scheduler, redis_connection
+) -> None:
+    """Test sites queued as failing by the consumer are rechecked after the recheck interval."""
+    scheduler.schedule(1, check_registry_id=10, interval=300, recheck_interval=10)
+    scheduler.schedule(2, check_registry_id=11, interval=300)
+    due_ticks = {i: scheduler.wheel.due_tick(i) for i in (1, 2)}
+    redis_connection.sadd(FAILING_SITES_KEY, 10, 11)
+
+    assert scheduler.apply_failures() == 1
+    assert scheduler.wheel.due_tick(1) == min(due_ticks[1], 10)
+    assert scheduler.wheel.due_tick(2) == due_ticks[2]
+    assert not redis_connection.exists(FAILING_SITES_KEY)
+
+
+@pytest.mark.django_db
+def test_wheel_scheduler_disables_beat_checks(scheduler, user, settings) -> None:
+    """Test the periodic tasks of beat are disabled, so that sites aren't checked twice."""
+    site = SiteRegistry.objects.create(user=user, url="https://example.com")
+    interval = IntervalSchedule.objects.create(
+        every=30, period=IntervalSchedule.SECONDS
+    )
+    settings.CHECK_SCHEDULER = "beat"
+    items = [
+        ScheduleItem.objects.create(
+            name=f"item{i}", check_registry=site, schedule=interval
+        )
+        for i in range(2)
+    ]
+    settings.CHECK_SCHEDULER = "wheel"
+
+    items[0].save()
+    assert not PeriodicTask.objects.get(id=items[0].periodic_task_id).enabled
+    assert PeriodicTask.objects.get(id=items[1].periodic_task_id).enabled
+
+    scheduler.load_all()
+
+    assert not PeriodicTask.objects.filter(enabled=True).exists()
+    assert set(scheduler.entries) == {item.id for item in items}
@@ -0,0 +1,75 @@
+from unittest import mock
+
+import fakeredis
+import pytest
+
+from uptime_monitor.core.sharding import (
+    HashRing,
+    ShardHeartbeat,
+    ShardRouter,
+    route_check_task,
+)
+
+
+@pytest.fixture
+def redis_connection(mocker) -> fakeredis.FakeRedis:
+    connection = fakeredis.FakeRedis()
+    mocker.patch(
+        "uptime_monitor.core.sharding.get_redis_connection", return_value=connection
+    )
+    return connection
+
+
+def test_hash_ring_moves_only_the_keys_of_a_leaving_shard() -> None:
+    """Test keys spread over the shards and only the keys of a removed shard move."""
+    keys = [f"site{i}.example.com" for i in range(2000)]
+    ring = HashRing(["a", "b", "c", "d"], virtual_nodes=128)
+    before = {key: ring.get(key) for key in keys}
+
+    counts = {shard: list(before.values()).count(shard) for shard in ring.shards}
+    assert all(300 < count < 700 for count in counts.values())
+
+    after = HashRing(["a", "b", "c"], virtual_nodes=128)
+    moved = [key for key in keys if after.get(key) != before[key]]
+    assert moved and all(before[key] == "d" for key in moved)
+
+
+def test_shard_router_groups_sites_by_live_shard(redis_connection, settings) -> None:
+    """Test sites are grouped by the queues of the shards with a recent heartbeat."""
+    settings.CHECK_SHARD_KEY = "registry"
+    router = ShardRouter(clock=lambda: 0.0)
+    assert router.group([1, 2]) == {None: [1, 2]}
+
+    with mock.patch("time.time", return_value=1000.0):
+        ShardHeartbeat("celery@a").beat()
+        ShardHeartbeat("celery@b").beat()
+    ShardHeartbeat("celery@c").beat()
+    router = ShardRouter(clock=lambda: 0.0)
+
+    groups = router.group(range(100))
+
+    # The heartbeats of a and b expired.
+    assert set(groups) == {"check_shard.celery@c"}
+
+    ShardHeartbeat("celery@a").beat()
+    router = ShardRouter(clock=lambda: 0.0)
+    groups = router.group(range(100))
+    assert set(groups) == {"check_shard.celery@a", "check_shard.celery@c"}
+    assert sorted(sum(groups.values(), [])) == list(range(100))
+
+
+def test_route_check_task(redis_connection, settings, mocker) -> None:
+    """Test check_site tasks are routed to the queue of their shard when sharding is on."""
+    settings.CHECK_SHARD_KEY = "registry"
+    mocker.patch(
+        "uptime_monitor.core.sharding.shard_router",
+        ShardRouter(clock=lambda: 0.0),
+    )
+    ShardHeartbeat("celery@a").beat()
+
+    assert route_check_task("check_site", [], {"check_registry_id": 1}, {}) is None
+    settings.CHECK_SHARDING = True
+    assert route_check_task("check_site", [], {"check_registry_id": 1}, {}) == {
+        "queue": "check_shard.celery@a"
+    }
+    assert route_check_task("check_sites", [[1]], {}, {}) is None
@@ -0,0 +1,57 @@
+import math
+import random
+
+import pytest
+
+from uptime_monitor.core.sketches import MAX_BINS, RELATIVE_ACCURACY, DDSketch
+
+
+def exact_quantile(values, quantile: float) -> float:
+    return sorted(values)[max(1, math.ceil(quantile * len(values))) - 1]
+
+
+def test_sketch_quantiles_are_relatively_accurate() -> None:
+    """Test quantiles are within the relative accuracy of the exact values."""
+    rng = random.Random(0)
+    values = [rng.lognormvariate(-2, 1) for _ in range(10000)]
+    sketch = DDSketch()
+    for value in values:
+        sketch.add(value)
+
+    for quantile in (0, 0.5, 0.95, 0.99, 1):
+        assert sketch.quantile(quantile) == pytest.approx(
+            exact_quantile(values, quantile), rel=RELATIVE_ACCURACY
+        )
+    assert DDSketch().quantile(0.5) is None
+
+
+def test_sketch_merge_and_serialization() -> None:
+    """Test merged sketches equal the sketch of all values and survive serialization."""
+    rng = random.Random(1)
+    values = [rng.uniform(0.01, 2) for _ in range(1000)] + [0.0]
+    merged, whole = DDSketch(), DDSketch()
+    for chunk in (values[:300], values[300:]):
+        part = DDSketch()
+        for value in chunk:
+            part.add(value)
+            whole.add(value)
+        merged.merge(DDSketch.from_bytes(part.to_bytes()))
+
+    restored = DDSketch.from_bytes(merged.to_bytes())
+    assert restored.bins == whole.bins
+    assert (restored.zero_count, len(restored)) == (1, len(values))
+    assert DDSketch.from_bytes(b"").count == 0
+    with pytest.raises(ValueError):
+        DDSketch.from_bytes(merged.to_bytes()[:-1])
+
+
+def test_sketch_bins_are_bounded() -> None:
+    """Test the lowest bins collapse past MAX_BINS and the high quantiles are kept."""
+    sketch = DDSketch()
+    for exponent in range(MAX_BINS + 100):
+        sketch.add(1.05**exponent * 1e-5)
+
+    assert len(sketch.bins) == MAX_BINS
+    assert sketch.quantile(1) == pytest.approx(
+        1.05 ** (MAX_BINS + 99) * 1e-5, rel=RELATIVE_ACCURACY
+    )
@@ -0,0 +1,140 @@
+import asyncio
+import json
+from typing import Optional
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+from rest_framework.authtoken.models import Token
+
+from config.websocket import UNAUTHORIZED, websocket_application
+from uptime_monitor.core.current_status import status_key
+from uptime_monitor.core.models import SiteRegistry, SiteResponseStatus
+from uptime_monitor.core.status_events import StatusHub, publish_status_changes
+from uptime_monitor.users.models import User
+
+
+def make_status(site: SiteRegistry, status: str) -> dict:
+    return {
+        "site": site.id,
+        "status": status,
+        "response_time": 0.1,
+        "checked_at": "2023-06-15T12:00:00+00:00",
+        "consecutive_failures": 0 if status == SiteResponseStatus.PASS else 1,
+        "changed_at": "2023-06-15T12:00:00+00:00",
+    }
+
+
+@pytest.fixture
+def redis_server(mocker) -> fakeredis.FakeServer:
+    server = fakeredis.FakeServer()
+    connection = fakeredis.FakeRedis(server=server)
+    for module in ("current_status", "status_events"):
+        mocker.patch(
+            f"uptime_monitor.core.{module}.get_redis_connection",
+            return_value=connection,
+        )
+    mocker.patch(
+        "config.websocket.status_hub",
+        StatusHub(connect=lambda: fakeredis.aioredis.FakeRedis(server=server)),
+    )
+    return server
+
+
+class Client:
+    """
+    Drives the websocket application like an ASGI server.
+    """
+
+    def __init__(self, query_string: bytes = b""):
+        self.scope = {"type": "websocket", "query_string": query_string, "headers": []}
+        self.received: asyncio.Queue = asyncio.Queue()
+        self.sent: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> dict:
+        self.task = asyncio.create_task(
+            websocket_application(self.scope, self.received.get, self.sent.put)
+        )
+        await self.received.put({"type": "websocket.connect"})
+        return await self.next_event()
+
+    async def send_json(self, data) -> None:
+        await self.received.put({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def next_event(self) -> dict:
+        return await asyncio.wait_for(self.sent.get(), timeout=5)
+
+    async def next_json(self) -> dict:
+        return json.loads((await self.next_event())["text"])
+
+    async def disconnect(self) -> None:
+        assert self.task is not None
+        await self.received.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, timeout=5)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_websocket_pushes_status_changes(redis_server, user: User) -> None:
+    """Test subscribers get the current statuses, then the changes of their sites only."""
+    sites = [
+        SiteRegistry.objects.create(user=user, url=f"https://site{i}.example.com")
+        for i in range(2)
+    ]
+    other = SiteRegistry.objects.create(
+        user=User.objects.create(username="other"), url="https://other.example.com"
+    )
+    token = Token.objects.create(user=user)
+    fakeredis.FakeRedis(server=redis_server).set(
+        status_key(sites[0].id), json.dumps(make_status(sites[0], "PASS"))
+    )
+    users = {site.id: site.user_id for site in [*sites, other]}
+
+    async def scenario() -> None:
+        client = Client(f"token={token.key}".encode())
+        assert await client.connect() == {"type": "websocket.accept"}
+
+        await client.send_json(
+            {"action": "subscribe", "sites": [sites[0].id, other.id]}
+        )
+        assert await client.next_json() == {
+            "type": "subscribed",
+            "sites": [sites[0].id],
+        }
+        assert await client.next_json() == {
+            "type": "status",
+            **make_status(sites[0], "PASS"),
+        }
+
+        publish_status_changes(
+            [
+                make_status(sites[1], "FAIL"),
+                make_status(other, "FAIL"),
+                make_status(sites[0], "TIMEOUT"),
+            ],
+            users,
+        )
+        event = await client.next_json()
+        assert (event["type"], event["site"], event["status"]) == (
+            "status",
+            sites[0].id,
+            "TIMEOUT",
+        )
+        await client.disconnect()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.django_db(transaction=True)
+def test_websocket_rejects_unauthenticated(redis_server) -> None:
+    """Test connections without a valid token or session are closed."""
+
+    async def scenario() -> None:
+        for query_string in (b"", b"token=invalid"):
+            client = Client(query_string)
+            assert await client.connect() == {
+                "type": "websocket.close",
+                "code": UNAUTHORIZED,
+            }
+
+    asyncio.run(scenario())
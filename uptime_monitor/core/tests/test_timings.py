@@ -0,0 +1,151 @@
+import asyncio
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from uptime_monitor.core.network import (
+    ResolvingBackend,
+    make_async_transport,
+    make_transport,
+)
+from uptime_monitor.core.timings import PHASES, PhaseTimings, current_timings
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_phase_timings_from_trace_events() -> None:
+    """Test trace events of a new connection are split into phases."""
+    clock = Clock()
+    timings = PhaseTimings(clock=clock)
+    events = [
+        (0.0, "connection.connect_tcp.started"),
+        (0.5, "dns"),
+        (0.75, "connection.connect_tcp.complete"),
+        (0.75, "connection.start_tls.started"),
+        (1.0, "connection.start_tls.complete"),
+        (1.0, "http11.send_request_headers.started"),
+        (1.0, "http11.send_request_headers.complete"),
+        (1.5, "http11.receive_response_headers.started"),
+        (2.0, "http11.receive_response_headers.complete"),
+        (2.0, "http11.receive_response_body.started"),
+    ]
+    for now, event in events:
+        clock.now = now
+        if event == "dns":
+            timings.durations["dns"] = 0.5
+        else:
+            timings.trace(event, {})
+    clock.now = 3.0
+
+    assert timings.finish() == 3.0
+    assert timings.as_dict() == {
+        "dns": 0.5,
+        "connect": 0.25,
+        "tls": 0.25,
+        "ttfb": 1.0,
+        "download": 1.0,
+        "total": 3.0,
+    }
+
+
+def test_phase_timings_of_reused_connection() -> None:
+    """Test connection phases are None when no connection was opened."""
+    clock = Clock()
+    timings = PhaseTimings(clock=clock)
+    timings.trace("http11.send_request_headers.started", {})
+    clock.now = 1.0
+    timings.trace("http11.receive_response_headers.complete", {})
+    timings.finish()
+
+    result = timings.as_dict()
+    assert set(result) == set(PHASES)
+    assert result["dns"] is result["connect"] is result["tls"] is None
+    assert result["ttfb"] == 1.0
+
+
+@pytest.fixture
+def listening_socket():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    yield server
+    server.close()
+
+
+def test_resolving_backend_times_dns(listening_socket: socket.socket, settings) -> None:
+    """Test the resolving backend records the lookup as the dns phase."""
+    settings.DNS_CACHE_ENABLED = False
+    port = listening_socket.getsockname()[1]
+    timings = PhaseTimings()
+    token = current_timings.set(timings)
+    try:
+        stream = ResolvingBackend().connect_tcp("localhost", port, timeout=5)
+        stream.close()
+    finally:
+        current_timings.reset(token)
+
+    assert timings.durations["dns"] >= 0
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_transports_connect_through_resolving_backends(
+    http_server: str, settings
+) -> None:
+    """Test the clients of the checks resolve hosts themselves and time the lookup."""
+    settings.DNS_CACHE_ENABLED = False
+
+    async def get_async() -> httpx.Response:
+        async with httpx.AsyncClient(transport=make_async_transport()) as client:
+            return await client.get(http_server)
+
+    timings = PhaseTimings()
+    token = current_timings.set(timings)
+    try:
+        with httpx.Client(transport=make_transport()) as client:
+            response = client.get(http_server)
+        async_response = asyncio.run(get_async())
+    finally:
+        current_timings.reset(token)
+
+    assert (response.status_code, response.text) == (200, "ok")
+    assert (async_response.status_code, async_response.text) == (200, "ok")
+    assert timings.durations["dns"] >= 0
+
+
+def test_transports_raise_httpx_errors(listening_socket: socket.socket) -> None:
+    """Test the httpcore errors of the transports are raised as httpx errors."""
+    port = listening_socket.getsockname()[1]
+    listening_socket.close()
+
+    with httpx.Client(transport=make_transport()) as client:
+        with pytest.raises(httpx.ConnectError):
+            client.get(f"http://127.0.0.1:{port}/")
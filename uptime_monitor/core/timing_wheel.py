@@ -0,0 +1,118 @@
+"""
+Hierarchical timing wheel.
+
+Timers live in the slot of the coarsest level that still resolves them; when
+time reaches the start of a coarse slot its timers cascade down to finer
+levels, so inserting, removing and expiring a timer are O(1) amortized no
+matter how many timers are scheduled.
+"""
+from typing import Dict, Generic, Hashable, List, Set, Tuple, TypeVar
+
+Key = TypeVar("Key", bound=Hashable)
+Entry = Tuple[Key, int]
+
+
+class TimingWheel(Generic[Key]):
+    """
+    A hierarchical timing wheel with integer ticks, keyed by Key.
+
+    Attributes:
+        wheel_size (int): Number of slots per level.
+        levels (int): Number of levels. Level i slots span wheel_size**i ticks.
+        current_tick (int): The last tick the wheel advanced to.
+    """
+
+    def __init__(self, current_tick: int, wheel_size: int = 60, levels: int = 4):
+        self.wheel_size = wheel_size
+        self.levels = levels
+        self.current_tick = current_tick
+        self._slots: List[List[Set[Entry[Key]]]] = [
+            [set() for _ in range(wheel_size)] for _ in range(levels)
+        ]
+        self._overflow: Set[Entry[Key]] = set()
+        self._ready: List[Entry[Key]] = []
+        self._due: Dict[Key, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self._due
+
+    def due_tick(self, key: Key) -> int:
+        """
+        Returns the tick the timer of key is due at.
+        """
+        return self._due[key]
+
+    def add(self, key: Key, due_tick: int) -> None:
+        """
+        Schedule key at due_tick, replacing its previous timer.
+            Timers due at or before the current tick expire on the next advance.
+        """
+        self._due[key] = due_tick
+        self._place((key, due_tick))
+
+    def remove(self, key: Key) -> None:
+        """
+        Cancel the timer of key. Stale slot entries are skipped when they expire.
+        """
+        self._due.pop(key, None)
+
+    def advance(self, tick: int) -> List[Key]:
+        """
+        Move the wheel to tick.
+
+        returns:
+            The keys whose timers expired, in due order.
+        """
+        expired = self._expire(self._ready)
+        while self.current_tick < tick:
+            self.current_tick += 1
+            self._cascade(self.current_tick)
+            slot = self._slots[0][self.current_tick % self.wheel_size]
+            entries = self._ready + list(slot)
+            slot.clear()
+            expired.extend(self._expire(entries))
+        return expired
+
+    def _expire(self, entries: List[Entry[Key]]) -> List[Key]:
+        self._ready = []
+        expired = []
+        for key, due_tick in sorted(entries, key=lambda entry: entry[1]):
+            if self._due.get(key) == due_tick:
+                del self._due[key]
+                expired.append(key)
+        return expired
+
+    def _place(self, entry: Entry[Key]) -> None:
+        key, due_tick = entry
+        delta = due_tick - self.current_tick
+        if delta <= 0:
+            self._ready.append(entry)
+            return
+        span = 1
+        for level in range(self.levels):
+            if delta < span * self.wheel_size:
+                self._slots[level][(due_tick // span) % self.wheel_size].add(entry)
+                return
+            span *= self.wheel_size
+        self._overflow.add(entry)
+
+    def _cascade(self, tick: int) -> None:
+        span = self.wheel_size**self.levels
+        if tick % span == 0 and self._overflow:
+            overflow, self._overflow = self._overflow, set()
+            self._replace(overflow)
+        for level in range(self.levels - 1, 0, -1):
+            span = self.wheel_size**level
+            if tick % span == 0:
+                slot = self._slots[level][(tick // span) % self.wheel_size]
+                entries = set(slot)
+                slot.clear()
+                self._replace(entries)
+
+    def _replace(self, entries: Set[Entry[Key]]) -> None:
+        for key, due_tick in entries:
+            if self._due.get(key) == due_tick:
+                self._place((key, due_tick))
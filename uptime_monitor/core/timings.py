@@ -0,0 +1,111 @@
+"""
+Phase timings of site checks.
+
+Every check carries a PhaseTimings that is fed by the httpcore "trace" request
+extension and by the resolving network backends of core/network.py, which find
+it through the current_timings context variable. All phases are measured on the
+monotonic perf_counter clock:
+
+    dns       resolving the host, only for new connections
+    connect   opening the TCP connection, without dns
+    tls       the TLS handshake, only for new https connections
+    ttfb      from sending the request until the response headers are received
+    download  from the response headers until the evaluation stopped reading the body
+    total     the whole request, the response_time of the check
+
+Phases that did not happen, such as dns, connect and tls on a reused
+connection, are None.
+"""
+import contextvars
+import time
+from typing import Callable, Dict, Optional
+
+PHASES = ("dns", "connect", "tls", "ttfb", "download", "total")
+
+# httpcore trace events, as "<prefix>.<name>.<started|complete|failed>", by name.
+TRACE_PHASES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+}
+
+current_timings: contextvars.ContextVar[
+    Optional["PhaseTimings"]
+] = contextvars.ContextVar("current_timings", default=None)
+
+
+class PhaseTimings:
+    """
+    Durations of the phases of one check, in seconds.
+
+    Attributes:
+        durations (Dict[str, float]): The measured phases.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.started_at = clock()
+        self.durations: Dict[str, float] = {}
+        self._running: Dict[str, float] = {}
+
+    def start(self, phase: str) -> None:
+        self._running[phase] = self.clock()
+
+    def stop(self, phase: str) -> None:
+        started_at = self._running.pop(phase, None)
+        if started_at is not None:
+            self.durations[phase] = (
+                self.durations.get(phase, 0.0) + self.clock() - started_at
+            )
+
+    def record(self, event_name: str) -> None:
+        """
+        Record an httpcore trace event.
+        """
+        name, _, state = event_name.rpartition(".")
+        name = name.rpartition(".")[2]
+        if name in TRACE_PHASES:
+            if state == "started":
+                self.start(TRACE_PHASES[name])
+            else:
+                self.stop(TRACE_PHASES[name])
+        elif name == "send_request_headers" and state == "started":
+            self.start("ttfb")
+        elif name == "receive_response_headers" and state == "complete":
+            self.stop("ttfb")
+            self.start("download")
+
+    def trace(self, event_name: str, info: dict) -> None:
+        """
+        The "trace" extension of sync requests.
+        """
+        self.record(event_name)
+
+    async def atrace(self, event_name: str, info: dict) -> None:
+        """
+        The "trace" extension of async requests.
+        """
+        self.record(event_name)
+
+    def finish(self) -> float:
+        """
+        Stop the running phases and the total.
+
+        returns:
+            The total seconds of the check.
+        """
+        for phase in list(self._running):
+            self.stop(phase)
+        self.durations["total"] = self.clock() - self.started_at
+        return self.durations["total"]
+
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        """
+        Returns the phases as stored in SiteResponseHistory.timings.
+        """
+        durations = dict(self.durations)
+        if "connect" in durations and "dns" in durations:
+            durations["connect"] = max(0.0, durations["connect"] - durations["dns"])
+        return {
+            phase: round(durations[phase], 6) if phase in durations else None
+            for phase in PHASES
+        }
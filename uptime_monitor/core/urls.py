@@ -1,9 +1,14 @@
 from rest_framework import routers
 
-
-from .views import ScheduleItemModelViewSet, SiteRegistryModelViewSet, SiteResponseHistoryReadOnlyModelViewSet
+from .views import (
+    ContentAssertionModelViewSet,
+    ScheduleItemModelViewSet,
+    SiteRegistryModelViewSet,
+    SiteResponseHistoryReadOnlyModelViewSet,
+)
 
 router = routers.DefaultRouter()
-router.register(r'sites-registry', SiteRegistryModelViewSet)
-router.register(r'schedule-items', ScheduleItemModelViewSet)
-router.register(r'sites-history', SiteResponseHistoryReadOnlyModelViewSet)
\ No newline at end of file
+router.register(r"sites-registry", SiteRegistryModelViewSet)
+router.register(r"schedule-items", ScheduleItemModelViewSet)
+router.register(r"sites-history", SiteResponseHistoryReadOnlyModelViewSet)
+router.register(r"site-assertions", ContentAssertionModelViewSet)
@@ -1,35 +1,90 @@
+import datetime
+import logging
+
+import redis
+from django.conf import settings
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 
-from .models import ScheduleItem, SiteRegistry, SiteResponseHistory
+from .blobs import read_contents
+from .current_status import get_user_statuses
+from .exports import CONTENT_TYPES, export_history
+from .models import ContentAssertion, ScheduleItem, SiteRegistry, SiteResponseHistory
+from .pagination import KeysetPagination
+from .rollups import GRANULARITY_SPANS, get_stats
 from .serializers import (
+    ContentAssertionSerializer,
     ScheduleItemReadSerializer,
     ScheduleItemWriteSerializer,
     SiteRegistrySerializer,
+    SiteResponseHistoryExportSerializer,
+    SiteResponseHistoryFilterSerializer,
     SiteResponseHistorySerializer,
+    SiteResponseStatsFilterSerializer,
 )
 
+logger = logging.getLogger(__name__)
+
 
 class SiteRegistryModelViewSet(viewsets.ModelViewSet):
     queryset = SiteRegistry.objects.all()
     serializer_class = SiteRegistrySerializer
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user) 
-    
+        return self.queryset.filter(user=self.request.user)
+
+    @action(detail=True, methods=["get"])
+    def stats(self, request, pk=None):
+        """Uptime and latency statistics of the site from its rollups.
+        Defaults to the last 24 buckets of the granularity, ranges are capped
+        to ROLLUP_MAX_BUCKETS buckets ending at until.
+        """
+        site = self.get_object()
+        filters = SiteResponseStatsFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        granularity = filters.validated_data["granularity"]
+        span = GRANULARITY_SPANS[granularity]
+        until = filters.validated_data.get("until") or timezone.now()
+        since = filters.validated_data.get("since") or until - 24 * span
+        since = max(since, until - settings.ROLLUP_MAX_BUCKETS * span)
+        return Response(get_stats(site.rollups.all(), granularity, since, until))
+
+    @action(detail=False, methods=["get"])
+    def status(self, request):
+        """The current status of every site of the user, served from Redis,
+        see core/current_status.py.
+        """
+        try:
+            return Response(get_user_statuses(request.user.id))
+        except redis.RedisError:
+            logger.exception(
+                "Failed to read the site statuses of user %s", request.user.id
+            )
+            return Response(
+                {"message": "Site statuses are unavailable, try again later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
 
 class ScheduleItemModelViewSet(viewsets.ModelViewSet):
     queryset = ScheduleItem.objects.select_related("check_registry", "schedule").all()
     serializer_class = ScheduleItemReadSerializer
-    
+
     def get_queryset(self):
-        return self.queryset.filter(check_registry__user=self.request.user).defer("periodic_task")
-    
+        return self.queryset.filter(check_registry__user=self.request.user).defer(
+            "periodic_task"
+        )
+
     def get_serializer_class(self):
         if self.action in ["create", "update", "partial_update"]:
             return ScheduleItemWriteSerializer
         return ScheduleItemReadSerializer
-    
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -42,21 +97,112 @@ class ScheduleItemModelViewSet(viewsets.ModelViewSet):
             )
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
-        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        return Response(
+            serializer.data, status=status.HTTP_201_CREATED, headers=headers
+        )
+
 
+class ContentAssertionModelViewSet(viewsets.ModelViewSet):
+    queryset = ContentAssertion.objects.select_related("check_registry").all()
+    serializer_class = ContentAssertionSerializer
+
+    def get_queryset(self):
+        return self.queryset.filter(check_registry__user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        site_registry = serializer.validated_data["check_registry"]
+        if site_registry.user != request.user:
+            return Response(
+                {"message": "You don't have permission to perform this action."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(
+            serializer.data, status=status.HTTP_201_CREATED, headers=headers
+        )
+
+    def perform_update(self, serializer):
+        site_registry = serializer.validated_data.get("check_registry")
+        if site_registry and site_registry.user != self.request.user:
+            raise PermissionDenied("You don't have permission to perform this action.")
+        serializer.save()
 
 
 class SiteResponseHistoryReadOnlyModelViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = SiteResponseHistory.objects.select_related("check_registry").all()
     serializer_class = SiteResponseHistorySerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return self.queryset.filter(check_registry__user=self.request.user).values(
+        queryset = self.queryset.filter(check_registry__user=self.request.user)
+        if self.action in ("list", "export"):
+            filters = SiteResponseHistoryFilterSerializer(
+                data=self.request.query_params
+            )
+            filters.is_valid(raise_exception=True)
+            if "site" in filters.validated_data:
+                queryset = queryset.filter(
+                    check_registry_id=filters.validated_data["site"]
+                )
+            if "since" in filters.validated_data:
+                # Runs overlapping since started at most HISTORY_RUN_MAX_SECONDS before it.
+                since = filters.validated_data["since"]
+                max_age = datetime.timedelta(seconds=settings.HISTORY_RUN_MAX_SECONDS)
+                queryset = queryset.filter(created_at__gte=since - max_age).filter(
+                    Q(created_at__gte=since) | Q(last_seen_at__gte=since)
+                )
+            if "until" in filters.validated_data:
+                queryset = queryset.filter(
+                    created_at__lt=filters.validated_data["until"]
+                )
+        return queryset.values(
             "id",
             "created_at",
             "response_time",
             "response_text",
             "response_code",
+            "timings",
+            "response_body",
+            "response_headers",
+            "run_count",
+            "last_seen_at",
+            "response_time_min",
+            "response_time_max",
             "check_registry__user",
             "check_registry__url",
-        )
\ No newline at end of file
+        )
+
+    @action(detail=True, methods=["get"])
+    def content(self, request, pk=None):
+        """The response body snippet and headers of the check, if they were kept."""
+        history = self.get_object()
+        contents = read_contents(
+            [history["response_body"], history["response_headers"]]
+        )
+        return Response(
+            {
+                "response_body": contents.get(history["response_body"]),
+                "response_headers": contents.get(history["response_headers"]),
+            }
+        )
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Stream the history as NDJSON or CSV, oldest first, see core/exports.py.
+        Takes the filters of the list and file_format, ndjson or csv.
+        """
+        options = SiteResponseHistoryExportSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+        file_format = options.validated_data["file_format"]
+        response = StreamingHttpResponse(
+            export_history(self.get_queryset(), file_format),
+            content_type=CONTENT_TYPES[file_format],
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="history.{file_format}"'
+        return response
@@ -0,0 +1,69 @@
+from typing import Iterator, List, Optional, Tuple
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.http.response import HttpResponseBase
+
+
+def response_headers(response: HttpResponseBase) -> List[Tuple[bytes, bytes]]:
+    """
+    Returns the headers of the response with its cookies, as ASGI expects them.
+    """
+    headers: List[Tuple[bytes, bytes]] = [
+        (header.encode("ascii"), value.encode("latin1"))
+        for header, value in response.items()
+    ]
+    for cookie in response.cookies.values():
+        headers.append(
+            (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+        )
+    return headers
+
+
+def next_part(parts: Iterator[bytes]) -> Optional[bytes]:
+    """
+    Returns the next part of a streaming response, or None when it is exhausted.
+    """
+    return next(parts, None)
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGIHandler iterating streaming responses in the thread of the sync views.
+        Django 4.0 iterates them in the event loop, where generators reading the database,
+        like the history export, raise SynchronousOnlyOperation. Every part is read with
+        sync_to_async in the thread of the request, so the connection and the transaction
+        the generator holds stay the same from one part to the next.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": response_headers(response),
+            }
+        )
+        parts = iter(response)
+        read_part = sync_to_async(next_part, thread_sensitive=True)
+        try:
+            while (part := await read_part(parts)) is not None:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+            await send({"type": "http.response.body"})
+        finally:
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application() -> StreamingASGIHandler:
+    """
+    Like django.core.asgi.get_asgi_application, with the StreamingASGIHandler.
+    """
+    django.setup(set_prefix=False)
+    return StreamingASGIHandler()
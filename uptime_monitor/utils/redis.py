@@ -0,0 +1,13 @@
+import functools
+
+import redis
+from django.conf import settings
+
+
+@functools.lru_cache(maxsize=None)
+def get_redis_connection() -> redis.Redis:
+    """
+    Returns the Redis client for settings.REDIS_URL.
+        redis-py pools reconnect after fork, so the client can be shared by the process.
+    """
+    return redis.Redis.from_url(settings.REDIS_URL)